@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from functools import wraps
+
+from flask import jsonify
+
+from db import query_deadline
+
+
+class AdmissionGate:
+    """
+    Limit współbieżności dla drogiego endpointu: max_concurrent requestów
+    naraz, do max_queue czekających (każdy najwyżej queue_timeout s).
+    Reszta dostaje od razu 503 z Retry-After zamiast stać w kolejce.
+    query_budget (s) ogranicza łączny czas zapytań SQLite w requeście.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrent: int,
+        max_queue: int,
+        queue_timeout: float = 0.5,
+        query_budget: float | None = None,
+        retry_after: int = 1,
+    ):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.query_budget = query_budget
+        self.retry_after = retry_after
+
+        self._sem = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._waiting = 0
+
+        self.admitted = 0
+        self.rejected = 0
+        self.queue_timeouts = 0
+        self.query_timeouts = 0
+
+    def try_enter(self) -> bool:
+        if self._sem.acquire(blocking=False):
+            with self._lock:
+                self.admitted += 1
+            return True
+
+        with self._lock:
+            if self._waiting >= self.max_queue:
+                self.rejected += 1
+                return False
+            self._waiting += 1
+
+        ok = False
+        try:
+            ok = self._sem.acquire(timeout=self.queue_timeout)
+        finally:
+            with self._lock:
+                self._waiting -= 1
+                if ok:
+                    self.admitted += 1
+                else:
+                    self.queue_timeouts += 1
+        return ok
+
+    def leave(self) -> None:
+        self._sem.release()
+
+    def record_query_timeout(self) -> None:
+        with self._lock:
+            self.query_timeouts += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "waiting": self._waiting,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "queue_timeouts": self.queue_timeouts,
+                "query_timeouts": self.query_timeouts,
+            }
+
+
+def overloaded_response(message: str, retry_after: int):
+    resp = jsonify({"error": "Service Unavailable", "message": message})
+    resp.status_code = 503
+    resp.headers["Retry-After"] = str(retry_after)
+    return resp
+
+
+def admission_controlled(gate: AdmissionGate):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not gate.try_enter():
+                return overloaded_response(f"{gate.name} is overloaded, try again later", gate.retry_after)
+
+            token = None
+            if gate.query_budget is not None:
+                token = query_deadline.set(time.monotonic() + gate.query_budget)
+            try:
+                return view(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                # przerwane przez progress handler (przekroczony budżet czasu),
+                # także gdy czekaliśmy na wynik cudzego zapytania (single-flight)
+                if "interrupted" not in str(e):
+                    raise
+                gate.record_query_timeout()
+                return overloaded_response(f"{gate.name} query time budget exceeded", gate.retry_after)
+            finally:
+                if token is not None:
+                    query_deadline.reset(token)
+                gate.leave()
+
+        return wrapper
+
+    return decorator
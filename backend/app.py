@@ -1,17 +1,48 @@
 from __future__ import annotations
 
 import os
+import atexit
+import hmac
+import hashlib
 import math
-from datetime import date
-
-from flask import Flask, jsonify, request
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import date, timedelta
+
+import numpy as np
+from flask import Flask, Response, g, jsonify, request
 from flask_cors import CORS
 from werkzeug.exceptions import HTTPException
 
-from db import get_connection
-
-
-MAX_GOALS = 10
+from admission import AdmissionGate, admission_controlled
+from bootstrap import bootstrap_intervals
+from cache import cache_key, create_cache
+from tune import load_league
+from decay import DECAY_HALF_LIVES, decay_aggregates, decay_aggregates_from_rows, decay_weights
+from formats import respond
+from elo import ELO_INITIAL, elo_probs, rating_as_of
+from db import (
+    PAIR_KEY_SEP, SCHEMA_VERSION, data_version, get_connection, iter_rows, normalize_match_record,
+    outdated_schema, pair_key, upsert_matches,
+)
+from model import (
+    MAX_GOALS, aggregate_matches, default_history, fetch_matches_for_predict, lambdas_from_aggregates,
+    lambdas_vectorized, matches_for_predict_query, model_config, pair_contributions, window_aggregates,
+)
+from markets import derive_markets, live_outcomes, outcome_probs_batch, score_grids
+from jobs import JobManager, JobQueueFull, job_public
+from metrics import Metrics
+from predlog import PredictionLog, prediction_record
+from search import TeamSearchIndex
+from singleflight import SingleFlight
+
+
+# /predict z "bootstrap": liczba prób do przedziałów ufności
+MIN_BOOTSTRAP = 100
+MAX_BOOTSTRAP = 5000
+DEFAULT_CI_LEVEL = 0.9
 
 ALLOWED_SORT = {
     "match_date_asc": "match_date ASC",
@@ -20,6 +51,55 @@ ALLOWED_SORT = {
 
 ALLOWED_RESULT = {"home_win", "away_win", "draw"}
 
+# POST /matches/bulk: token z env (brak tokena = endpoint wyłączony)
+INGEST_API_TOKEN = os.getenv("INGEST_API_TOKEN", "")
+MAX_BULK_ROWS = 20000
+MAX_BULK_ERRORS = 50
+
+# POST /predict/batch: limit pozycji w jednym żądaniu
+MAX_BATCH_PREDICT = 200
+
+# POST /predict/live: lambdy przedmeczowe trzymane w pamięci per mecz, bez DB przy kolejnych odpytaniach
+LIVE_MATCH_MINUTES = 90
+MAX_LIVE_MATCHES = 500
+LIVE_CACHE_SIZE = 4096
+LIVE_CACHE_TTL_S = 900
+
+# POST /predict/sweep: domyślne zakresy okna historii (od, do, krok)
+SWEEP_DEFAULTS = {"last_n": (5, 200, 5), "last_days": (30, 720, 30)}
+MAX_SWEEP_WINDOWS = 1000
+
+# GET /teams/search
+MAX_TEAM_SEARCH_RESULTS = 50
+
+# GET /predictions/evaluation
+MAX_EVALUATION_ROWS = 2000
+
+# GET /fixtures/upcoming: bez date_to - tyle dni od date_from (kolejka zwykle pt-pn)
+UPCOMING_DEFAULT_DAYS = 4
+MAX_UPCOMING_FIXTURES = 500
+
+# współbieżne identyczne /predict, /stats/table i /stats/xpts liczą się raz
+predict_flight = SingleFlight("predict")
+table_flight = SingleFlight("stats_table")
+xpts_flight = SingleFlight("stats_xpts")
+
+# admission control: limit współbieżności + budżet czasu zapytań SQLite
+QUERY_BUDGET_S = float(os.getenv("QUERY_BUDGET_S", "2.0"))
+predict_gate = AdmissionGate("predict", max_concurrent=8, max_queue=16, query_budget=QUERY_BUDGET_S)
+stats_gate = AdmissionGate("stats", max_concurrent=8, max_queue=16, query_budget=QUERY_BUDGET_S)
+matches_gate = AdmissionGate("matches", max_concurrent=4, max_queue=8, query_budget=QUERY_BUDGET_S)
+
+metrics = Metrics()
+
+# wyniki /predict, /stats/table, /teams po (znormalizowany request, data_version); CACHE_BACKEND w cache.py
+result_cache = create_cache()
+
+# data_version() czytamy najwyżej co tyle sekund na proces (trafienie w cache bez połączenia z bazą);
+# zapis przez POST /matches/bulk w tym procesie unieważnia od razu, zapisy z innych procesów
+# widać po najwyżej tylu sekundach
+DATA_VERSION_RECHECK_S = 1.0
+
 
 TEAM_DISPLAY: dict[str, str] = {
     # ===== Bundesliga =====
@@ -167,176 +247,6 @@ TEAM_DISPLAY: dict[str, str] = {
 # Poisson model helpers
 # =========================
 
-def safe_float(x, default=0.0):
-    try:
-        if x is None:
-            return default
-        return float(x)
-    except Exception:
-        return default
-
-
-def poisson_pmf(k: int, lam: float) -> float:
-    if lam <= 0:
-        return 1.0 if k == 0 else 0.0
-    return math.exp(-lam) * (lam ** k) / math.factorial(k)
-
-
-def score_matrix(lh: float, la: float, max_goals: int = MAX_GOALS):
-    ph = [poisson_pmf(i, lh) for i in range(max_goals + 1)]
-    pa = [poisson_pmf(j, la) for j in range(max_goals + 1)]
-    return [[ph[i] * pa[j] for j in range(max_goals + 1)] for i in range(max_goals + 1)]
-
-
-def outcome_probs(mat):
-    p_home = 0.0
-    p_draw = 0.0
-    p_away = 0.0
-    best = (0, 0, -1.0)  # (hg, ag, p)
-
-    n = len(mat) - 1
-    for hg in range(n + 1):
-        for ag in range(n + 1):
-            p = mat[hg][ag]
-            if p > best[2]:
-                best = (hg, ag, p)
-            if hg > ag:
-                p_home += p
-            elif hg == ag:
-                p_draw += p
-            else:
-                p_away += p
-
-    return p_home, p_draw, p_away, {"home_goals": best[0], "away_goals": best[1], "p": best[2]}
-
-
-def fetch_matches_for_predict(
-    conn,
-    league: str,
-    season: str | None,
-    cutoff_date: str | None,
-    history_mode: str = "last_n",
-    history_value: int = 2000,
-):
-    where = [
-        "league = ?",
-        "home_goals IS NOT NULL",
-        "away_goals IS NOT NULL",
-    ]
-    params: list[object] = [league]
-
-    if season:
-        where.append("season = ?")
-        params.append(season)
-
-    # cutoff: używamy TYLKO meczów sprzed daty meczu
-    if cutoff_date:
-        where.append("match_date < ?")
-        params.append(cutoff_date)
-
-        if history_mode == "last_days":
-            # SQLite: date(?, '-180 day') daje datę -180 dni
-            where.append("match_date >= date(?, ?)")
-            params.append(cutoff_date)
-            params.append(f"-{int(history_value)} day")
-
-    where_sql = " AND ".join(where)
-
-    # last_days: LIMIT można dać duży, bo i tak tnie po dacie
-    limit = int(history_value) if history_mode == "last_n" else 5000
-
-    sql = f"""
-        SELECT home_team, away_team, home_goals, away_goals
-        FROM football_matches
-        WHERE {where_sql}
-        ORDER BY match_date DESC
-        LIMIT ?;
-    """
-    cur = conn.cursor()
-    cur.execute(sql, tuple(params + [limit]))
-    return [dict(r) for r in cur.fetchall()]
-
-
-def compute_lambdas_poisson(rows: list[dict], home_team: str, away_team: str):
-    if not rows:
-        return 1.2, 1.0
-
-    total_hg = 0.0
-    total_ag = 0.0
-    n = 0
-
-    team_stats: dict[str, dict] = {}
-
-    def ensure(t: str):
-        if t not in team_stats:
-            team_stats[t] = {
-                "hs": 0.0, "hc": 0.0, "hn": 0,  # home scored/conceded/count
-                "as": 0.0, "ac": 0.0, "an": 0,  # away scored/conceded/count
-            }
-
-    for r in rows:
-        h = r["home_team"]
-        a = r["away_team"]
-        hg = safe_float(r["home_goals"])
-        ag = safe_float(r["away_goals"])
-
-        total_hg += hg
-        total_ag += ag
-        n += 1
-
-        ensure(h)
-        ensure(a)
-
-        team_stats[h]["hs"] += hg
-        team_stats[h]["hc"] += ag
-        team_stats[h]["hn"] += 1
-
-        team_stats[a]["as"] += ag
-        team_stats[a]["ac"] += hg
-        team_stats[a]["an"] += 1
-
-    avg_lg_home = total_hg / max(n, 1)
-    avg_lg_away = total_ag / max(n, 1)
-
-    # shrinkage (żeby nie wariowało przy małej próbce)
-    K = 6
-
-    def home_attack(t: str) -> float:
-        s = team_stats.get(t)
-        if not s or s["hn"] == 0:
-            return 1.0
-        rate = (s["hs"] + K * avg_lg_home) / (s["hn"] + K)
-        return rate / max(avg_lg_home, 0.01)
-
-    def home_defense_ratio(t: str) -> float:
-        s = team_stats.get(t)
-        if not s or s["hn"] == 0:
-            return 1.0
-        rate = (s["hc"] + K * avg_lg_away) / (s["hn"] + K)  # conceded at home
-        return rate / max(avg_lg_away, 0.01)
-
-    def away_attack(t: str) -> float:
-        s = team_stats.get(t)
-        if not s or s["an"] == 0:
-            return 1.0
-        rate = (s["as"] + K * avg_lg_away) / (s["an"] + K)
-        return rate / max(avg_lg_away, 0.01)
-
-    def away_defense_ratio(t: str) -> float:
-        s = team_stats.get(t)
-        if not s or s["an"] == 0:
-            return 1.0
-        rate = (s["ac"] + K * avg_lg_home) / (s["an"] + K)  # conceded away
-        return rate / max(avg_lg_home, 0.01)
-
-    lh = avg_lg_home * home_attack(home_team) * away_defense_ratio(away_team)
-    la = avg_lg_away * away_attack(away_team) * home_defense_ratio(home_team)
-
-    lh = max(0.2, min(lh, 4.5))
-    la = max(0.2, min(la, 4.5))
-    return lh, la
-
-
 def display_team(name: str) -> str:
     if name is None:
         return name
@@ -371,6 +281,109 @@ def check_team_alias_coverage() -> None:
         print("\n[TEAM_DISPLAY] OK: masz aliasy dla wszystkich drużyn w DB.\n")
 
 
+# (version, czas sprawdzenia z time.monotonic()) - jedna krotka, podmieniana w całości
+_data_version: dict = {"entry": (None, 0.0)}
+_data_version_lock = threading.Lock()
+
+
+def current_data_version() -> float:
+    """data_version() z pamięci procesu, odświeżane co DATA_VERSION_RECHECK_S."""
+    version, checked = _data_version["entry"]
+    if version is not None and time.monotonic() - checked < DATA_VERSION_RECHECK_S:
+        return version
+
+    with _data_version_lock:
+        version, checked = _data_version["entry"]
+        if version is None or time.monotonic() - checked >= DATA_VERSION_RECHECK_S:
+            version = data_version()
+            _data_version["entry"] = (version, time.monotonic())
+    return version
+
+
+def invalidate_data_version() -> None:
+    _data_version["entry"] = (None, 0.0)
+
+
+# (version, body, etag) - jedna krotka, żeby równoległe przebudowy nie pomieszały pól
+_catalog_cache: dict = {"entry": (None, b"", "")}
+
+
+def catalog_payload() -> tuple[bytes, str]:
+    """
+    Drzewo liga -> sezony -> drużyny (z etykietami TEAM_DISPLAY) jako gotowe bajty JSON + ETag.
+    Liczone z catalog_teams (wypełniane przy imporcie) i trzymane w pamięci do zmiany wersji danych;
+    wersja z current_data_version(), więc zwykły request nie dotyka bazy.
+    """
+    version = current_data_version()
+    cached_version, body, etag = _catalog_cache["entry"]
+    if version != cached_version:
+        conn = get_connection(read_only=True)
+        try:
+            rows = conn.execute(
+                "SELECT league, season, team FROM catalog_teams ORDER BY league, season, team;"
+            ).fetchall()
+        finally:
+            conn.close()
+
+        leagues: dict[str, dict] = {}
+        for league, season, team in rows:
+            lg = leagues.setdefault(league, {"seasons": {}, "teams": set()})
+            lg["seasons"].setdefault(season, []).append(team)
+            lg["teams"].add(team)
+
+        def items(teams) -> list[dict]:
+            out = [{"value": t, "label": display_team(t)} for t in teams]
+            out.sort(key=lambda x: x["label"])
+            return out
+
+        tree = {
+            "leagues": [
+                {
+                    "league": league,
+                    "seasons": [
+                        {"season": season or None, "teams": items(teams)}
+                        for season, teams in lg["seasons"].items()
+                    ],
+                    "teams": items(lg["teams"]),
+                }
+                for league, lg in leagues.items()
+            ],
+        }
+        body = json.dumps(tree, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        etag = hashlib.sha1(body).hexdigest()
+        _catalog_cache["entry"] = (version, body, etag)
+
+    return body, etag
+
+
+# (version, index) - jedna krotka, podmieniana w całości
+_team_search: dict = {"entry": (None, None)}
+_team_search_lock = threading.Lock()
+
+
+def team_search_index() -> TeamSearchIndex:
+    """
+    Indeks /teams/search budowany z catalog_teams i TEAM_DISPLAY; przebudowa, gdy po imporcie
+    zmieni się wersja danych (current_data_version(), bez połączenia na request).
+    """
+    current = current_data_version()
+    version, index = _team_search["entry"]
+    if index is not None and current == version:
+        return index
+
+    with _team_search_lock:
+        version, index = _team_search["entry"]
+        if index is None or current != version:
+            conn = get_connection(read_only=True)
+            try:
+                rows = [tuple(r) for r in conn.execute("SELECT league, season, team FROM catalog_teams;").fetchall()]
+            finally:
+                conn.close()
+            index = TeamSearchIndex(rows, TEAM_DISPLAY)
+            _team_search["entry"] = (current, index)
+    return index
+
+
 def parse_int(name: str, raw: str | None, default: int, min_v: int | None = None, max_v: int | None = None) -> int:
     if raw is None or raw == "":
         x = default
@@ -397,28 +410,621 @@ def parse_date(name: str, raw: str | None) -> str | None:
         raise ValueError(f"{name} must be YYYY-MM-DD")
 
 
-def first_col(row, key: str | None = None):
-    if row is None:
-        return None
-    if key is not None:
+def parse_predict_request(data: dict) -> tuple:
+    """
+    Walidacja ciała /predict (i pozycji /predict/batch).
+    Zwraca (league, season, home_team, away_team, match_date, history_mode, history_value,
+    bootstrap, ci_level); błąd -> ValueError.
+    """
+    league = (data.get("league") or "").strip()
+    season = (data.get("season") or "").strip() or None
+    home_team = (data.get("home_team") or "").strip()
+    away_team = (data.get("away_team") or "").strip()
+
+    #cutoff + okno historii
+    raw_match_date = (data.get("match_date") or "").strip() or None
+    history_mode = (data.get("history_mode") or "").strip()
+    history_value_raw = data.get("history_value")
+
+    # bez jawnego okna -> okno dostrojone dla ligi (tune.py), a bez niego stare domyślne
+    if not history_mode and history_value_raw is None:
+        history_mode, history_value_raw = default_history(league)
+    history_mode = history_mode or "last_n"
+    if history_value_raw is None:
+        history_value_raw = 10
+
+    if not league or not home_team or not away_team:
+        raise ValueError("league, home_team, away_team are required")
+    if home_team == away_team:
+        raise ValueError("Choose two different teams")
+
+    match_date = parse_date("match_date", raw_match_date)  # str albo None
+
+    if history_mode not in ("last_n", "last_days", "exp_decay"):
+        raise ValueError("history_mode must be 'last_n', 'last_days' or 'exp_decay'")
+
+    try:
+        history_value = int(history_value_raw)
+    except Exception:
+        raise ValueError("history_value must be an integer")
+
+    if history_mode == "last_n":
+        if history_value < 1 or history_value > 5000:
+            raise ValueError("history_value for last_n must be 1..5000")
+    else:
+        if history_value < 1 or history_value > 3650:
+            raise ValueError(f"history_value for {history_mode} must be 1..3650")
+
+    # przedziały ufności: 0 = wyłączone
+    try:
+        bootstrap = int(data.get("bootstrap") or 0)
+        ci_level = float(data.get("ci_level") or DEFAULT_CI_LEVEL)
+    except (TypeError, ValueError):
+        raise ValueError("bootstrap must be an integer and ci_level a number")
+    if bootstrap and not MIN_BOOTSTRAP <= bootstrap <= MAX_BOOTSTRAP:
+        raise ValueError(f"bootstrap must be 0 or {MIN_BOOTSTRAP}..{MAX_BOOTSTRAP}")
+    if not 0.5 <= ci_level <= 0.99:
+        raise ValueError("ci_level must be 0.5..0.99")
+
+    return league, season, home_team, away_team, match_date, history_mode, history_value, bootstrap, ci_level
+
+
+def check_teams(cur, league: str, season: str | None, home_team: str, away_team: str) -> dict | None:
+    """Payload błędu 400, jeśli któraś drużyna nie grała w lidze/sezonie; inaczej None."""
+    where = ["league = ?"]
+    params: list[object] = [league]
+    if season:
+        where.append("season = ?")
+        params.append(season)
+    where_sql = " AND ".join(where)
+
+    for field, team in (("home_team", home_team), ("away_team", away_team)):
+        cur.execute(
+            f"""
+            SELECT 1
+            FROM football_matches
+            WHERE {where_sql}
+              AND (home_team = ? OR away_team = ?)
+            LIMIT 1;
+            """,
+            tuple(params + [team, team]),
+        )
+        if cur.fetchone() is None:
+            return {"error": "Bad Request", "message": f"{field} not found in selected league/season"}
+    return None
+
+
+def build_prediction(
+    league: str,
+    season: str | None,
+    home_team: str,
+    away_team: str,
+    match_date: str | None,
+    history_mode: str,
+    history_value: int,
+    bootstrap: int = 0,
+    ci_level: float = DEFAULT_CI_LEVEL,
+) -> tuple[dict, int]:
+    conn = get_connection(league)
+    cur = conn.cursor()
+    try:
+        # Walidacja czy teams istnieją w lidze
+        error = check_teams(cur, league, season, home_team, away_team)
+        if error is not None:
+            return error, 400
+
+        cfg = model_config(league)
+        params = {"k": cfg["k"], "lambda_min": cfg["lambda_min"], "lambda_max": cfg["lambda_max"]}
+        history = {"mode": history_mode, "value": history_value}
+
+        rows = None
+        if history_mode == "exp_decay":
+            # history_value = half-life w dniach; cała historia ligi (albo sezonu) sprzed match_date,
+            # ważona wiekiem meczu. Stany z team_decay_state są liczone po całej lidze, więc z season
+            # (i dla half-life spoza DECAY_HALF_LIVES) liczymy to samo okno z surowych meczów, bez limitu.
+            if history_value in DECAY_HALF_LIVES and not season and not bootstrap:
+                aggregates = decay_aggregates(conn, league, history_value, match_date, (home_team, away_team))
+            else:
+                rows = fetch_matches_for_predict(conn, league=league, season=season, cutoff_date=match_date,
+                                                 history_mode="all")
+                aggregates = decay_aggregates_from_rows(rows, history_value, match_date)
+            total_hg, total_ag, n_eff, team_stats, training_matches = aggregates
+            lh, la = lambdas_from_aggregates(total_hg, total_ag, n_eff, team_stats, home_team, away_team, **params)
+            history["effective_matches"] = n_eff
+        else:
+            #tylko mecze sprzed match_date
+            query = matches_for_predict_query(
+                league=league,
+                season=season,
+                cutoff_date=match_date,
+                history_mode=history_mode,
+                history_value=(history_value if match_date else 2000),
+            )
+            # bootstrap potrzebuje listy meczów; bez niego agregujemy prosto z kursora
+            if bootstrap:
+                rows = list(iter_rows(conn, *query))
+            total_hg, total_ag, training_matches, team_stats = aggregate_matches(
+                rows if bootstrap else iter_rows(conn, *query)
+            )
+            lh, la = lambdas_from_aggregates(total_hg, total_ag, training_matches, team_stats,
+                                             home_team, away_team, **params)
+
+        confidence = None
+        if bootstrap and rows:
+            weights = decay_weights(rows, history_value, match_date) if history_mode == "exp_decay" else None
+            confidence = bootstrap_intervals(rows, home_team, away_team, bootstrap, ci_level, MAX_GOALS,
+                                             weights=weights, **params)
+
+        # Elo na dzień meczu (ostatni rating sprzed match_date); sezon nie ogranicza ratingu
+        elo_home = rating_as_of(cur, league, home_team, match_date)
+        elo_away = rating_as_of(cur, league, away_team, match_date)
+        elo_home = ELO_INITIAL if elo_home is None else elo_home
+        elo_away = ELO_INITIAL if elo_away is None else elo_away
+        e_home, e_draw, e_away = elo_probs(elo_home, elo_away)
+
+        payload = {
+            "league": league,
+            "season": season,
+            "home_team": home_team,
+            "away_team": away_team,
+            "home_team_label": display_team(home_team),
+            "away_team_label": display_team(away_team),
+
+            # pomocne do debugowania
+            "cutoff_match_date": match_date,
+            "history": history,
+            "model": {**params, "source": cfg["source"]},
+
+            "lambda_home": lh,
+            "lambda_away": la,
+            "max_goals": MAX_GOALS,
+            "training_matches_used": training_matches,
+            "elo": {
+                "home_rating": elo_home,
+                "away_rating": elo_away,
+                "p_home": e_home,
+                "p_draw": e_draw,
+                "p_away": e_away,
+            },
+        }
+        if bootstrap:
+            payload["confidence"] = confidence
+        return payload, 200
+    finally:
         try:
-            return row[key]
+            cur.close()
         except Exception:
             pass
+        conn.close()
+
+
+def parse_sweep_request(data: dict) -> tuple:
+    """
+    Ciało /predict/sweep: pola meczu jak w /predict (match_date wymagane) oraz
+    history_mode last_n|last_days i zakres okien from/to/step albo lista values.
+    Zwraca (league, season, home_team, away_team, match_date, history_mode, windows).
+    """
+    mode = (data.get("history_mode") or "last_n").strip()
+    if mode not in SWEEP_DEFAULTS:
+        raise ValueError("history_mode must be 'last_n' or 'last_days'")
+
+    try:
+        if data.get("values") is not None:
+            if not isinstance(data["values"], list):
+                raise ValueError
+            windows = sorted({int(v) for v in data["values"]})
+        else:
+            lo, hi, step = SWEEP_DEFAULTS[mode]
+            lo, hi, step = int(data.get("from", lo)), int(data.get("to", hi)), int(data.get("step", step))
+            if step < 1:
+                raise ValueError("step must be >= 1")
+            windows = list(range(lo, hi + 1, step))
+    except (TypeError, ValueError) as e:
+        raise ValueError(str(e) or "values must be a list of integers; from, to and step integers")
+
+    if not windows or len(windows) > MAX_SWEEP_WINDOWS:
+        raise ValueError(f"sweep must contain 1..{MAX_SWEEP_WINDOWS} windows")
+    if windows[0] < 1:
+        raise ValueError("window sizes must be >= 1")
+
+    # walidacja meczu i największego okna tak samo jak w /predict
+    league, season, home_team, away_team, match_date, _mode, _value, _b, _ci = parse_predict_request(
+        {**data, "history_mode": mode, "history_value": windows[-1], "bootstrap": 0}
+    )
+    if match_date is None:
+        raise ValueError("match_date is required (without it /predict does not apply the history window)")
+    return league, season, home_team, away_team, match_date, mode, windows
+
+
+def build_sweep(
+    league: str,
+    season: str | None,
+    home_team: str,
+    away_team: str,
+    match_date: str,
+    history_mode: str,
+    windows: list[int],
+) -> tuple[dict, int]:
+    """
+    Wrażliwość predykcji na okno historii: największe okno pobrane raz (od najnowszego meczu),
+    sumy prefiksowe wkładów meczów, a okno o rozmiarze w to prefiks długości count(w).
+    Lambdy i H/D/A dla wszystkich okien jednym przebiegiem wektorowym - te same wartości,
+    co /predict z danym history_value.
+    """
+    conn = get_connection(league)
+    cur = conn.cursor()
+    try:
+        error = check_teams(cur, league, season, home_team, away_team)
+        if error is not None:
+            return error, 400
+        rows = fetch_matches_for_predict(conn, league=league, season=season, cutoff_date=match_date,
+                                         history_mode=history_mode, history_value=windows[-1])
+    finally:
         try:
-            return dict(row)[key]
+            cur.close()
         except Exception:
             pass
+        conn.close()
+
+    cfg = model_config(league)
+    w = np.array(windows)
+    if history_mode == "last_n":
+        counts = np.minimum(w, len(rows))
+    else:
+        # wiersze od najnowszego: okno d dni = mecze z dniem >= cutoff - d
+        ages = np.array([date.fromisoformat(match_date).toordinal() - date.fromisoformat(r[0]).toordinal()
+                         for r in rows])
+        counts = np.searchsorted(ages, w, side="right")
+
+    agg = np.zeros((len(windows), 15))
+    if rows:
+        prefix = np.concatenate([np.zeros((1, 15)), np.cumsum(pair_contributions(rows, home_team, away_team), axis=0)])
+        agg = prefix[counts]
+
+    lh, la = lambdas_vectorized(agg[:, 0:3], agg[:, 3:9], agg[:, 9:15], cfg["k"], cfg["lambda_min"], cfg["lambda_max"])
+    probs = outcome_probs_batch(score_grids(lh, la, MAX_GOALS))
+
+    columns = ["history_value", "training_matches_used", "lambda_home", "lambda_away", "p_home", "p_draw", "p_away"]
+    table = [
+        (int(w[i]), int(counts[i]), float(lh[i]), float(la[i]), float(probs[i, 0]), float(probs[i, 1]), float(probs[i, 2]))
+        for i in range(len(windows))
+    ]
+    return {
+        "league": league,
+        "season": season,
+        "home_team": home_team,
+        "away_team": away_team,
+        "home_team_label": display_team(home_team),
+        "away_team_label": display_team(away_team),
+        "cutoff_match_date": match_date,
+        "history_mode": history_mode,
+        "model": {"k": cfg["k"], "lambda_min": cfg["lambda_min"], "lambda_max": cfg["lambda_max"],
+                  "source": cfg["source"]},
+        "matches_fetched": len(rows),
+        "windows": (columns, table),
+    }, 200
+
+
+def attach_markets(payloads: list[dict]) -> None:
+    """
+    Siatki wyników dla wszystkich predykcji naraz i rynki z nich (markets.py):
+    uzupełnia p_home/p_draw/p_away, most_likely_score i markets.
+    """
+    if not payloads:
+        return
+    grids = score_grids(
+        [p["lambda_home"] for p in payloads],
+        [p["lambda_away"] for p in payloads],
+        MAX_GOALS,
+    )
+    for p, mk in zip(payloads, derive_markets(grids)):
+        p["p_home"] = mk["1x2"]["home"]
+        p["p_draw"] = mk["1x2"]["draw"]
+        p["p_away"] = mk["1x2"]["away"]
+        p["most_likely_score"] = mk["correct_scores"][0]
+        p["markets"] = mk
+
+
+def predict_with_markets(*args) -> tuple[dict, int]:
+    payload, status = build_prediction(*args)
+    if status == 200:
+        attach_markets([payload])
+    return payload, status
+
+
+def cached_result(namespace: str, args: tuple, compute, league: str | None = None) -> tuple[object, int]:
+    """
+    compute() przez result_cache: klucz = przestrzeń + znormalizowane argumenty + current_data_version()
+    (+ parametry modelu ligi, bo tune.py zmienia je bez importu).
+    """
+    key = cache_key(namespace, args, current_data_version(), model_config(league) if league else None)
+    return result_cache.cached(key, compute)
+
+
+def predict_cached(args: tuple) -> tuple[dict, int]:
+    """/predict: single-flight w procesie, a w nim cache wspólny dla workerów."""
+    return predict_flight.do(
+        ("predict",) + args,
+        lambda: cached_result("predict", args, lambda: predict_with_markets(*args), league=args[0]),
+    )
+
+
+# klucz meczu (parse_predict_request bez opcji bootstrap) -> (lambda_home, lambda_away, wygasa)
+_live_lambdas: OrderedDict[tuple, tuple[float, float, float]] = OrderedDict()
+_live_lock = threading.Lock()
+
+
+def prematch_lambdas(args: tuple) -> tuple[tuple[float, float] | None, dict | None, str]:
+    """
+    Lambdy przedmeczowe dla /predict/live: z pamięci (LRU + TTL), a przy braku - ścieżką /predict
+    (ten sam single-flight). Zwraca (lambdy, payload błędu, źródło).
+    """
+    key = args[:7]
+    now = time.monotonic()
+    with _live_lock:
+        hit = _live_lambdas.get(key)
+        if hit is not None and hit[2] > now:
+            _live_lambdas.move_to_end(key)
+            return (hit[0], hit[1]), None, "cache"
+
+    payload, status = predict_cached(key + (0, DEFAULT_CI_LEVEL))
+    if status != 200:
+        return None, payload, "error"
+
+    lh, la = payload["lambda_home"], payload["lambda_away"]
+    with _live_lock:
+        _live_lambdas[key] = (lh, la, now + LIVE_CACHE_TTL_S)
+        _live_lambdas.move_to_end(key)
+        while len(_live_lambdas) > LIVE_CACHE_SIZE:
+            _live_lambdas.popitem(last=False)
+    return (lh, la), None, "computed"
+
+
+def parse_live_state(item: dict) -> tuple[float, int, int]:
     try:
-        return row[0]
-    except Exception:
-        return list(dict(row).values())[0]
+        minute = float(item["minute"])
+        home_score = int(item["home_score"])
+        away_score = int(item["away_score"])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("minute, home_score and away_score are required numbers")
+    if not 0 <= minute <= 130:
+        raise ValueError("minute must be 0..130")
+    if home_score < 0 or away_score < 0:
+        raise ValueError("scores must be >= 0")
+    return minute, home_score, away_score
+
+
+def match_results(conn, keys: list[tuple[str, str, str, str]]) -> dict[tuple, tuple[int, int]]:
+    """
+    Wyniki meczów po kluczu naturalnym (league, home_team, away_team, match_date)
+    jednym zapytaniem: lista kluczy jako VALUES złączona po idx_football_matches_natural_key.
+    """
+    if not keys:
+        return {}
+    values = ", ".join("(?, ?, ?, ?)" for _ in keys)
+    cur = conn.execute(
+        f"""
+        WITH k(league, home_team, away_team, match_date) AS (VALUES {values})
+        SELECT m.league, m.home_team, m.away_team, m.match_date, m.home_goals, m.away_goals
+        FROM k
+        JOIN football_matches m
+          ON m.league = k.league AND m.home_team = k.home_team
+         AND m.away_team = k.away_team AND m.match_date = k.match_date
+        WHERE m.home_goals IS NOT NULL AND m.away_goals IS NOT NULL;
+        """,
+        tuple(x for key in keys for x in key),
+    )
+    return {tuple(r[:4]): (r[4], r[5]) for r in cur.fetchall()}
+
+
+def build_team_list(league: str | None, season: str | None, pretty: bool) -> tuple[list, int]:
+    where = ["1=1"]
+    params = []
+
+    if league:
+        where.append("league = ?")
+        params.append(league)
+    if season:
+        where.append("season = ?")
+        params.append(season)
+
+    where_sql = " AND ".join(where)
+
+    sql = f"""
+        SELECT DISTINCT team FROM (
+            SELECT home_team AS team FROM football_matches WHERE {where_sql}
+            UNION
+            SELECT away_team AS team FROM football_matches WHERE {where_sql}
+        )
+        ORDER BY team ASC;
+    """
+
+    conn = get_connection(league)
+    cur = conn.cursor()
+    try:
+        cur.execute(sql, tuple(params + params))  # where_sql jest 2x
+        teams = [r[0] for r in cur.fetchall()]
+    finally:
+        try:
+            cur.close()
+        except Exception:
+            pass
+        conn.close()
+
+    if not pretty:
+        return teams, 200
+
+    items = [{"value": t, "label": display_team(t)} for t in teams]
+    items.sort(key=lambda x: x["label"])
+    return items, 200
+
+
+def parse_history(args, league: str) -> tuple[str, int]:
+    """history_mode/history_value z query (jak w /predict); bez nich - okno dostrojone dla ligi."""
+    mode = (args.get("history_mode") or "").strip()
+    raw = args.get("history_value")
+    if not mode and raw in (None, ""):
+        mode, raw = default_history(league)
+    mode = mode or "last_n"
+    if mode not in ("last_n", "last_days", "exp_decay"):
+        raise ValueError("history_mode must be 'last_n', 'last_days' or 'exp_decay'")
+    value = parse_int("history_value", None if raw is None else str(raw), 10, 1, 5000 if mode == "last_n" else 3650)
+    return mode, value
+
+
+def build_xpts_table(league: str, season: str, history_mode: str, history_value: int) -> tuple[dict, int]:
+    """
+    Tabela oczekiwanych punktów: każdy rozegrany mecz sezonu przewidziany na swój dzień
+    (tylko mecze sprzed daty, historia całej ligi - jak /predict z match_date i bez season).
+    Agregaty okien z sum prefiksowych / wygaszanych stanów w jednym przejściu chronologicznym
+    (model.window_aggregates), lambdy i siatki wyników dla wszystkich meczów naraz.
+    """
+    data = load_league(league)
+    eval_idx = np.nonzero(data["season"] == season)[0]
+    if len(eval_idx) == 0:
+        return {"error": "Not Found", "message": "No played matches found for given league/season"}, 404
+
+    cfg = model_config(league)
+    lg, th, ta = window_aggregates(data, history_mode, history_value, eval_idx)
+    lh, la = lambdas_vectorized(lg, th, ta, cfg["k"], cfg["lambda_min"], cfg["lambda_max"])
+    probs = outcome_probs_batch(score_grids(lh, la, MAX_GOALS))
+
+    home, away = data["home"][eval_idx], data["away"][eval_idx]
+    hg, ag = data["hg"][eval_idx], data["ag"][eval_idx]
+    n_teams = data["n_teams"]
+
+    def per_team(home_values, away_values) -> np.ndarray:
+        return (np.bincount(home, weights=home_values, minlength=n_teams)
+                + np.bincount(away, weights=away_values, minlength=n_teams))
+
+    ones = np.ones(len(eval_idx))
+    played = per_team(ones, ones)
+    points = per_team(np.where(hg > ag, 3.0, np.where(hg == ag, 1.0, 0.0)),
+                      np.where(ag > hg, 3.0, np.where(hg == ag, 1.0, 0.0)))
+    xpts = per_team(3.0 * probs[:, 0] + probs[:, 1], 3.0 * probs[:, 2] + probs[:, 1])
+    goals_for, goals_against = per_team(hg, ag), per_team(ag, hg)
+    xg_for, xg_against = per_team(lh, la), per_team(la, lh)
+
+    items = [
+        {
+            "team": team,
+            "team_label": display_team(team),
+            "played": int(played[i]),
+            "points": int(points[i]),
+            "xpts": float(xpts[i]),
+            "points_minus_xpts": float(points[i] - xpts[i]),
+            "goals_for": int(goals_for[i]),
+            "goals_against": int(goals_against[i]),
+            "xg_for": float(xg_for[i]),
+            "xg_against": float(xg_against[i]),
+        }
+        for i, team in enumerate(data["teams"])
+        if played[i] > 0
+    ]
+    items.sort(key=lambda x: (-x["xpts"], x["team"]))
+    for i, it in enumerate(items, start=1):
+        it["xpts_rank"] = i
+
+    return {
+        "league": league,
+        "season": season,
+        "history": {"mode": history_mode, "value": history_value},
+        "model": {"k": cfg["k"], "lambda_min": cfg["lambda_min"], "lambda_max": cfg["lambda_max"],
+                  "source": cfg["source"]},
+        "matches": int(len(eval_idx)),
+        "teams": items,
+        "note": "Expected values use pre-match Poisson probabilities of each played match as of its date; "
+                "xg_* are the model's lambdas.",
+    }, 200
+
+
+def build_league_table(league: str, season: str) -> tuple[dict, int]:
+    sql = """
+        SELECT home_team, away_team, home_goals, away_goals
+        FROM football_matches
+        WHERE league = ? AND season = ?
+          AND home_goals IS NOT NULL AND away_goals IS NOT NULL;
+    """
+    conn = get_connection(league)
+    try:
+        # team -> [played, wins, draws, losses, goals_for, goals_against, points]
+        table: dict[str, list[int]] = {}
+        for h, a, hg, ag in iter_rows(conn, sql, (league, season)):
+            th = table.get(h)
+            if th is None:
+                th = table[h] = [0, 0, 0, 0, 0, 0, 0]
+            ta = table.get(a)
+            if ta is None:
+                ta = table[a] = [0, 0, 0, 0, 0, 0, 0]
+
+            th[0] += 1
+            ta[0] += 1
+            th[4] += hg
+            th[5] += ag
+            ta[4] += ag
+            ta[5] += hg
+
+            if hg > ag:
+                th[1] += 1
+                ta[3] += 1
+                th[6] += 3
+            elif hg < ag:
+                ta[1] += 1
+                th[3] += 1
+                ta[6] += 3
+            else:
+                th[2] += 1
+                ta[2] += 1
+                th[6] += 1
+                ta[6] += 1
+
+        items = [
+            {
+                "team": t,
+                "played": played,
+                "wins": wins,
+                "draws": draws,
+                "losses": losses,
+                "goals_for": gf,
+                "goals_against": ga,
+                "goal_diff": gf - ga,
+                "points": points,
+            }
+            for t, (played, wins, draws, losses, gf, ga, points) in table.items()
+        ]
+        items.sort(key=lambda x: (-x["points"], -x["goal_diff"], -x["goals_for"], x["team"]))
+
+        for i, it in enumerate(items, start=1):
+            it["rank"] = i
+
+        return {
+            "league": league,
+            "season": season,
+            "teams": items,
+            "note": "Table computed from matches with non-null scores only. Tiebreakers: points, goal_diff, goals_for, team name.",
+        }, 200
+    finally:
+        conn.close()
 
 
 def create_app():
     app = Flask(__name__)
     CORS(app, resources={r"/*": {"origins": "http://localhost:5173"}})
 
+    # schemat migruje `python db.py --migrate` (albo przebudowa z CSV), nie każdy start workera
+    outdated = outdated_schema()
+    if outdated:
+        raise RuntimeError(
+            f"Baza bez schematu {SCHEMA_VERSION}: {', '.join(str(p) for p in outdated)}. "
+            "Uruchom: python db.py --migrate"
+        )
+
+    job_manager = JobManager()
+
+    # log wydanych predykcji (zapis w tle, data/predictions.db)
+    prediction_log = PredictionLog()
+    atexit.register(prediction_log.close)
+
     # Error handling
 
     @app.errorhandler(HTTPException)
@@ -430,6 +1036,48 @@ def create_app():
         return jsonify({"error": "Internal Server Error", "message": "Unexpected error"}), 500
 
 
+    # metryki: czas, status i liczniki SQL dla każdego requestu
+    @app.before_request
+    def metrics_start():
+        g.metrics_started = metrics.start_request()
+
+    @app.after_request
+    def metrics_end(resp):
+        started = g.pop("metrics_started", None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            metrics.end_request(started, route, request.method, resp.status_code)
+        return resp
+
+    @app.get("/metrics")
+    def get_metrics():
+        conn = get_connection()
+        cur = conn.cursor()
+        try:
+            # SQLite: kolumny obok MAX() pochodzą z wiersza z maksimum
+            cur.execute("""
+                SELECT source, MAX(finished_at), rows, seconds
+                FROM import_log
+                GROUP BY source
+                ORDER BY source;
+            """)
+            imports = [tuple(r) for r in cur.fetchall()]
+        finally:
+            try:
+                cur.close()
+            except Exception:
+                pass
+            conn.close()
+
+        body = metrics.render(
+            flights=(predict_flight, table_flight, xpts_flight),
+            gates=(predict_gate, stats_gate, matches_gate),
+            imports=imports,
+            predlog=prediction_log.stats(),
+            cache=result_cache.stats(),
+        )
+        return Response(body, mimetype="text/plain; version=0.0.4")
+
     @app.get("/health")
     def health():
         return jsonify({"status": "ok"})
@@ -449,14 +1097,42 @@ def create_app():
                 pass
             conn.close()
 
+    @app.get("/debug/singleflight")
+    def debug_singleflight():
+        return jsonify({f.name: f.stats() for f in (predict_flight, table_flight, xpts_flight)})
+
+    @app.get("/debug/admission")
+    def debug_admission():
+        return jsonify({g.name: g.stats() for g in (predict_gate, stats_gate, matches_gate)})
+
+    @app.get("/debug/cache")
+    def debug_cache():
+        st = result_cache.stats()
+        by_namespace: dict[str, dict] = {}
+        for (namespace, outcome), n in st.pop("requests").items():
+            by_namespace.setdefault(namespace, {"hit": 0, "miss": 0})[outcome] = n
+        for counts in by_namespace.values():
+            total = counts["hit"] + counts["miss"]
+            counts["hit_rate"] = counts["hit"] / total if total else None
+        st["namespaces"] = by_namespace
+        return jsonify(st)
+
+    @app.get("/catalog")
+    def get_catalog():
+        body, etag = catalog_payload()
+        resp = Response(body, mimetype="application/json")
+        resp.set_etag(etag)
+        # przeglądarka trzyma kopię, ale pyta o ETag -> 304 bez ciała
+        resp.headers["Cache-Control"] = "no-cache"
+        return resp.make_conditional(request)
+
     @app.get("/leagues")
     def get_leagues():
         conn = get_connection()
         cur = conn.cursor()
         try:
             cur.execute("SELECT DISTINCT league FROM football_matches ORDER BY league ASC;")
-            rows = cur.fetchall()
-            leagues = [first_col(r, "league") for r in rows]
+            leagues = [r[0] for r in cur.fetchall()]
             return jsonify(leagues)
         finally:
             try:
@@ -471,15 +1147,14 @@ def create_app():
         if not league_name:
             return jsonify({"error": "Bad Request", "message": "league is required"}), 400
 
-        conn = get_connection()
+        conn = get_connection(league_name)
         cur = conn.cursor()
         try:
             cur.execute(
                 "SELECT DISTINCT season FROM football_matches WHERE league = ? ORDER BY season ASC;",
                 (league_name,),
             )
-            rows = cur.fetchall()
-            seasons = [first_col(r, "season") for r in rows]
+            seasons = [r[0] for r in cur.fetchall()]
             return jsonify(seasons)
         finally:
             try:
@@ -490,176 +1165,287 @@ def create_app():
 
     @app.get("/teams")
     def get_teams():
-        league = request.args.get("league")
-        season = request.args.get("season")
+        league = request.args.get("league") or None
+        season = request.args.get("season") or None
         pretty = request.args.get("pretty", "0") in ("1", "true", "True", "yes")
 
-        where = ["1=1"]
-        params = []
+        payload, _status = cached_result("teams", (league, season, pretty),
+                                         lambda: build_team_list(league, season, pretty))
+        return jsonify(payload)
 
-        if league:
-            where.append("league = ?")
-            params.append(league)
-        if season:
-            where.append("season = ?")
-            params.append(season)
-
-        where_sql = " AND ".join(where)
-
-        sql = f"""
-            SELECT DISTINCT team FROM (
-                SELECT home_team AS team FROM football_matches WHERE {where_sql}
-                UNION
-                SELECT away_team AS team FROM football_matches WHERE {where_sql}
-            )
-            ORDER BY team ASC;
+    @app.get("/teams/search")
+    def search_teams():
         """
-
-        conn = get_connection()
-        cur = conn.cursor()
+        Autocomplete: ?q=prefiksy słów nazwy (bez wielkości liter i akcentów), po nazwach z bazy,
+        etykietach i aliasach TEAM_DISPLAY; opcjonalnie league i limit.
+        """
+        q = (request.args.get("q") or "").strip()
+        league = (request.args.get("league") or "").strip() or None
+        if not q:
+            return jsonify({"error": "Bad Request", "message": "q is required"}), 400
         try:
-            cur.execute(sql, tuple(params + params))  # where_sql jest 2x
-            teams = [first_col(r, "team") for r in cur.fetchall()]
-        finally:
-            try:
-                cur.close()
-            except Exception:
-                pass
-            conn.close()
-
-        if not pretty:
-            return jsonify(teams)
+            limit = parse_int("limit", request.args.get("limit"), 10, 1, MAX_TEAM_SEARCH_RESULTS)
+        except ValueError as e:
+            return jsonify({"error": "Bad Request", "message": str(e)}), 400
 
-        items = [{"value": t, "label": display_team(t)} for t in teams]
-        items.sort(key=lambda x: x["label"])
-        return jsonify(items)
+        results = team_search_index().search(q, league=league, limit=limit)
+        return respond({"query": q, "count": len(results)}, {"teams": results})
 
     #Poisson prediction
     @app.post("/predict")
+    @admission_controlled(predict_gate)
     def predict():
         data = request.get_json(silent=True) or {}
+        try:
+            args = parse_predict_request(data)
+        except ValueError as e:
+            return jsonify({"error": "Bad Request", "message": str(e)}), 400
 
-        league = (data.get("league") or "").strip()
-        season = (data.get("season") or "").strip() or None
-        home_team = (data.get("home_team") or "").strip()
-        away_team = (data.get("away_team") or "").strip()
+        payload, status = predict_cached(args)
+        if status == 200:
+            metrics.observe_training_matches(payload["training_matches_used"])
+            prediction_log.log(prediction_record(payload, "/predict"))
+        return jsonify(payload), status
 
-        #cutoff + okno historii
-        raw_match_date = (data.get("match_date") or "").strip() or None
-        history_mode = (data.get("history_mode") or "last_n").strip()
-        history_value_raw = data.get("history_value", 10)
+    @app.post("/predict/batch")
+    @admission_controlled(predict_gate)
+    def predict_batch():
+        """
+        {"matches": [{...jak /predict...}, ...]}; pola poza "matches" są domyślnymi dla pozycji.
+        Błąd pozycji nie przerywa reszty - wraca na jej miejscu jako {"error", "message"}.
+        """
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or not isinstance(data.get("matches"), list):
+            return jsonify({"error": "Bad Request", "message": "body must be an object with a 'matches' list"}), 400
 
-        if not league or not home_team or not away_team:
-            return jsonify({"error": "Bad Request", "message": "league, home_team, away_team are required"}), 400
-        if home_team == away_team:
-            return jsonify({"error": "Bad Request", "message": "Choose two different teams"}), 400
+        items = data["matches"]
+        if not items or len(items) > MAX_BATCH_PREDICT:
+            return jsonify({
+                "error": "Bad Request",
+                "message": f"matches must contain 1..{MAX_BATCH_PREDICT} items"
+            }), 400
 
-        # walidacja daty
+        defaults = {k: v for k, v in data.items() if k != "matches"}
+        results: list[dict] = []
+        ok: list[dict] = []
+        for item in items:
+            if not isinstance(item, dict):
+                results.append({"error": "Bad Request", "message": "each item must be an object"})
+                continue
+            try:
+                args = parse_predict_request({**defaults, **item})
+            except ValueError as e:
+                results.append({"error": "Bad Request", "message": str(e)})
+                continue
+
+            payload, status = build_prediction(*args)
+            results.append(payload)
+            if status == 200:
+                ok.append(payload)
+                metrics.observe_training_matches(payload["training_matches_used"])
+
+        # jedna siatka (m, G, G) i jedna redukcja dla całej paczki
+        attach_markets(ok)
+        for payload in ok:
+            prediction_log.log(prediction_record(payload, "/predict/batch"))
+        return respond(
+            {"count": len(results), "errors": len(results) - len(ok)},
+            {"predictions": results},
+        )
+
+    @app.post("/predict/sweep")
+    @admission_controlled(predict_gate)
+    def predict_sweep():
+        data = request.get_json(silent=True) or {}
         try:
-            match_date = parse_date("match_date", raw_match_date)  # str albo None
+            args = parse_sweep_request(data)
         except ValueError as e:
             return jsonify({"error": "Bad Request", "message": str(e)}), 400
 
-        # walidacja history_mode
-        if history_mode not in ("last_n", "last_days"):
-            return jsonify({"error": "Bad Request", "message": "history_mode must be 'last_n' or 'last_days'"}), 400
+        payload, status = build_sweep(*args)
+        if status != 200:
+            return jsonify(payload), status
+        windows = payload.pop("windows")
+        return respond(payload, {"windows": windows})
 
-        # walidacja history_value
-        try:
-            history_value = int(history_value_raw)
-        except Exception:
-            return jsonify({"error": "Bad Request", "message": "history_value must be an integer"}), 400
+    @app.post("/predict/live")
+    @admission_controlled(predict_gate)
+    def predict_live():
+        """
+        {"matches": [{...mecz jak w /predict..., "minute", "home_score", "away_score"}, ...]}
+        albo z gotowymi "lambda_home"/"lambda_away" zamiast pól meczu. Pola poza "matches"
+        są domyślnymi dla pozycji. Błąd pozycji wraca na jej miejscu jako {"error", "message"}.
+        """
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or not isinstance(data.get("matches"), list):
+            return jsonify({"error": "Bad Request", "message": "body must be an object with a 'matches' list"}), 400
 
-        if history_mode == "last_n":
-            if history_value < 1 or history_value > 5000:
-                return jsonify({"error": "Bad Request", "message": "history_value for last_n must be 1..5000"}), 400
-        else:
-            if history_value < 1 or history_value > 3650:
-                return jsonify({"error": "Bad Request", "message": "history_value for last_days must be 1..3650"}), 400
+        items = data["matches"]
+        if not items or len(items) > MAX_LIVE_MATCHES:
+            return jsonify({
+                "error": "Bad Request",
+                "message": f"matches must contain 1..{MAX_LIVE_MATCHES} items"
+            }), 400
 
-        conn = get_connection()
-        cur = conn.cursor()
+        defaults = {k: v for k, v in data.items() if k != "matches"}
+        results: list[dict] = []
+        live: list[tuple[int, float, float, float, int, int]] = []  # (pozycja, lh, la, minuta, gole)
+        for item in items:
+            if not isinstance(item, dict):
+                results.append({"error": "Bad Request", "message": "each item must be an object"})
+                continue
+            try:
+                minute, home_score, away_score = parse_live_state(item)
+                if "lambda_home" in item or "lambda_away" in item:
+                    lh, la = float(item["lambda_home"]), float(item["lambda_away"])
+                    if not (0 < lh <= 10 and 0 < la <= 10):
+                        raise ValueError("lambda_home and lambda_away must be in (0, 10]")
+                    result = {"source": "request"}
+                else:
+                    lambdas, error, source = prematch_lambdas(parse_predict_request({**defaults, **item}))
+                    if lambdas is None:
+                        results.append(error)
+                        continue
+                    lh, la = lambdas
+                    result = {"source": source, "home_team": item.get("home_team"), "away_team": item.get("away_team")}
+            except (KeyError, TypeError, ValueError) as e:
+                results.append({"error": "Bad Request", "message": str(e)})
+                continue
+
+            result.update(minute=minute, home_score=home_score, away_score=away_score, lambda_home=lh, lambda_away=la)
+            results.append(result)
+            live.append((len(results) - 1, lh, la, minute, home_score, away_score))
+
+        if live:
+            pos, lh, la, minute, hs, as_ = zip(*live)
+            remaining = [max(LIVE_MATCH_MINUTES - m, 0.0) / LIVE_MATCH_MINUTES for m in minute]
+            for i, out in zip(pos, live_outcomes(lh, la, remaining, hs, as_, MAX_GOALS)):
+                results[i].update(out)
+
+        return respond(
+            {"count": len(results), "errors": len(results) - len(live)},
+            {"matches": results},
+        )
+
+    @app.get("/predictions/evaluation")
+    @admission_controlled(stats_gate)
+    def predictions_evaluation():
+        """
+        Zalogowane predykcje (z match_date) złączone z wynikami, gdy już są w bazie.
+        Query: league?, date_from?, date_to?, limit. Rozliczone dostają log_loss i brier;
+        summary liczy średnie tylko z rozliczonych.
+        """
+        league = (request.args.get("league") or "").strip() or None
         try:
-            # Walidacja czy teams istnieją w lidze
-            where = ["league = ?"]
-            params: list[object] = [league]
-            if season:
-                where.append("season = ?")
-                params.append(season)
-            where_sql = " AND ".join(where)
+            date_from = parse_date("date_from", request.args.get("date_from"))
+            date_to = parse_date("date_to", request.args.get("date_to"))
+            limit = parse_int("limit", request.args.get("limit"), 500, 1, MAX_EVALUATION_ROWS)
+        except ValueError as e:
+            return jsonify({"error": "Bad Request", "message": str(e)}), 400
 
-            cur.execute(
-                f"""
-                SELECT 1
-                FROM football_matches
-                WHERE {where_sql}
-                  AND (home_team = ? OR away_team = ?)
-                LIMIT 1;
-                """,
-                tuple(params + [home_team, home_team]),
-            )
-            if cur.fetchone() is None:
-                return jsonify(
-                    {"error": "Bad Request", "message": "home_team not found in selected league/season"}), 400
+        logged = prediction_log.fetch(league, date_from, date_to, limit)
+        keys = list({(r[3], r[5], r[6], r[7]) for r in logged})
 
-            cur.execute(
-                f"""
-                SELECT 1
-                FROM football_matches
-                WHERE {where_sql}
-                  AND (home_team = ? OR away_team = ?)
-                LIMIT 1;
-                """,
-                tuple(params + [away_team, away_team]),
-            )
-            if cur.fetchone() is None:
-                return jsonify(
-                    {"error": "Bad Request", "message": "away_team not found in selected league/season"}), 400
+        conn = get_connection(league)
+        try:
+            results = match_results(conn, keys)
+        finally:
+            conn.close()
 
-            #tylko mecze sprzed match_date
-            rows = fetch_matches_for_predict(
-                conn,
-                league=league,
-                season=season,
-                cutoff_date=match_date,
-                history_mode=history_mode,
-                history_value=(history_value if match_date else 2000),
-            )
+        columns = [
+            "id", "logged_at", "route", "league", "season", "home_team", "away_team", "match_date",
+            "history_mode", "history_value", "lambda_home", "lambda_away", "p_home", "p_draw", "p_away",
+            "home_goals", "away_goals", "outcome", "log_loss", "brier",
+        ]
+        rows = []
+        n = hits = 0
+        log_loss_sum = brier_sum = 0.0
+        for r in logged:
+            result = results.get((r[3], r[5], r[6], r[7]))
+            if result is None:
+                rows.append(r + (None, None, None, None, None))
+                continue
+            hg, ag = result
+            actual = 0 if hg > ag else 1 if hg == ag else 2
+            probs = r[12:15]
+            log_loss = -math.log(max(probs[actual], 1e-15))
+            brier = sum((p - (1.0 if k == actual else 0.0)) ** 2 for k, p in enumerate(probs))
+            rows.append(r + (hg, ag, ("home_win", "draw", "away_win")[actual], log_loss, brier))
+
+            n += 1
+            log_loss_sum += log_loss
+            brier_sum += brier
+            hits += max(range(3), key=lambda k: probs[k]) == actual
+
+        summary = {
+            "logged": len(rows),
+            "resolved": n,
+            "pending": len(rows) - n,
+            "log_loss": log_loss_sum / n if n else None,
+            "brier": brier_sum / n if n else None,
+            "accuracy": hits / n if n else None,
+        }
+        return respond({"summary": summary}, {"predictions": (columns, rows)})
+
+    @app.get("/stats/elo")
+    @admission_controlled(stats_gate)
+    def elo_series():
+        league = request.args.get("league")
+        team = request.args.get("team")
 
-            lh, la = compute_lambdas_poisson(rows, home_team, away_team)
+        if not league or not team:
+            return jsonify({"error": "Bad Request", "message": "league and team are required"}), 400
 
-            mat = score_matrix(lh, la, max_goals=MAX_GOALS)
-            p_home, p_draw, p_away, best = outcome_probs(mat)
+        try:
+            date_from = parse_date("date_from", request.args.get("date_from"))
+            date_to = parse_date("date_to", request.args.get("date_to"))
+        except ValueError as e:
+            return jsonify({"error": "Bad Request", "message": str(e)}), 400
 
-            return jsonify({
-                "league": league,
-                "season": season,
-                "home_team": home_team,
-                "away_team": away_team,
-                "home_team_label": display_team(home_team),
-                "away_team_label": display_team(away_team),
-
-                # pomocne do debugowania
-                "cutoff_match_date": match_date,
-                "history": {"mode": history_mode, "value": history_value},
-
-                "lambda_home": lh,
-                "lambda_away": la,
-                "p_home": p_home,
-                "p_draw": p_draw,
-                "p_away": p_away,
-                "most_likely_score": best,
-                "max_goals": MAX_GOALS,
-                "training_matches_used": len(rows),
-            })
+        where = ["league = ?", "team = ?"]
+        params: list[object] = [league, team]
+        if date_from:
+            where.append("match_date >= ?")
+            params.append(date_from)
+        if date_to:
+            where.append("match_date <= ?")
+            params.append(date_to)
+
+        conn = get_connection(league)
+        try:
+            # zakres po kluczu głównym (league, team, match_date)
+            rows = conn.execute(
+                f"""
+                SELECT match_id, match_date, opponent, is_home, goals_for, goals_against, rating_pre, rating_post
+                FROM elo_history
+                WHERE {" AND ".join(where)}
+                ORDER BY match_date ASC, match_id ASC;
+                """,
+                tuple(params),
+            ).fetchall()
         finally:
-            try:
-                cur.close()
-            except Exception:
-                pass
             conn.close()
 
+        if not rows:
+            return jsonify({"error": "Not Found", "message": "No rating history for given league/team"}), 404
+
+        series_columns = ["match_id", "match_date", "opponent", "opponent_label", "venue", "score",
+                          "rating_pre", "rating_post"]
+        series = [
+            (r["match_id"], r["match_date"], r["opponent"], display_team(r["opponent"]),
+             "H" if r["is_home"] else "A", f"{r['goals_for']}-{r['goals_against']}",
+             r["rating_pre"], r["rating_post"])
+            for r in rows
+        ]
+        return respond({
+            "league": league,
+            "team": team,
+            "team_label": display_team(team),
+            "current_rating": rows[-1]["rating_post"],
+        }, {"series": (series_columns, series)})
+
     @app.get("/stats/team")
+    @admission_controlled(stats_gate)
     def team_stats():
         league = request.args.get("league")
         season = request.args.get("season")
@@ -676,10 +1462,10 @@ def create_app():
         except ValueError as e:
             return jsonify({"error": "Bad Request", "message": str(e)}), 400
 
-        conn = get_connection()
-        cur = conn.cursor()
+        conn = get_connection(league)
         try:
-            cur.execute(
+            rows = iter_rows(
+                conn,
                 """
                 SELECT
                     id, match_date, home_team, away_team, home_goals, away_goals
@@ -689,35 +1475,8 @@ def create_app():
                 """,
                 (league, season, team, team),
             )
-            rows = [dict(r) for r in cur.fetchall()]
-
-            if not rows:
-                return jsonify({
-                    "error": "Not Found",
-                    "message": "No matches found for given league/season/team"
-                }), 404
-
-            def outcome_for_team(r: dict) -> str:
-                hg, ag = r["home_goals"], r["away_goals"]
-                if hg is None or ag is None:
-                    return "U"
-                if r["home_team"] == team:
-                    if hg > ag: return "W"
-                    if hg < ag: return "L"
-                    return "D"
-                else:
-                    if ag > hg: return "W"
-                    if ag < hg: return "L"
-                    return "D"
-
-            def goals_for_against(r: dict) -> tuple[int | None, int | None]:
-                hg, ag = r["home_goals"], r["away_goals"]
-                if hg is None or ag is None:
-                    return None, None
-                if r["home_team"] == team:
-                    return hg, ag
-                return ag, hg
 
+            found = False
             played = 0
             wins = draws = losses = 0
             gf = ga = 0
@@ -726,17 +1485,22 @@ def create_app():
             home_w = home_d = home_l = 0
             away_w = away_d = away_l = 0
 
-            for r in rows:
-                out = outcome_for_team(r)
-                if out == "U":
+            # tylko ostatnie last_n meczów z wynikiem zostaje w pamięci
+            last_matches: deque[tuple] = deque(maxlen=last_n)
+
+            for match_id, match_date, h, a, hg, ag in rows:
+                found = True
+                if hg is None or ag is None:
                     continue
 
+                is_home = (h == team)
+                gfor, gagainst = (hg, ag) if is_home else (ag, hg)
+                out = "W" if gfor > gagainst else "L" if gfor < gagainst else "D"
+
                 played += 1
-                gfor, gagainst = goals_for_against(r)
                 gf += gfor
                 ga += gagainst
 
-                is_home = (r["home_team"] == team)
                 if is_home:
                     home_played += 1
                 else:
@@ -750,63 +1514,56 @@ def create_app():
                     draws += 1
                     if is_home: home_d += 1
                     else: away_d += 1
-                elif out == "L":
+                else:
                     losses += 1
                     if is_home: home_l += 1
                     else: away_l += 1
 
-            last_matches_src = [r for r in rows if r["home_goals"] is not None and r["away_goals"] is not None]
-            last_matches = last_matches_src[-last_n:] if last_matches_src else []
-            form = "".join(outcome_for_team(r) for r in last_matches)
-
-            def fmt_match(r: dict) -> dict:
-                return {
-                    "id": r["id"],
-                    "match_date": r["match_date"],
-                    "home_team": r["home_team"],
-                    "away_team": r["away_team"],
-                    "home_goals": r["home_goals"],
-                    "away_goals": r["away_goals"],
-                    "team_result": outcome_for_team(r),
-                    "is_home": (r["home_team"] == team),
-                }
-
-            return jsonify({
-                "league": league,
-                "season": season,
-                "team": team,
-                "played": played,
-                "wins": wins,
-                "draws": draws,
-                "losses": losses,
-                "goals_for": gf,
-                "goals_against": ga,
-                "goals_for_per_game": round(gf / played, 3) if played else None,
-                "goals_against_per_game": round(ga / played, 3) if played else None,
-                "home": {"played": home_played, "wins": home_w, "draws": home_d, "losses": home_l},
-                "away": {"played": away_played, "wins": away_w, "draws": away_d, "losses": away_l},
-                "form_last_n": {"n": last_n, "sequence": form},
-                "last_matches": [fmt_match(r) for r in last_matches],
-                "note": "Stats ignore matches with missing scores (home_goals/away_goals is NULL).",
-            })
+                last_matches.append((match_id, match_date, h, a, hg, ag, out, is_home))
         finally:
-            try:
-                cur.close()
-            except Exception:
-                pass
             conn.close()
 
+        if not found:
+            return jsonify({
+                "error": "Not Found",
+                "message": "No matches found for given league/season/team"
+            }), 404
+
+        form = "".join(r[6] for r in last_matches)
+        last_columns = ["id", "match_date", "home_team", "away_team", "home_goals", "away_goals",
+                        "team_result", "is_home"]
+
+        return respond({
+            "league": league,
+            "season": season,
+            "team": team,
+            "played": played,
+            "wins": wins,
+            "draws": draws,
+            "losses": losses,
+            "goals_for": gf,
+            "goals_against": ga,
+            "goals_for_per_game": round(gf / played, 3) if played else None,
+            "goals_against_per_game": round(ga / played, 3) if played else None,
+            "home": {"played": home_played, "wins": home_w, "draws": home_d, "losses": home_l},
+            "away": {"played": away_played, "wins": away_w, "draws": away_d, "losses": away_l},
+            "form_last_n": {"n": last_n, "sequence": form},
+            "note": "Stats ignore matches with missing scores (home_goals/away_goals is NULL).",
+        }, {"last_matches": (last_columns, list(last_matches))})
+
     @app.get("/stats/h2h")
+    @admission_controlled(stats_gate)
     def h2h_stats():
         league = request.args.get("league")
         season = request.args.get("season")
         home_team = request.args.get("home_team")
         away_team = request.args.get("away_team")
 
-        if not league or not home_team or not away_team:
+        # league opcjonalne: bez niego szukamy meczów pary we wszystkich ligach (puchary itp.)
+        if not home_team or not away_team:
             return jsonify({
                 "error": "Bad Request",
-                "message": "league, home_team and away_team are required"
+                "message": "home_team and away_team are required"
             }), 400
 
         try:
@@ -814,95 +1571,91 @@ def create_app():
         except ValueError as e:
             return jsonify({"error": "Bad Request", "message": str(e)}), 400
 
-        where = ["league = ?"]
-        params = [league]
+        # indeks (pair_key, match_date) -> odczyt zakresu zamiast skanu ligi
+        key = pair_key(home_team, away_team)
+        where = ["pair_key = ?"]
+        params: list[object] = [key]
+
+        if league:
+            where.append("league = ?")
+            params.append(league)
 
         if season:
             where.append("season = ?")
             params.append(season)
 
-        where.append("""
-            (
-                (home_team = ? AND away_team = ?)
-                OR
-                (home_team = ? AND away_team = ?)
-            )
-        """)
-        params.extend([home_team, away_team, away_team, home_team])
-
         where_sql = " AND ".join(where)
 
         sql = f"""
-            SELECT id, season, match_date, home_team, away_team, home_goals, away_goals
+            SELECT id, league, season, match_date, home_team, away_team, home_goals, away_goals
             FROM football_matches
             WHERE {where_sql}
             ORDER BY match_date DESC
             LIMIT ?;
         """
 
-        conn = get_connection()
-        cur = conn.cursor()
-        try:
-            cur.execute(sql, tuple(params + [last_n]))
-            rows = [dict(r) for r in cur.fetchall()]
+        summary_where = ["pair_key = ?"]
+        summary_params: list[object] = [key]
+        if league:
+            summary_where.append("league = ?")
+            summary_params.append(league)
+        if season:
+            summary_where.append("season = ?")
+            summary_params.append(season)
 
-            if not rows:
-                return jsonify({
-                    "error": "Not Found",
-                    "message": "No head-to-head matches found for given filters"
-                }), 404
+        summary_sql = f"""
+            SELECT
+                COALESCE(SUM(played), 0),
+                COALESCE(SUM(team_a_wins), 0),
+                COALESCE(SUM(draws), 0),
+                COALESCE(SUM(team_b_wins), 0),
+                COALESCE(SUM(team_a_goals), 0),
+                COALESCE(SUM(team_b_goals), 0)
+            FROM h2h_summary
+            WHERE {" AND ".join(summary_where)};
+        """
 
+        conn = get_connection(league)
+        cur = conn.cursor()
+        try:
             w = d = l = 0
             gf = ga = 0
             counted = 0
 
-            def result_from_perspective(r: dict) -> str:
-                hg, ag = r["home_goals"], r["away_goals"]
+            match_columns = ["id", "league", "season", "match_date", "home_team", "away_team",
+                             "home_goals", "away_goals", "result_for_home_team_param"]
+            formatted = []
+            for match_id, lg, ssn, match_date, h, a, hg, ag in iter_rows(conn, sql, tuple(params + [last_n])):
                 if hg is None or ag is None:
-                    return "U"
-                if r["home_team"] == home_team:
-                    if hg > ag: return "W"
-                    if hg < ag: return "L"
-                    return "D"
+                    res = "U"
                 else:
-                    if ag > hg: return "W"
-                    if ag < hg: return "L"
-                    return "D"
-
-            def goals_from_perspective(r: dict) -> tuple[int | None, int | None]:
-                hg, ag = r["home_goals"], r["away_goals"]
-                if hg is None or ag is None:
-                    return None, None
-                if r["home_team"] == home_team:
-                    return hg, ag
-                return ag, hg
+                    gfor, gagainst = (hg, ag) if h == home_team else (ag, hg)
+                    res = "W" if gfor > gagainst else "L" if gfor < gagainst else "D"
 
-            formatted = []
-            for r in rows:
-                res = result_from_perspective(r)
-                gfor, gagainst = goals_from_perspective(r)
-
-                if res != "U":
                     counted += 1
                     gf += gfor
                     ga += gagainst
                     if res == "W": w += 1
                     elif res == "D": d += 1
-                    elif res == "L": l += 1
+                    else: l += 1
 
-                formatted.append({
-                    "id": r["id"],
-                    "league": league,
-                    "season": r.get("season"),
-                    "match_date": r["match_date"],
-                    "home_team": r["home_team"],
-                    "away_team": r["away_team"],
-                    "home_goals": r["home_goals"],
-                    "away_goals": r["away_goals"],
-                    "result_for_home_team_param": res,
-                })
+                formatted.append((match_id, lg, ssn, match_date, h, a, hg, ag, res))
 
-            return jsonify({
+            if not formatted:
+                return jsonify({
+                    "error": "Not Found",
+                    "message": "No head-to-head matches found for given filters"
+                }), 404
+
+            # agregaty dla całej historii pary (w ramach filtrów), z perspektywy home_team
+            cur.execute(summary_sql, tuple(summary_params))
+            played, a_w, s_d, b_w, a_g, b_g = cur.fetchone()
+            if home_team == key.split(PAIR_KEY_SEP, 1)[0]:
+                all_w, all_l, all_gf, all_ga = a_w, b_w, a_g, b_g
+            else:
+                all_w, all_l, all_gf, all_ga = b_w, a_w, b_g, a_g
+
+            return respond({
                 "league": league,
                 "season": season,
                 "home_team": home_team,
@@ -912,8 +1665,15 @@ def create_app():
                 "record_for_home_team": {"wins": w, "draws": d, "losses": l},
                 "goals_for_home_team": gf,
                 "goals_against_home_team": ga,
-                "matches": formatted,
-            })
+                "all_time_for_home_team": {
+                    "played": played,
+                    "wins": all_w,
+                    "draws": s_d,
+                    "losses": all_l,
+                    "goals_for": all_gf,
+                    "goals_against": all_ga,
+                },
+            }, {"matches": (match_columns, formatted)})
         finally:
             try:
                 cur.close()
@@ -922,6 +1682,7 @@ def create_app():
             conn.close()
 
     @app.get("/stats/table")
+    @admission_controlled(stats_gate)
     def league_table():
         league = request.args.get("league")
         season = request.args.get("season")
@@ -932,90 +1693,102 @@ def create_app():
                 "message": "league and season are required"
             }), 400
 
-        conn = get_connection()
-        cur = conn.cursor()
-        try:
-            cur.execute(
-                """
-                SELECT home_team, away_team, home_goals, away_goals
-                FROM football_matches
-                WHERE league = ? AND season = ?
-                  AND home_goals IS NOT NULL AND away_goals IS NOT NULL;
-                """,
-                (league, season),
-            )
-            rows = cur.fetchall()
+        payload, status = table_flight.do(
+            ("table", league, season),
+            lambda: cached_result("table", (league, season), lambda: build_league_table(league, season)),
+        )
+        return jsonify(payload), status
 
-            table = {}
-
-            def ensure_team(t: str):
-                if t not in table:
-                    table[t] = {
-                        "team": t,
-                        "played": 0,
-                        "wins": 0,
-                        "draws": 0,
-                        "losses": 0,
-                        "goals_for": 0,
-                        "goals_against": 0,
-                        "goal_diff": 0,
-                        "points": 0,
-                    }
-
-            for r in rows:
-                h = r["home_team"]
-                a = r["away_team"]
-                hg = r["home_goals"]
-                ag = r["away_goals"]
-
-                ensure_team(h)
-                ensure_team(a)
-
-                table[h]["played"] += 1
-                table[a]["played"] += 1
-
-                table[h]["goals_for"] += hg
-                table[h]["goals_against"] += ag
-                table[a]["goals_for"] += ag
-                table[a]["goals_against"] += hg
-
-                if hg > ag:
-                    table[h]["wins"] += 1
-                    table[a]["losses"] += 1
-                    table[h]["points"] += 3
-                elif hg < ag:
-                    table[a]["wins"] += 1
-                    table[h]["losses"] += 1
-                    table[a]["points"] += 3
-                else:
-                    table[h]["draws"] += 1
-                    table[a]["draws"] += 1
-                    table[h]["points"] += 1
-                    table[a]["points"] += 1
+    @app.get("/stats/xpts")
+    @admission_controlled(stats_gate)
+    def xpts_table():
+        league = request.args.get("league")
+        season = request.args.get("season")
 
-            items = list(table.values())
-            for it in items:
-                it["goal_diff"] = it["goals_for"] - it["goals_against"]
+        if not league or not season:
+            return jsonify({
+                "error": "Bad Request",
+                "message": "league and season are required"
+            }), 400
+        try:
+            history_mode, history_value = parse_history(request.args, league)
+        except ValueError as e:
+            return jsonify({"error": "Bad Request", "message": str(e)}), 400
 
-            items.sort(key=lambda x: (-x["points"], -x["goal_diff"], -x["goals_for"], x["team"]))
+        args = (league, season, history_mode, history_value)
+        payload, status = xpts_flight.do(
+            args,
+            lambda: cached_result("xpts", args, lambda: build_xpts_table(*args), league=league),
+        )
+        if status != 200:
+            return jsonify(payload), status
+        # payload bywa współdzielony (single-flight), więc bez pop()
+        return respond({k: v for k, v in payload.items() if k != "teams"}, {"teams": payload["teams"]})
+
+    @app.get("/fixtures/upcoming")
+    @admission_controlled(matches_gate)
+    def upcoming_fixtures():
+        """
+        Predykcje meczów bez wyniku policzone przy imporcie (fixtures.py), jednym odczytem
+        zakresu indeksu. Bez date_from - od najbliższego dnia z meczami (od dziś).
+        """
+        league = (request.args.get("league") or "").strip() or None
+        try:
+            date_from = parse_date("date_from", request.args.get("date_from"))
+            date_to = parse_date("date_to", request.args.get("date_to"))
+            limit = parse_int("limit", request.args.get("limit"), default=200, min_v=1, max_v=MAX_UPCOMING_FIXTURES)
+        except ValueError as e:
+            return jsonify({"error": "Bad Request", "message": str(e)}), 400
 
-            for i, it in enumerate(items, start=1):
-                it["rank"] = i
+        where = ["match_date >= ?"]
+        params: list[object] = []
+        if league:
+            where.append("league = ?")
+            params.append(league)
 
-            return jsonify({
-                "league": league,
-                "season": season,
-                "teams": items,
-                "note": "Table computed from matches with non-null scores only. Tiebreakers: points, goal_diff, goals_for, team name.",
-            })
+        conn = get_connection(league, read_only=True)
+        try:
+            if date_from is None:
+                row = conn.execute(
+                    f"SELECT MIN(match_date) FROM upcoming_predictions WHERE {' AND '.join(where)};",
+                    (date.today().isoformat(), *params),
+                ).fetchone()
+                date_from = row[0]
+            if date_from is not None and date_to is None:
+                date_to = (date.fromisoformat(date_from) + timedelta(days=UPCOMING_DEFAULT_DAYS - 1)).isoformat()
+
+            fixtures = []
+            if date_from is not None:
+                cur = conn.execute(
+                    f"""
+                    SELECT match_id, match_date, prediction
+                    FROM upcoming_predictions
+                    WHERE {' AND '.join(where)} AND match_date <= ?
+                    ORDER BY match_date ASC, league ASC, home_team ASC
+                    LIMIT ?;
+                    """,
+                    (date_from, *params, date_to, limit),
+                )
+                for match_id, match_date, prediction in cur.fetchall():
+                    item = json.loads(prediction)
+                    item["match_id"] = match_id
+                    item["match_date"] = match_date
+                    item["home_team_label"] = display_team(item["home_team"])
+                    item["away_team_label"] = display_team(item["away_team"])
+                    fixtures.append(item)
         finally:
-            try:
-                cur.close()
-            except Exception:
-                pass
             conn.close()
 
+        return respond({
+            "league": league,
+            "date_from": date_from,
+            "date_to": date_to,
+            "limit": limit,
+            "count": len(fixtures),
+        }, {"fixtures": fixtures})
+
     @app.get("/matches")
+    @admission_controlled(matches_gate)
     def get_matches():
         league = request.args.get("league")
         season = request.args.get("season")
@@ -1081,18 +1854,17 @@ def create_app():
         """
         count_sql = f"SELECT COUNT(*) FROM football_matches WHERE {where_sql};"
 
-        conn = get_connection()
+        conn = get_connection(league)
         cur = conn.cursor()
         try:
             cur.execute(count_sql, tuple(params))
             total = cur.fetchone()[0]
 
             cur.execute(data_sql, tuple(params + [limit, offset]))
+            columns = [d[0] for d in cur.description]
             rows = cur.fetchall()
-            items = [dict(r) for r in rows]
 
-            return jsonify({
-                "items": items,
+            return respond({
                 "total": total,
                 "limit": limit,
                 "offset": offset,
@@ -1105,7 +1877,7 @@ def create_app():
                     "result": result,
                     "sort": sort,
                 },
-            })
+            }, {"items": (columns, rows)})
         finally:
             try:
                 cur.close()
@@ -1113,12 +1885,116 @@ def create_app():
                 pass
             conn.close()
 
+    @app.post("/matches/bulk")
+    def bulk_upsert_matches():
+        if not INGEST_API_TOKEN:
+            return jsonify({"error": "Forbidden", "message": "Bulk ingestion is disabled (INGEST_API_TOKEN not set)"}), 403
+
+        auth = request.headers.get("Authorization", "")
+        token = auth[len("Bearer "):] if auth.startswith("Bearer ") else ""
+        if not hmac.compare_digest(token.encode("utf-8"), INGEST_API_TOKEN.encode("utf-8")):
+            return jsonify({"error": "Unauthorized", "message": "Invalid or missing bearer token"}), 401
+
+        data = request.get_json(silent=True)
+        # akceptujemy listę rekordów albo {"league", "season", "matches": [...]}
+        if isinstance(data, list):
+            data = {"matches": data}
+        if not isinstance(data, dict) or not isinstance(data.get("matches"), list):
+            return jsonify({"error": "Bad Request", "message": "matches must be a list of match objects"}), 400
+
+        records = data["matches"]
+        default_league = (data.get("league") or "").strip() or None
+        default_season = data.get("season")
+
+        if not records:
+            return jsonify({"error": "Bad Request", "message": "matches must not be empty"}), 400
+        if len(records) > MAX_BULK_ROWS:
+            return jsonify({"error": "Payload Too Large", "message": f"at most {MAX_BULK_ROWS} matches per request"}), 413
+
+        rows = []
+        errors = []
+        for i, rec in enumerate(records):
+            if not isinstance(rec, dict):
+                errors.append({"index": i, "message": "match must be an object"})
+            else:
+                try:
+                    rows.append(normalize_match_record(rec, default_league, default_season))
+                except ValueError as e:
+                    errors.append({"index": i, "message": str(e)})
+            if len(errors) >= MAX_BULK_ERRORS:
+                break
+
+        # wszystko albo nic: jeden zły wiersz odrzuca całą paczkę
+        if errors:
+            return jsonify({"error": "Bad Request", "message": "Invalid match rows", "errors": errors}), 400
+
+        upsert_matches(rows)
+        invalidate_data_version()
+
+        return jsonify({
+            "upserted": len(rows),
+            "leagues": sorted({r[0] for r in rows}),
+        })
+
+    @app.post("/jobs")
+    def submit_job():
+        data = request.get_json(silent=True) or {}
+        kind = (data.get("kind") or "").strip()
+        spec = data.get("spec") or {}
+
+        try:
+            job, created = job_manager.submit(kind, spec)
+        except ValueError as e:
+            return jsonify({"error": "Bad Request", "message": str(e)}), 400
+        except JobQueueFull:
+            resp = jsonify({"error": "Service Unavailable", "message": "Too many pending jobs, try again later"})
+            resp.headers["Retry-After"] = "5"
+            return resp, 503
+
+        return jsonify(job), (202 if created else 200)
+
+    @app.get("/jobs/<job_id>")
+    def get_job(job_id: str):
+        row = job_manager.get(job_id)
+        if row is None:
+            return jsonify({"error": "Not Found", "message": "Job not found"}), 404
+        return jsonify(job_public(row))
+
+    @app.get("/jobs/<job_id>/result")
+    def get_job_result(job_id: str):
+        row = job_manager.get(job_id)
+        if row is None:
+            return jsonify({"error": "Not Found", "message": "Job not found"}), 404
+        if row["status"] != "done":
+            return jsonify({
+                "error": "Conflict",
+                "message": f"Job is not finished (status={row['status']})",
+                "status": row["status"],
+                "job_error": row["error"],
+            }), 409
+        return jsonify({"id": row["id"], "result": json.loads(row["result"])})
+
+    @app.post("/jobs/<job_id>/cancel")
+    def cancel_job(job_id: str):
+        row = job_manager.cancel(job_id)
+        if row is None:
+            return jsonify({"error": "Not Found", "message": "Job not found"}), 404
+        return jsonify(job_public(row))
+
     @app.get("/matches/<int:match_id>")
     def get_match_by_id(match_id: int):
         conn = get_connection()
         cur = conn.cursor()
         try:
-            cur.execute("SELECT * FROM football_matches WHERE id = ?;", (match_id,))
+            # jawne kolumny: SELECT * zwróciłby też wirtualne pair_key
+            cur.execute(
+                """
+                SELECT id, league, season, home_team, away_team, match_date, home_goals, away_goals
+                FROM football_matches
+                WHERE id = ?;
+                """,
+                (match_id,),
+            )
             row = cur.fetchone()
             if row:
                 return jsonify(dict(row))
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import numpy as np
+
+from markets import outcome_probs_batch, score_grids
+from model import lambdas_vectorized, pair_contributions
+
+# stały seed: ten sam request -> te same przedziały (cache, single-flight)
+BOOTSTRAP_SEED = 12345
+
+# limit elementów macierzy krotności w jednej paczce prób (pamięć)
+BOOTSTRAP_CHUNK_CELLS = 2_000_000
+
+
+def bootstrap_intervals(
+    rows: list[tuple],
+    home_team: str,
+    away_team: str,
+    n_resamples: int,
+    level: float,
+    max_goals: int,
+    k: float,
+    lambda_min: float,
+    lambda_max: float,
+    weights: list[float] | None = None,
+) -> dict:
+    """
+    Przedziały ufności (percentylowe) dla lambd i H/D/A: losowanie meczów historii ze zwracaniem.
+    Każda próba to wektor krotności meczów, więc agregaty wszystkich prób to jedno mnożenie
+    macierzy (B, n) @ (n, 3|6), a lambdy i siatki liczone są wektorowo dla całej paczki.
+    rows: (match_date, home_team, away_team, home_goals, away_goals); weights - wagi meczów
+    (exp_decay), mnożone przez krotności.
+    """
+    n = len(rows)
+    contrib = pair_contributions(rows, home_team, away_team)
+    if weights is not None:
+        contrib = contrib * np.asarray(weights, dtype=float)[:, None]
+
+    rng = np.random.default_rng(BOOTSTRAP_SEED)
+    chunk = max(1, BOOTSTRAP_CHUNK_CELLS // n)
+    parts = []
+    for start in range(0, n_resamples, chunk):
+        b = min(chunk, n_resamples - start)
+        # krotności: bincount indeksów przesuniętych o numer próby
+        idx = rng.integers(0, n, size=(b, n), dtype=np.int32) + (np.arange(b, dtype=np.int32) * n)[:, None]
+        counts = np.bincount(idx.ravel(), minlength=b * n).reshape(b, n).astype(float)
+        parts.append(counts @ contrib)
+    agg = np.concatenate(parts)
+
+    lh, la = lambdas_vectorized(agg[:, 0:3], agg[:, 3:9], agg[:, 9:15], k, lambda_min, lambda_max)
+    probs = outcome_probs_batch(score_grids(lh, la, max_goals))
+
+    q = [(1.0 - level) / 2.0 * 100.0, (1.0 + level) / 2.0 * 100.0]
+
+    def interval(x: np.ndarray) -> list[float]:
+        lo, hi = np.percentile(x, q)
+        return [float(lo), float(hi)]
+
+    return {
+        "level": level,
+        "resamples": n_resamples,
+        "lambda_home": interval(lh),
+        "lambda_away": interval(la),
+        "p_home": interval(probs[:, 0]),
+        "p_draw": interval(probs[:, 1]),
+        "p_away": interval(probs[:, 2]),
+    }
@@ -0,0 +1,268 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import db
+
+# "memory" - w procesie; "sqlite" - wspólny plik dla wszystkich workerów na hoście; "off"
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_DB_PATH = Path(os.getenv("CACHE_DB_PATH", db.BASE_DIR / "data" / "cache.db"))
+
+# trafienie w sqlite przesuwa accessed najwyżej co tyle sekund (bez zapisu przy każdym odczycie)
+CACHE_TOUCH_S = 30.0
+# po przekroczeniu limitu usuwamy najdawniej używane, aż zejdziemy do tej części limitu
+CACHE_EVICT_TO = 0.9
+
+
+def cache_key(namespace: str, *parts) -> str:
+    """Klucz z przestrzeni (np. "predict") i znormalizowanych parametrów; wersję danych dokłada wołający."""
+    raw = json.dumps([namespace, *parts], sort_keys=True, separators=(",", ":"), default=str)
+    return namespace + ":" + hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Wspólna część backendów: (payload, status) jako bajty JSON, liczniki trafień per przestrzeń.
+    Cache jest pomocniczy - błąd backendu to chybienie, nie błąd requestu.
+    """
+
+    name = "off"
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._stats_lock = threading.Lock()
+        self.requests: dict[tuple[str, str], int] = {}  # (namespace, hit|miss) -> count
+        self.evictions = 0
+        self.errors = 0
+
+    def _count(self, key: str, outcome: str):
+        namespace = key.split(":", 1)[0]
+        with self._stats_lock:
+            k = (namespace, outcome)
+            self.requests[k] = self.requests.get(k, 0) + 1
+
+    def _get(self, key: str) -> bytes | None:
+        return None
+
+    def _set(self, key: str, value: bytes):
+        pass
+
+    def get(self, key: str) -> tuple[object, int] | None:
+        try:
+            value = self._get(key)
+        except sqlite3.Error:
+            value = None
+            with self._stats_lock:
+                self.errors += 1
+        self._count(key, "miss" if value is None else "hit")
+        if value is None:
+            return None
+        payload, status = json.loads(value)
+        return payload, status
+
+    def set(self, key: str, payload, status: int):
+        value = json.dumps([payload, status], separators=(",", ":")).encode("utf-8")
+        if len(value) > self.max_bytes:
+            return
+        try:
+            self._set(key, value)
+        except sqlite3.Error:
+            with self._stats_lock:
+                self.errors += 1
+
+    def cached(self, key: str, compute) -> tuple[object, int]:
+        """(payload, status) z cache albo z compute(); zapisujemy tylko odpowiedzi 200."""
+        hit = self.get(key)
+        if hit is not None:
+            return hit
+        payload, status = compute()
+        if status == 200:
+            self.set(key, payload, status)
+        return payload, status
+
+    def size(self) -> tuple[int, int]:
+        """(entries, bytes)"""
+        return 0, 0
+
+    def stats(self) -> dict:
+        entries, size = self.size()
+        with self._stats_lock:
+            return {
+                "backend": self.name,
+                "requests": dict(self.requests),
+                "evictions": self.evictions,
+                "errors": self.errors,
+                "entries": entries,
+                "bytes": size,
+                "max_bytes": self.max_bytes,
+            }
+
+
+class MemoryCache(ResultCache):
+    """LRU w pamięci procesu, ograniczony łącznym rozmiarem wartości."""
+
+    name = "memory"
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES):
+        super().__init__(max_bytes)
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+        self._bytes = 0
+
+    def _get(self, key: str) -> bytes | None:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def _set(self, key: str, value: bytes):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = value
+            self._bytes += len(value)
+            evicted = 0
+            while self._bytes > self.max_bytes:
+                _k, v = self._entries.popitem(last=False)
+                self._bytes -= len(v)
+                evicted += 1
+        if evicted:
+            with self._stats_lock:
+                self.evictions += evicted
+
+    def size(self) -> tuple[int, int]:
+        with self._lock:
+            return len(self._entries), self._bytes
+
+
+class SqliteCache(ResultCache):
+    """
+    Wspólny cache workerów na jednym hoście: plik SQLite w trybie WAL (czytający nie czekają
+    na zapisujących). Łączny rozmiar trzymają triggery w cache_meta, więc sprawdzenie limitu
+    po zapisie to jeden odczyt; eviction usuwa najdawniej używane wpisy (indeks po accessed).
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: Path | str = CACHE_DB_PATH, max_bytes: int = CACHE_MAX_BYTES):
+        super().__init__(max_bytes)
+        self.path = str(path)
+        self._local = threading.local()
+
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        conn = self._conn()
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    accessed REAL NOT NULL
+                );
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache (accessed);")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_meta (
+                    id INTEGER PRIMARY KEY CHECK (id = 0),
+                    bytes INTEGER NOT NULL
+                );
+            """)
+            conn.execute("INSERT OR IGNORE INTO cache_meta (id, bytes) VALUES (0, 0);")
+            # licznik z pliku po starszej wersji mógł się rozjechać - synchronizacja przy starcie
+            conn.execute("UPDATE cache_meta SET bytes = (SELECT COALESCE(SUM(size), 0) FROM cache) WHERE id = 0;")
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_cache_insert AFTER INSERT ON cache
+                BEGIN UPDATE cache_meta SET bytes = bytes + NEW.size WHERE id = 0; END;
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_cache_delete AFTER DELETE ON cache
+                BEGIN UPDATE cache_meta SET bytes = bytes - OLD.size WHERE id = 0; END;
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_cache_update AFTER UPDATE OF size ON cache
+                BEGIN UPDATE cache_meta SET bytes = bytes - OLD.size + NEW.size WHERE id = 0; END;
+            """)
+
+    def _conn(self):
+        # połączenie per wątek (sqlite3 nie dzieli połączeń między wątkami)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.execute("PRAGMA synchronous=NORMAL;")
+            self._local.conn = conn
+        return conn
+
+    def _get(self, key: str) -> bytes | None:
+        conn = self._conn()
+        row = conn.execute("SELECT value, accessed FROM cache WHERE key = ?;", (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if now - row[1] > CACHE_TOUCH_S:
+            with conn:
+                conn.execute("UPDATE cache SET accessed = ? WHERE key = ?;", (now, key))
+        return row[0]
+
+    def _set(self, key: str, value: bytes):
+        conn = self._conn()
+        with conn:
+            # upsert, nie INSERT OR REPLACE: usunięcie przez REPLACE nie odpala triggera DELETE
+            # (bez recursive_triggers), więc licznik w cache_meta rósłby przy każdym nadpisaniu
+            conn.execute(
+                """
+                INSERT INTO cache (key, value, size, accessed) VALUES (?, ?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET
+                    value = excluded.value, size = excluded.size, accessed = excluded.accessed;
+                """,
+                (key, value, len(value), time.time()),
+            )
+            total = conn.execute("SELECT bytes FROM cache_meta WHERE id = 0;").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+
+            evicted = 0
+            target = self.max_bytes * CACHE_EVICT_TO
+            cur = conn.execute("SELECT key, size FROM cache ORDER BY accessed ASC;")
+            victims = []
+            for victim, size in cur:
+                if total <= target:
+                    break
+                if victim == key:
+                    continue
+                victims.append((victim,))
+                total -= size
+            cur.close()
+            conn.executemany("DELETE FROM cache WHERE key = ?;", victims)
+            evicted += len(victims)
+        with self._stats_lock:
+            self.evictions += evicted
+
+    def size(self) -> tuple[int, int]:
+        try:
+            conn = self._conn()
+            entries = conn.execute("SELECT COUNT(*) FROM cache;").fetchone()[0]
+            total = conn.execute("SELECT bytes FROM cache_meta WHERE id = 0;").fetchone()[0]
+            return entries, total
+        except sqlite3.Error:
+            return 0, 0
+
+
+def create_cache(backend: str = CACHE_BACKEND) -> ResultCache:
+    if backend == "sqlite":
+        return SqliteCache()
+    if backend == "memory":
+        return MemoryCache()
+    if backend == "off":
+        return ResultCache()
+    raise ValueError(f"CACHE_BACKEND must be 'memory', 'sqlite' or 'off', got {backend!r}")
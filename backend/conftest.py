@@ -0,0 +1,30 @@
+import shutil
+from functools import partial
+
+import pytest
+
+import db
+
+
+@pytest.fixture
+def sports_db(tmp_path, monkeypatch):
+    """Kopia data/sports.db w tmp_path - testy zapisu nie ruszają bazy z repo."""
+    path = tmp_path / "sports.db"
+    shutil.copy(db.BASE_DIR / "data" / "sports.db", path)
+    monkeypatch.setattr(db, "DB_PATH", path)
+    monkeypatch.setattr(db, "STORAGE_MODE", "single")
+    return path
+
+
+@pytest.fixture
+def client(sports_db, tmp_path, monkeypatch):
+    import app as app_module
+    from cache import MemoryCache
+
+    monkeypatch.setattr(app_module, "INGEST_API_TOKEN", "test-token")
+    monkeypatch.setattr(app_module, "result_cache", MemoryCache())
+    monkeypatch.setattr(app_module, "JobManager", partial(app_module.JobManager, tmp_path / "jobs.db"))
+    monkeypatch.setattr(app_module, "PredictionLog", partial(app_module.PredictionLog, tmp_path / "predictions.db"))
+    app_module.invalidate_data_version()
+    yield app_module.create_app().test_client()
+    app_module.invalidate_data_version()
@@ -1,27 +1,231 @@
+import os
 import sqlite3
+import time
+import zlib
+from contextvars import ContextVar
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import pandas as pd
 from datetime import datetime
 import re
 
+from decay import ensure_decay_schema, update_decay_states
+from elo import ensure_elo_schema, update_elo
+from fixtures import UPCOMING_COLUMNS, ensure_upcoming_schema, update_upcoming_predictions
+
 
 BASE_DIR = Path(__file__).resolve().parent.parent
-DB_PATH = BASE_DIR / "data" / "sports.db"
+DB_PATH = Path(os.getenv("SPORTS_DB_PATH", BASE_DIR / "data" / "sports.db"))
+
+# "single" - wszystko w data/sports.db
+# "partitioned" - osobny plik SQLite na ligę w data/partitions/
+STORAGE_MODE = os.getenv("SPORTS_DB_STORAGE", "single")
+PARTITION_DIR = BASE_DIR / "data" / "partitions"
+
+# SQLite domyślnie pozwala na 10 ATTACH na połączenie
+MAX_ATTACHED_PARTITIONS = 10
+
+MATCH_COLUMNS = "id, league, season, home_team, away_team, match_date, home_goals, away_goals, pair_key"
+H2H_SUMMARY_COLUMNS = (
+    "pair_key, league, season, team_a, team_b, "
+    "played, team_a_wins, draws, team_b_wins, team_a_goals, team_b_goals"
+)
+IMPORT_LOG_COLUMNS = "id, source, finished_at, rows, seconds"
+CATALOG_COLUMNS = "league, season, team"
+
+# tabele widoczne przez połączenie fan-out (tryb partitioned)
+FANOUT_TABLES = {
+    "football_matches": MATCH_COLUMNS,
+    "h2h_summary": H2H_SUMMARY_COLUMNS,
+    "import_log": IMPORT_LOG_COLUMNS,
+    "catalog_teams": CATALOG_COLUMNS,
+    "upcoming_predictions": UPCOMING_COLUMNS,
+}
+
+# tabele pochodne przeliczane w refresh_derived()
+DERIVED_TABLES = ("team_decay_state", "elo_history", "catalog_teams")
+
+# PRAGMA user_version po _init_schema(); starszą bazę podnosi `python db.py --migrate` (albo przebudowa z CSV)
+SCHEMA_VERSION = 2
+
 
 def detect_season_from_filename(filename_upper: str) -> str | None:
     years = re.findall(r"(19\d{2}|20\d{2})", filename_upper)
     return years[-1] if years else None
 
-def get_connection():
-    conn = sqlite3.connect(DB_PATH)
+
+def is_partitioned() -> bool:
+    return STORAGE_MODE == "partitioned"
+
+
+def partition_slug(league: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", league.strip().lower()).strip("_")
+
+
+def partition_path(league: str) -> Path:
+    return PARTITION_DIR / f"{partition_slug(league)}.db"
+
+
+def list_partitions() -> list[Path]:
+    return sorted(PARTITION_DIR.glob("*.db"))
+
+
+def partition_id_base(path: Path) -> int:
+    # każda partycja dostaje własny zakres id, żeby id meczu było unikalne globalnie
+    # (2^20 zakresów po 2^32 id -> mieści się w bezpiecznych liczbach JS)
+    return (zlib.crc32(path.stem.encode("utf-8")) & 0xFFFFF) << 32
+
+
+# limit czasu zapytań dla bieżącego requestu (time.monotonic()), ustawiany przez admission.py
+query_deadline: ContextVar[float | None] = ContextVar("query_deadline", default=None)
+
+# co ile instrukcji VM SQLite sprawdzamy zegar
+PROGRESS_HANDLER_STEPS = 10000
+
+
+def query_budget_exceeded() -> bool:
+    deadline = query_deadline.get()
+    return deadline is not None and time.monotonic() > deadline
+
+
+# liczniki SQL bieżącego requestu [statements, rows], ustawiane przez metrics.py
+sql_stats: ContextVar[list[int] | None] = ContextVar("sql_stats", default=None)
+
+# ile połączeń otworzył ten proces (do /metrics)
+connections_opened = 0
+
+
+class _CountingCursor(sqlite3.Cursor):
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            self.connection.stats[1] += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self.connection.stats[1] += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        self.connection.stats[1] += len(rows)
+        return rows
+
+    def __next__(self):
+        row = super().__next__()
+        self.connection.stats[1] += 1
+        return row
+
+
+class _CountingConnection(sqlite3.Connection):
+    stats: list[int]
+
+    def cursor(self, factory=_CountingCursor):
+        return super().cursor(factory)
+
+
+def _connect(path: Path | str, uri: bool = False):
+    global connections_opened
+    connections_opened += 1
+
+    stats = sql_stats.get()
+    if stats is None:
+        conn = sqlite3.connect(path, uri=uri)
+    else:
+        conn = sqlite3.connect(path, uri=uri, factory=_CountingConnection)
+        conn.stats = stats
+
+        def count_statement(_sql: str):
+            stats[0] += 1
+
+        conn.set_trace_callback(count_statement)
     conn.row_factory = sqlite3.Row
+
+    deadline = query_deadline.get()
+    if deadline is not None:
+        # niezerowy wynik przerywa zapytanie -> sqlite3.OperationalError("interrupted")
+        conn.set_progress_handler(lambda: time.monotonic() > deadline, PROGRESS_HANDLER_STEPS)
     return conn
 
 
-def init_db():
-    conn = get_connection()
+def _connect_fanout():
+    """
+    Połączenie "przez wszystkie ligi": ATTACH każdej partycji + widoki TEMP
+    o nazwach tabel, więc zapytania z app.py działają bez zmian.
+    """
+    conn = _connect(":memory:", uri=True)
+    paths = list_partitions()
+    if len(paths) > MAX_ATTACHED_PARTITIONS:
+        raise RuntimeError(f"Too many partitions to attach ({len(paths)} > {MAX_ATTACHED_PARTITIONS})")
+
+    for i, path in enumerate(paths):
+        conn.execute(f"ATTACH DATABASE ? AS p{i};", (f"file:{path}?mode=ro",))
+
+    for table, columns in FANOUT_TABLES.items():
+        if paths:
+            view_sql = " UNION ALL ".join(f"SELECT {columns} FROM p{i}.{table}" for i in range(len(paths)))
+        else:
+            # brak partycji -> puste widoki zamiast "no such table"
+            view_sql = "SELECT " + ", ".join(f"NULL AS {c.strip()}" for c in columns.split(",")) + " WHERE 0"
+        conn.execute(f"CREATE TEMP VIEW {table} AS {view_sql};")
+    return conn
+
+
+def get_connection(league: str | None = None, read_only: bool = False):
+    """
+    Router: w trybie single zawsze sports.db. W trybie partitioned liga wybiera
+    plik partycji, a bez ligi (albo dla nieznanej ligi) dostajemy połączenie fan-out.
+    read_only=True otwiera plik w trybie mode=ro (np. procesy jobów).
+    """
+    if not is_partitioned():
+        return _connect(f"file:{DB_PATH}?mode=ro", uri=True) if read_only else _connect(DB_PATH)
+
+    if league:
+        path = partition_path(league)
+        if path.exists():
+            return _connect(f"file:{path}?mode=ro", uri=True) if read_only else _connect(path)
+
+    return _connect_fanout()
+
+
+# ile wierszy na jedno fetchmany w iter_rows()
+ROW_BATCH = 512
+
+
+def iter_rows(conn, sql: str, params: tuple = (), batch: int = ROW_BATCH):
+    """
+    Wiersze zapytania jako zwykłe krotki (bez sqlite3.Row i dict(r)), strumieniowo paczkami
+    fetchmany: pętla agregująca trzyma w pamięci najwyżej jedną paczkę, niezależnie od wyniku.
+    Kolumny czyta się rozpakowaniem krotki w kolejności z SELECT.
+    """
     cur = conn.cursor()
+    cur.row_factory = None
+    try:
+        cur.execute(sql, params)
+        while True:
+            chunk = cur.fetchmany(batch)
+            if not chunk:
+                return
+            yield from chunk
+    finally:
+        cur.close()
+
+
+def data_version() -> float:
+    """
+    Znacznik wersji danych: czas ostatniego importu (CSV albo bulk).
+    Zmienia się przy każdym zapisie meczów, więc nadaje się do kluczy cache.
+    """
+    conn = get_connection(read_only=True)
+    try:
+        row = conn.execute("SELECT COALESCE(MAX(finished_at), 0) FROM import_log;").fetchone()
+        return float(row[0])
+    finally:
+        conn.close()
 
+
+def _create_matches_table(cur, id_base: int | None = None):
     cur.execute("""
         CREATE TABLE IF NOT EXISTS football_matches (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -31,18 +235,413 @@ def init_db():
             away_team TEXT NOT NULL,
             match_date TEXT NOT NULL,
             home_goals INTEGER,
-            away_goals INTEGER
+            away_goals INTEGER,
+            source TEXT
         );
     """)
 
+    if id_base is not None:
+        cur.execute(
+            """
+            INSERT INTO sqlite_sequence (name, seq)
+            SELECT 'football_matches', ?
+            WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'football_matches');
+            """,
+            (id_base,),
+        )
+
+
+def _init_schema(path: Path, id_base: int | None = None):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = _connect(path)
+    cur = conn.cursor()
+
+    _create_matches_table(cur, id_base)
+
+    # skąd mecz: NULL = import CSV, 'bulk' = POST /matches/bulk (przenoszone przez przebudowę z CSV)
+    cols = {r[1] for r in cur.execute("PRAGMA table_xinfo(football_matches);").fetchall()}
+    if "source" not in cols:
+        cur.execute("ALTER TABLE football_matches ADD COLUMN source TEXT;")
+
+    # klucz naturalny meczu -> upsert wyników (POST /matches/bulk)
+    cur.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_football_matches_natural_key
+        ON football_matches (league, home_team, away_team, match_date);
+    """)
+
+    ensure_h2h_schema(cur)
+    ensure_decay_schema(cur)
+    ensure_elo_schema(cur)
+    ensure_upcoming_schema(cur)
+
+    # drzewo liga -> sezon -> drużyna dla /catalog, bez skanu football_matches przy odczycie
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS catalog_teams (
+            league TEXT NOT NULL,
+            season TEXT NOT NULL,
+            team TEXT NOT NULL,
+            PRIMARY KEY (league, season, team)
+        ) WITHOUT ROWID;
+    """)
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS import_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            source TEXT NOT NULL,
+            finished_at REAL NOT NULL,
+            rows INTEGER NOT NULL,
+            seconds REAL NOT NULL
+        );
+    """)
+
+    # stara baza: dolicza tylko brakujące tabele pochodne, osobno per liga i tabela
+    # (liga bez rozegranych meczów nie ma Elo ani stanów decay - to nie jest brak)
+    leagues = cur.execute(
+        """
+        SELECT league,
+               MAX(home_goals IS NOT NULL AND away_goals IS NOT NULL),
+               MAX(home_goals IS NULL)
+        FROM football_matches GROUP BY league;
+        """
+    ).fetchall()
+
+    def missing(table: str, league: str) -> bool:
+        return cur.execute(f"SELECT 1 FROM {table} WHERE league = ? LIMIT 1;", (league,)).fetchone() is None
+
+    for league, played, fixtures in leagues:
+        if played and missing("team_decay_state", league):
+            update_decay_states(conn, league)
+        if played and missing("elo_history", league):
+            update_elo(conn, league)
+        if missing("catalog_teams", league):
+            update_catalog(conn, league)
+        # po Elo: predykcje terminarza biorą rating na dzień meczu
+        if fixtures and missing("upcoming_predictions", league):
+            update_upcoming_predictions(conn, league)
+
+    cur.execute(f"PRAGMA user_version = {SCHEMA_VERSION};")
     conn.commit()
     conn.close()
 
 
-def clear_football_matches():
-    conn = get_connection()
+def refresh_derived(conn, league: str, since: str | None = None):
+    """
+    Tabele pochodne liczone w Pythonie (h2h_summary idzie triggerami).
+    since = najwcześniejsza zmieniona data meczu; None = pełne przeliczenie ligi.
+    Nie commituje - działa w transakcji wołającego.
+    """
+    update_decay_states(conn, league, since)
+    update_elo(conn, league, since)
+    update_catalog(conn, league)
+    # po Elo: predykcje terminarza biorą rating na dzień meczu
+    update_upcoming_predictions(conn, league, since)
+
+
+def update_catalog(conn, league: str):
+    # cała liga naraz: to kilka tysięcy wierszy, a zmiana może też usunąć parę (sezon, drużyna)
+    conn.execute("DELETE FROM catalog_teams WHERE league = ?;", (league,))
+    conn.execute(
+        """
+        INSERT OR IGNORE INTO catalog_teams (league, season, team)
+        SELECT league, COALESCE(season, ''), home_team FROM football_matches WHERE league = ?
+        UNION
+        SELECT league, COALESCE(season, ''), away_team FROM football_matches WHERE league = ?;
+        """,
+        (league, league),
+    )
+
+
+def snapshot_build_path(live: Path) -> Path:
+    # poza globem list_partitions() (*.db), więc fan-out nie podepnie budowanego pliku
+    return live.with_name(live.name + ".new")
+
+
+def _fsync(path: Path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _inode(path: Path) -> int | None:
+    try:
+        return path.stat().st_ino
+    except FileNotFoundError:
+        return None
+
+
+def _file_data_version(conn) -> float:
+    # jak data_version(), ale dla podanego pliku; stara baza bez import_log -> 0
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'import_log';").fetchone() is None:
+        return 0.0
+    return float(conn.execute("SELECT COALESCE(MAX(finished_at), 0) FROM import_log;").fetchone()[0])
+
+
+def read_carry_over(live: Path) -> tuple[list[tuple], float | None]:
+    """
+    Mecze żywej bazy zapisane przez /matches/bulk (source = 'bulk') do przeniesienia w przebudowę
+    z CSV i wersja danych z tego samego odczytu - swap_snapshot() sprawdza, czy nic nie doszło w trakcie.
+    """
+    if not live.exists():
+        return [], None
+    conn = _connect(f"file:{live}?mode=ro", uri=True)
+    try:
+        conn.execute("BEGIN;")
+        rows = list(iter_rows(
+            conn,
+            """
+            SELECT league, season, home_team, away_team, match_date, home_goals, away_goals
+            FROM football_matches WHERE source = 'bulk' ORDER BY id;
+            """,
+        ))
+        version = _file_data_version(conn)
+        conn.execute("COMMIT;")
+        return rows, version
+    finally:
+        conn.close()
+
+
+def swap_snapshot(build: Path, live: Path, expected_version: float | None = None):
+    """
+    Podmienia plik bazy na gotowy snapshot jednym os.replace(). Nowe połączenia
+    (każdy request otwiera własne) widzą nowy plik, a otwarte czytają stary do końca.
+    Rename robimy pod blokadą RESERVED starego pliku: czeka tylko na zapisujących
+    (czytający nie blokują), a bez zapisu nie powstaje journal obok nowego pliku.
+    expected_version (z read_carry_over): zapis do żywej bazy w trakcie budowy -> bez podmiany,
+    żeby nie zgubić meczów spoza CSV; przebudowę trzeba powtórzyć.
+    """
+    _fsync(build)
+    conn = sqlite3.connect(live, isolation_level=None, timeout=60) if live.exists() else None
+    try:
+        if conn is not None:
+            conn.execute("BEGIN IMMEDIATE;")
+            if expected_version is not None and _file_data_version(conn) != expected_version:
+                build.unlink(missing_ok=True)
+                raise RuntimeError(f"{live.name} zmienił się w trakcie przebudowy - uruchom import ponownie")
+        os.replace(build, live)
+        _fsync(live.parent)
+    finally:
+        if conn is not None:
+            conn.execute("ROLLBACK;")
+            conn.close()
+
+
+def _begin_write(path: Path):
+    """
+    Połączenie do zapisu z otwartą transakcją (BEGIN IMMEDIATE) na aktualnym snapshocie.
+    Jeśli swap_snapshot() podmienił plik między otwarciem a blokadą, otwieramy ścieżkę
+    jeszcze raz - zapis nigdy nie trafia do wycofanego pliku.
+    """
+    while True:
+        before = _inode(path)
+        conn = _connect(path)
+        conn.execute("BEGIN IMMEDIATE;")
+        if _inode(path) == before:
+            return conn
+        conn.rollback()
+        conn.close()
+
+
+def record_import(conn, source: str, rows: int, seconds: float):
+    conn.execute(
+        "INSERT INTO import_log (source, finished_at, rows, seconds) VALUES (?, ?, ?, ?);",
+        (source, time.time(), rows, seconds),
+    )
+
+
+def init_db(league: str | None = None):
+    if not is_partitioned():
+        _init_schema(DB_PATH)
+        return
+
+    paths = [partition_path(league)] if league else list_partitions()
+    for path in paths:
+        _init_schema(path, id_base=partition_id_base(path))
+
+
+def outdated_schema() -> list[Path]:
+    """
+    Pliki bazy bez aktualnego schematu (brak pliku w trybie single też się liczy).
+    Tylko odczyt PRAGMA user_version - API nie migruje bazy samo (robi to `python db.py --migrate`).
+    """
+    paths = list_partitions() if is_partitioned() else [DB_PATH]
+    out = []
+    for path in paths:
+        if not path.exists():
+            out.append(path)
+            continue
+        conn = _connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            if conn.execute("PRAGMA user_version;").fetchone()[0] < SCHEMA_VERSION:
+                out.append(path)
+        finally:
+            conn.close()
+    return out
+
+
+# Kanoniczny klucz pary (nieuporządkowanej) - posortowane nazwy drużyn.
+# Musi dawać to samo co PAIR_KEY_SQL, bo po nim szukamy w indeksie.
+PAIR_KEY_SEP = "|"
+
+PAIR_KEY_SQL = (
+    "CASE WHEN home_team < away_team "
+    "THEN home_team || '|' || away_team "
+    "ELSE away_team || '|' || home_team END"
+)
+
+
+def pair_key(team_1: str, team_2: str) -> str:
+    a, b = sorted((team_1, team_2))
+    return f"{a}{PAIR_KEY_SEP}{b}"
+
+
+def _h2h_delta_sql(row: str, sign: str) -> str:
+    # row = NEW / OLD, sign = '+' / '-'
+    # team_a to "mniejsza" nazwa w parze, team_b "większa"
+    a_goals = f"(CASE WHEN {row}.home_team < {row}.away_team THEN {row}.home_goals ELSE {row}.away_goals END)"
+    b_goals = f"(CASE WHEN {row}.home_team < {row}.away_team THEN {row}.away_goals ELSE {row}.home_goals END)"
+    return f"""
+        INSERT INTO h2h_summary (
+            pair_key, league, season, team_a, team_b,
+            played, team_a_wins, draws, team_b_wins, team_a_goals, team_b_goals
+        )
+        VALUES (
+            {row}.pair_key, {row}.league, COALESCE({row}.season, ''),
+            MIN({row}.home_team, {row}.away_team), MAX({row}.home_team, {row}.away_team),
+            {sign}1,
+            {sign}({a_goals} > {b_goals}),
+            {sign}({a_goals} = {b_goals}),
+            {sign}({a_goals} < {b_goals}),
+            {sign}{a_goals},
+            {sign}{b_goals}
+        )
+        ON CONFLICT (pair_key, league, season) DO UPDATE SET
+            played = played + excluded.played,
+            team_a_wins = team_a_wins + excluded.team_a_wins,
+            draws = draws + excluded.draws,
+            team_b_wins = team_b_wins + excluded.team_b_wins,
+            team_a_goals = team_a_goals + excluded.team_a_goals,
+            team_b_goals = team_b_goals + excluded.team_b_goals;
+    """ + ("" if sign == "+" else f"""
+        DELETE FROM h2h_summary
+        WHERE pair_key = {row}.pair_key AND league = {row}.league
+          AND season = COALESCE({row}.season, '') AND played <= 0;
+    """)
+
+
+def ensure_h2h_schema(cur):
+    """
+    pair_key (kolumna generowana) + indeks (pair_key, match_date) oraz tabela
+    h2h_summary z agregatami per para/liga/sezon, utrzymywana triggerami.
+    Działa też na starej bazie bez tych obiektów (dokleja je i uzupełnia dane).
+    """
+    cols = {r[1] for r in cur.execute("PRAGMA table_xinfo(football_matches);").fetchall()}
+    if "pair_key" not in cols:
+        cur.execute(
+            f"ALTER TABLE football_matches ADD COLUMN pair_key TEXT "
+            f"GENERATED ALWAYS AS ({PAIR_KEY_SQL}) VIRTUAL;"
+        )
+
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_football_matches_pair_date
+        ON football_matches (pair_key, match_date);
+    """)
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS h2h_summary (
+            pair_key TEXT NOT NULL,
+            league TEXT NOT NULL,
+            season TEXT NOT NULL,
+            team_a TEXT NOT NULL,
+            team_b TEXT NOT NULL,
+            played INTEGER NOT NULL DEFAULT 0,
+            team_a_wins INTEGER NOT NULL DEFAULT 0,
+            draws INTEGER NOT NULL DEFAULT 0,
+            team_b_wins INTEGER NOT NULL DEFAULT 0,
+            team_a_goals INTEGER NOT NULL DEFAULT 0,
+            team_b_goals INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (pair_key, league, season)
+        );
+    """)
+
+    scored_new = "NEW.home_goals IS NOT NULL AND NEW.away_goals IS NOT NULL"
+    scored_old = "OLD.home_goals IS NOT NULL AND OLD.away_goals IS NOT NULL"
+
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_h2h_insert
+        AFTER INSERT ON football_matches
+        WHEN {scored_new}
+        BEGIN
+            {_h2h_delta_sql("NEW", "+")}
+        END;
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_h2h_delete
+        AFTER DELETE ON football_matches
+        WHEN {scored_old}
+        BEGIN
+            {_h2h_delta_sql("OLD", "-")}
+        END;
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_h2h_update_old
+        AFTER UPDATE ON football_matches
+        WHEN {scored_old}
+        BEGIN
+            {_h2h_delta_sql("OLD", "-")}
+        END;
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_h2h_update_new
+        AFTER UPDATE ON football_matches
+        WHEN {scored_new}
+        BEGIN
+            {_h2h_delta_sql("NEW", "+")}
+        END;
+    """)
+
+    # stara baza: mecze są, agregatów jeszcze nie ma
+    has_summary = cur.execute("SELECT 1 FROM h2h_summary LIMIT 1;").fetchone()
+    if has_summary is None:
+        rebuild_h2h_summary(cur)
+
+
+def rebuild_h2h_summary(cur):
+    cur.execute("DELETE FROM h2h_summary;")
+    cur.execute("""
+        INSERT INTO h2h_summary (
+            pair_key, league, season, team_a, team_b,
+            played, team_a_wins, draws, team_b_wins, team_a_goals, team_b_goals
+        )
+        SELECT
+            pair_key, league, COALESCE(season, ''),
+            MIN(MIN(home_team, away_team)), MAX(MAX(home_team, away_team)),
+            COUNT(*),
+            SUM(CASE WHEN home_team < away_team THEN home_goals > away_goals ELSE away_goals > home_goals END),
+            SUM(home_goals = away_goals),
+            SUM(CASE WHEN home_team < away_team THEN home_goals < away_goals ELSE away_goals < home_goals END),
+            SUM(CASE WHEN home_team < away_team THEN home_goals ELSE away_goals END),
+            SUM(CASE WHEN home_team < away_team THEN away_goals ELSE home_goals END)
+        FROM football_matches
+        WHERE home_goals IS NOT NULL AND away_goals IS NOT NULL
+        GROUP BY pair_key, league, COALESCE(season, '');
+    """)
+
+
+def clear_football_matches(league: str | None = None):
+    if is_partitioned() and not league:
+        for path in list_partitions():
+            clear_football_matches(path.stem)
+        return
+
+    conn = _connect(partition_path(league)) if is_partitioned() else get_connection()
     cur = conn.cursor()
     cur.execute("DELETE FROM football_matches;")
+    cur.execute("DELETE FROM h2h_summary;")
+    for table in DERIVED_TABLES:
+        cur.execute(f"DELETE FROM {table};")
+    cur.execute("DELETE FROM upcoming_predictions;")
     conn.commit()
     conn.close()
 
@@ -59,24 +658,162 @@ def parse_date_safe(x: str):
     return None
 
 
-def import_football_csv(csv_path: Path, league_name: str, season: str | None):
+# wspólne reguły kolumn dla importu CSV i POST /matches/bulk
+RENAME_MAP = {
+    "HomeTeam": "home_team",
+    "AwayTeam": "away_team",
+    "Home": "home_team",
+    "Away": "away_team",
+    "FTHG": "home_goals",
+    "FTAG": "away_goals",
+    "HG": "home_goals",
+    "AG": "away_goals",
+    "Date": "match_date",
+}
+
+REQUIRED_COLS = ["home_team", "away_team", "match_date"]
+
+
+def _parse_goals(x):
+    if x is None or x == "":
+        return None
+    if isinstance(x, float) and x != x:  # NaN
+        return None
+    if isinstance(x, bool):
+        raise ValueError("goals must be integers")
+    try:
+        g = int(x)
+    except (TypeError, ValueError):
+        raise ValueError("goals must be integers")
+    if g != float(x) or g < 0:
+        raise ValueError("goals must be non-negative integers")
+    return g
+
+
+def normalize_match_record(rec: dict, league: str | None, season: str | None) -> tuple:
+    """
+    Jeden rekord (nazwy kolumn jak w CSV albo jak w tabeli) -> krotka w kolejności
+    (league, season, home_team, away_team, match_date, home_goals, away_goals).
+    Rzuca ValueError, jeśli rekord nie spełnia reguł importu.
+    """
+    row = {RENAME_MAP.get(k, k): v for k, v in rec.items()}
+
+    for col in REQUIRED_COLS:
+        if row.get(col) is None or str(row.get(col)).strip() == "":
+            raise ValueError(f"Brakuje kolumny '{col}'")
+
+    league = (row.get("league") or league or "").strip()
+    if not league:
+        raise ValueError("Brakuje kolumny 'league'")
+    season = row.get("season", season)
+    season = str(season).strip() if season not in (None, "") else None
+
+    match_date = parse_date_safe(row["match_date"])
+    if match_date is None:
+        raise ValueError("match_date must be DD/MM/YYYY, DD/MM/YY or YYYY-MM-DD")
+
+    home_goals = _parse_goals(row.get("home_goals"))
+    away_goals = _parse_goals(row.get("away_goals"))
+    if (home_goals is None) != (away_goals is None):
+        raise ValueError("home_goals and away_goals must both be set or both be empty")
+
+    home_team = str(row["home_team"]).strip()
+    away_team = str(row["away_team"]).strip()
+    if home_team == away_team:
+        raise ValueError("home_team and away_team must differ")
+
+    return league, season, home_team, away_team, match_date, home_goals, away_goals
+
+
+UPSERT_MATCH_SQL = """
+    INSERT INTO football_matches (league, season, home_team, away_team, match_date, home_goals, away_goals, source)
+    VALUES (?, ?, ?, ?, ?, ?, ?, 'bulk')
+    ON CONFLICT (league, home_team, away_team, match_date) DO UPDATE SET
+        season = excluded.season,
+        home_goals = excluded.home_goals,
+        away_goals = excluded.away_goals,
+        source = 'bulk'
+    WHERE home_goals IS NOT excluded.home_goals
+       OR away_goals IS NOT excluded.away_goals
+       OR season IS NOT excluded.season;
+"""
+
+
+def upsert_matches(rows: list[tuple]) -> None:
+    """
+    Zapis wielu meczów jedną transakcją (w trybie partitioned: jedną na partycję).
+    Agregaty h2h aktualizują triggery, bez pełnej przebudowy; wiersze bez zmian
+    nie są ruszane (WHERE w DO UPDATE), więc triggery dla nich nie odpalają.
+    """
+    by_league: dict[str, list[tuple]] = {}
+    if is_partitioned():
+        for r in rows:
+            by_league.setdefault(r[0], []).append(r)
+    else:
+        by_league[""] = rows
+
+    for league, league_rows in by_league.items():
+        # nowa liga -> nowy plik partycji ze schematem; istniejący idzie prosto do zapisu
+        if is_partitioned() and not partition_path(league).exists():
+            init_db(league)
+        conn = _begin_write(partition_path(league) if is_partitioned() else DB_PATH)
+        try:
+            t0 = time.perf_counter()
+            with conn:
+                conn.executemany(UPSERT_MATCH_SQL, league_rows)
+
+                # tabele pochodne od najwcześniejszej dotkniętej daty, per liga
+                since_by_league: dict[str, str] = {}
+                for r in league_rows:
+                    if r[0] not in since_by_league or r[4] < since_by_league[r[0]]:
+                        since_by_league[r[0]] = r[4]
+                for lg, since in since_by_league.items():
+                    refresh_derived(conn, lg, since)
+
+                record_import(conn, "bulk", len(league_rows), time.perf_counter() - t0)
+        finally:
+            conn.close()
+
+
+def refresh_upcoming(leagues: list[str]) -> None:
+    """
+    Pełne przeliczenie predykcji terminarza wybranych lig - po zmianie model_config.json
+    (tune.py), która zmienia domyślne ustawienia bez zmiany meczów.
+    """
+    for league in leagues:
+        path = partition_path(league) if is_partitioned() else DB_PATH
+        if is_partitioned() and not path.exists():
+            continue
+        conn = _begin_write(path)
+        try:
+            with conn:
+                update_upcoming_predictions(conn, league)
+        finally:
+            conn.close()
+
+
+# pełna przebudowa: wiersze na jedno executemany
+BULK_INSERT_BATCH = 50000
+
+INSERT_MATCH_SQL = """
+    INSERT INTO football_matches (league, season, home_team, away_team, match_date, home_goals, away_goals)
+    VALUES (?, ?, ?, ?, ?, ?, ?);
+"""
+
+# wiersze /matches/bulk przeniesione do przebudowy zachowują source
+INSERT_BULK_MATCH_SQL = """
+    INSERT INTO football_matches (league, season, home_team, away_team, match_date, home_goals, away_goals, source)
+    VALUES (?, ?, ?, ?, ?, ?, ?, 'bulk');
+"""
+
+
+def read_football_csv(csv_path: Path, league_name: str, season: str | None) -> list[tuple]:
+    """Plik CSV -> krotki (league, season, home_team, away_team, match_date, home_goals, away_goals)."""
     df = pd.read_csv(csv_path)
 
-    rename_map = {
-        "HomeTeam": "home_team",
-        "AwayTeam": "away_team",
-        "Home": "home_team",
-        "Away": "away_team",
-        "FTHG": "home_goals",
-        "FTAG": "away_goals",
-        "HG": "home_goals",
-        "AG": "away_goals",
-        "Date": "match_date",
-    }
-    df = df.rename(columns=rename_map)
+    df = df.rename(columns=RENAME_MAP)
 
-    required_cols = ["home_team", "away_team", "match_date"]
-    for col in required_cols:
+    for col in REQUIRED_COLS:
         if col not in df.columns:
             raise ValueError(f"Brakuje kolumny '{col}' w pliku: {csv_path.name}")
 
@@ -87,20 +824,89 @@ def import_football_csv(csv_path: Path, league_name: str, season: str | None):
 
     df = df.dropna(subset=["home_team", "away_team"])
 
-    df["league"] = league_name
-    df["season"] = season
-
     df["match_date"] = df["match_date"].apply(parse_date_safe)
     df = df.dropna(subset=["match_date"])
 
-    df_final = df[["league", "season", "home_team", "away_team", "match_date", "home_goals", "away_goals"]]
-
-    conn = get_connection()
-    df_final.to_sql("football_matches", conn, if_exists="append", index=False)
+    # bramki leniwie: "1.0" -> 1, pusta komórka / same spacje -> brak wyniku; wiersz z inną
+    # wartością (tekst, ułamek) jest pomijany zamiast przerywać całą przebudowę
+    raw = df[["home_goals", "away_goals"]]
+    blank = raw.isna() | raw.astype(str).apply(lambda c: c.str.strip() == "")
+    goals = raw.apply(pd.to_numeric, errors="coerce")
+    goals = goals.where(goals == goals.round())
+    bad = (goals.isna() & ~blank).any(axis=1)
+    if bad.any():
+        print(f"!Pomijam {int(bad.sum())} wierszy z niepoprawnymi bramkami w pliku: {csv_path.name}")
+        df, goals = df[~bad], goals[~bad]
+    goals = goals.astype(object).where(goals.notna(), None)
+    return [
+        (league_name, season, h, a, d, None if hg is None else int(hg), None if ag is None else int(ag))
+        for h, a, d, hg, ag in zip(df["home_team"], df["away_team"], df["match_date"],
+                                   goals["home_goals"], goals["away_goals"])
+    ]
+
+
+def build_snapshot(build: Path, files_by_league: dict[str, list[tuple[Path, str | None]]],
+                   id_base: int | None = None, carry_over: list[tuple] = ()) -> int:
+    """
+    Pełna przebudowa do świeżego pliku (potem swap_snapshot):
+    - mecze z CSV plus carry_over (read_carry_over: wiersze z /matches/bulk, dalej z source = 'bulk');
+      przy tym samym kluczu naturalnym wygrywa bulk (np. wynik dopisany do meczu z terminarza CSV),
+    - bez journala i fsync (plik jest prywatny do podmiany, po awarii budujemy od nowa),
+    - sama tabela meczów, wstawianie executemany paczkami po BULK_INSERT_BATCH,
+    - indeksy, triggery, h2h_summary i tabele pochodne dopiero po wczytaniu (_init_schema),
+    - ANALYZE dla planera.
+    Zwraca liczbę wierszy i wypisuje rows/s dla każdej fazy.
+    """
+    t0 = time.perf_counter()
+    build.unlink(missing_ok=True)
+    build.parent.mkdir(parents=True, exist_ok=True)
+
+    rows: dict[tuple, tuple] = {}
+    for league, files in files_by_league.items():
+        for file_path, season in files:
+            file_rows = read_football_csv(file_path, league, season)
+            # duplikat klucza naturalnego: wygrywa późniejszy wiersz (jak upsert)
+            for r in file_rows:
+                rows[(r[0], r[2], r[3], r[4])] = r
+            print(f"Read {len(file_rows)} rows from {file_path.name} ({league}, season={season})")
+    for r in carry_over:
+        rows.pop((r[0], r[2], r[3], r[4]), None)
+    if carry_over:
+        print(f"Carried over {len(carry_over)} rows from /matches/bulk")
+    t_read = time.perf_counter()
+
+    conn = _connect(build)
+    conn.execute("PRAGMA journal_mode=OFF;")
+    conn.execute("PRAGMA synchronous=OFF;")
+    conn.execute("PRAGMA temp_store=MEMORY;")
+    conn.execute("PRAGMA cache_size=-65536;")
+    with conn:
+        _create_matches_table(conn.cursor(), id_base)
+        batch = list(rows.values())
+        for start in range(0, len(batch), BULK_INSERT_BATCH):
+            conn.executemany(INSERT_MATCH_SQL, batch[start:start + BULK_INSERT_BATCH])
+        conn.executemany(INSERT_BULK_MATCH_SQL, carry_over)
     conn.close()
+    t_load = time.perf_counter()
 
-    print(f"Imported {len(df_final)} rows from {csv_path.name} ({league_name}, season={season})")
+    # indeksy (jedno sortowanie zamiast aktualizacji per wiersz) + h2h_summary + tabele pochodne
+    _init_schema(build, id_base=id_base)
+    t_derived = time.perf_counter()
 
+    conn = _connect(build)
+    conn.execute("ANALYZE;")
+    with conn:
+        record_import(conn, "csv", len(rows) + len(carry_over), time.perf_counter() - t0)
+    conn.execute("PRAGMA journal_mode=DELETE;")
+    conn.close()
+    t_end = time.perf_counter()
+
+    n = len(rows) + len(carry_over)
+    for phase, secs in (("read", t_read - t0), ("load", t_load - t_read),
+                        ("index+derived", t_derived - t_load), ("analyze", t_end - t_derived)):
+        print(f"  {phase}: {secs:.2f}s ({n / max(secs, 1e-9):.0f} rows/s)")
+    print(f"Built {build.name}: {n} rows in {t_end - t0:.2f}s ({n / max(t_end - t0, 1e-9):.0f} rows/s)")
+    return n
 
 
 def detect_league_from_filename(filename_upper: str):
@@ -130,7 +936,19 @@ def detect_league_from_filename(filename_upper: str):
 
     return None
 
-def import_all_csv():
+def import_league_csv(league: str, files: list[tuple[Path, str | None]]):
+    """
+    Przebudowa jednej partycji w nowym pliku i podmiana (swap_snapshot): dotyka
+    tylko pliku tej ligi, więc różne ligi można importować równolegle.
+    """
+    live = partition_path(league)
+    build = snapshot_build_path(live)
+    carry_over, version = read_carry_over(live)
+    build_snapshot(build, {league: files}, id_base=partition_id_base(live), carry_over=carry_over)
+    swap_snapshot(build, live, expected_version=version)
+
+
+def import_all_csv(leagues: list[str] | None = None):
     folder_path = BASE_DIR / "data" / "football_csv"
     csv_files = sorted(folder_path.glob("*.csv"))
 
@@ -141,6 +959,8 @@ def import_all_csv():
         print("XXX Nie znaleziono żadnych plików .csv w data/football_csv/")
         return
 
+    by_league: dict[str, list[tuple[Path, str | None]]] = {}
+
     for file_path in csv_files:
         filename_upper = file_path.name.upper()
         league = detect_league_from_filename(filename_upper)
@@ -151,15 +971,42 @@ def import_all_csv():
         if league is None:
             print("!Pomijam plik (nieznana liga):", file_path.name)
             continue
+        if leagues and league not in leagues:
+            continue
 
-        import_football_csv(file_path, league, season)
+        by_league.setdefault(league, []).append((file_path, season))
+
+    if is_partitioned():
+        with ProcessPoolExecutor(max_workers=max(1, min(len(by_league), os.cpu_count() or 1))) as pool:
+            futures = [pool.submit(import_league_csv, lg, files) for lg, files in by_league.items()]
+            for f in futures:
+                f.result()
+        return
+
+    # tryb single: cała baza od zera w nowym pliku, API czyta stary do podmiany
+    build = snapshot_build_path(DB_PATH)
+    carry_over, version = read_carry_over(DB_PATH)
+    build_snapshot(build, by_league, carry_over=carry_over)
+    swap_snapshot(build, DB_PATH, expected_version=version)
 
 
 if __name__ == "__main__":
-    init_db()
-    clear_football_matches()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Import CSV -> SQLite")
+    parser.add_argument("--league", action="append", help="tylko wybrane ligi (tryb partitioned)")
+    parser.add_argument("--migrate", action="store_true", help="tylko schemat istniejącej bazy, bez importu CSV")
+    args = parser.parse_args()
+
+    if args.migrate:
+        init_db()
+        print("Schema version:", SCHEMA_VERSION, "| DB_PATH:", PARTITION_DIR if is_partitioned() else DB_PATH)
+        raise SystemExit(0)
 
-    import_all_csv()
+    t0 = time.perf_counter()
+    # każda liga (partitioned) albo cała baza (single) budowana w nowym pliku i podmieniana
+    import_all_csv(args.league if is_partitioned() else None)
+    elapsed = time.perf_counter() - t0
 
     # test ile weszło
     conn = get_connection()
@@ -169,4 +1016,5 @@ if __name__ == "__main__":
     conn.close()
 
     print("Done. Rows in football_matches:", total)
-    print("DB_PATH:", DB_PATH)
\ No newline at end of file
+    print(f"Import: {elapsed:.2f}s, {total / max(elapsed, 1e-9):.0f} rows/s")
+    print("DB_PATH:", PARTITION_DIR if is_partitioned() else DB_PATH)
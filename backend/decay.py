@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+from datetime import date
+
+# half-life (dni), dla których trzymamy gotowe, wygaszane sumy per drużyna
+DECAY_HALF_LIVES = (30, 60, 90, 180, 365)
+
+# team = '' -> wiersz dla całej ligi (hs = suma goli gospodarzy, hc = gości, hn = liczba meczów)
+LEAGUE_ROW = ""
+
+STATE_FIELDS = ("hs", "hc", "hn", "as_", "ac", "an")
+
+
+def ensure_decay_schema(cur):
+    """
+    Stan po każdym meczu: sumy wygaszone na dzień meczu. Zapytanie "na dzień T"
+    to ostatni wiersz sprzed T (indeks = klucz główny) razy 2^(-(T - t)/H).
+    """
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS team_decay_state (
+            league TEXT NOT NULL,
+            half_life INTEGER NOT NULL,
+            team TEXT NOT NULL,
+            match_date TEXT NOT NULL,
+            match_id INTEGER NOT NULL,
+            hs REAL NOT NULL,
+            hc REAL NOT NULL,
+            hn REAL NOT NULL,
+            as_ REAL NOT NULL,
+            ac REAL NOT NULL,
+            an REAL NOT NULL,
+            matches INTEGER NOT NULL,
+            PRIMARY KEY (league, half_life, team, match_date, match_id)
+        ) WITHOUT ROWID;
+    """)
+
+
+def _days(d: str) -> int:
+    return date.fromisoformat(d).toordinal()
+
+
+def _factor(days: float, half_life: float) -> float:
+    return 2.0 ** (-days / half_life) if days > 0 else 1.0
+
+
+def _last_state(cur, league: str, half_life: int, team: str, before: str | None):
+    sql = """
+        SELECT match_date, hs, hc, hn, as_, ac, an, matches
+        FROM team_decay_state
+        WHERE league = ? AND half_life = ? AND team = ?
+    """
+    params: list[object] = [league, half_life, team]
+    if before is not None:
+        sql += " AND match_date < ?"
+        params.append(before)
+    sql += " ORDER BY match_date DESC, match_id DESC LIMIT 1;"
+    return cur.execute(sql, tuple(params)).fetchone()
+
+
+def update_decay_states(conn, league: str, since: str | None = None):
+    """
+    Przelicza stany od daty since (włącznie) do końca; since=None = całość.
+    Dla nowych wyników (dopisywanych na końcu) to O(1) na mecz i drużynę.
+    """
+    cur = conn.cursor()
+
+    if since is None:
+        cur.execute("DELETE FROM team_decay_state WHERE league = ?;", (league,))
+        cur.execute(
+            """
+            SELECT id, match_date, home_team, away_team, home_goals, away_goals
+            FROM football_matches
+            WHERE league = ? AND home_goals IS NOT NULL AND away_goals IS NOT NULL
+            ORDER BY match_date ASC, id ASC;
+            """,
+            (league,),
+        )
+    else:
+        cur.execute("DELETE FROM team_decay_state WHERE league = ? AND match_date >= ?;", (league, since))
+        cur.execute(
+            """
+            SELECT id, match_date, home_team, away_team, home_goals, away_goals
+            FROM football_matches
+            WHERE league = ? AND match_date >= ?
+              AND home_goals IS NOT NULL AND away_goals IS NOT NULL
+            ORDER BY match_date ASC, id ASC;
+            """,
+            (league, since),
+        )
+    matches = [tuple(r) for r in cur.fetchall()]
+    if not matches:
+        return
+
+    out = []
+    for half_life in DECAY_HALF_LIVES:
+        # team -> [day, hs, hc, hn, as, ac, an, matches]; ładowane leniwie ze stanu sprzed since
+        state: dict[str, list] = {}
+
+        def get(team: str) -> list:
+            s = state.get(team)
+            if s is None:
+                row = _last_state(cur, league, half_life, team, since) if since is not None else None
+                if row is None:
+                    s = [None, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0]
+                else:
+                    s = [_days(row[0]), *row[1:7], row[7]]
+                state[team] = s
+            return s
+
+        def advance(s: list, day: int):
+            if s[0] is not None and day > s[0]:
+                f = _factor(day - s[0], half_life)
+                for k in range(1, 7):
+                    s[k] *= f
+            s[0] = day
+
+        for match_id, match_date, home, away, hg, ag in matches:
+            day = _days(match_date)
+
+            lg = get(LEAGUE_ROW)
+            advance(lg, day)
+            lg[1] += hg
+            lg[2] += ag
+            lg[3] += 1.0
+            lg[7] += 1
+
+            hs = get(home)
+            advance(hs, day)
+            hs[1] += hg
+            hs[2] += ag
+            hs[3] += 1.0
+            hs[7] += 1
+
+            aw = get(away)
+            advance(aw, day)
+            aw[4] += ag
+            aw[5] += hg
+            aw[6] += 1.0
+            aw[7] += 1
+
+            for team, s in ((LEAGUE_ROW, lg), (home, hs), (away, aw)):
+                out.append((league, half_life, team, match_date, match_id, *s[1:7], s[7]))
+
+    # kolejność klucza głównego: wiersze dopisywane na końcu B-drzewa zamiast w losowe strony
+    out.sort(key=lambda r: r[1:5])
+    cur.executemany(
+        """
+        INSERT OR REPLACE INTO team_decay_state (
+            league, half_life, team, match_date, match_id, hs, hc, hn, as_, ac, an, matches
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
+        """,
+        out,
+    )
+
+
+def decay_aggregates(conn, league: str, half_life: int, cutoff: str | None, teams: tuple[str, ...]):
+    """
+    Agregaty do lambdas_from_aggregates() na dzień cutoff (tylko mecze sprzed cutoff):
+    (total_hg, total_ag, n, team_stats, matches_used). Bez cutoff - na dzień ostatniego meczu ligi.
+    """
+    cur = conn.cursor()
+    lg = _last_state(cur, league, half_life, LEAGUE_ROW, cutoff)
+    if lg is None:
+        return 0.0, 0.0, 0.0, {}, 0
+
+    t_ref = _days(cutoff) if cutoff else _days(lg[0])
+
+    def decayed(row) -> list[float]:
+        f = _factor(t_ref - _days(row[0]), half_life)
+        return [row[k] * f for k in range(1, 7)]
+
+    hs, hc, hn, _as, _ac, _an = decayed(lg)
+
+    team_stats: dict[str, dict] = {}
+    for team in teams:
+        row = _last_state(cur, league, half_life, team, cutoff)
+        if row is None:
+            continue
+        v = decayed(row)
+        team_stats[team] = {"hs": v[0], "hc": v[1], "hn": v[2], "as": v[3], "ac": v[4], "an": v[5]}
+
+    return hs, hc, hn, team_stats, lg[7]
+
+
+def decay_weights(rows: list[tuple], half_life: float, cutoff: str | None) -> list[float]:
+    """Waga każdego meczu 2^(-wiek/H) na dzień cutoff (bez cutoff - na dzień najnowszego meczu)."""
+    if not rows:
+        return []
+    days = [_days(r[0]) for r in rows]
+    t_ref = _days(cutoff) if cutoff else max(days)
+    return [_factor(t_ref - d, half_life) for d in days]
+
+
+def decay_aggregates_from_rows(rows: list[tuple], half_life: float, cutoff: str | None):
+    """
+    To samo co decay_aggregates(), ale liczone z surowych meczów -
+    dla half-life spoza DECAY_HALF_LIVES. rows: (match_date, home_team, away_team, home_goals, away_goals).
+    """
+    if not rows:
+        return 0.0, 0.0, 0.0, {}, 0
+
+    total_hg = total_ag = n = 0.0
+    team_stats: dict[str, dict] = {}
+
+    for (_match_date, h, a, hg, ag), w in zip(rows, decay_weights(rows, half_life, cutoff)):
+        hg, ag = float(hg), float(ag)
+
+        total_hg += w * hg
+        total_ag += w * ag
+        n += w
+
+        sh = team_stats.setdefault(h, {"hs": 0.0, "hc": 0.0, "hn": 0.0, "as": 0.0, "ac": 0.0, "an": 0.0})
+        sa = team_stats.setdefault(a, {"hs": 0.0, "hc": 0.0, "hn": 0.0, "as": 0.0, "ac": 0.0, "an": 0.0})
+        sh["hs"] += w * hg
+        sh["hc"] += w * ag
+        sh["hn"] += w
+        sa["as"] += w * ag
+        sa["ac"] += w * hg
+        sa["an"] += w
+
+    return total_hg, total_ag, n, team_stats, len(rows)
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import math
+from bisect import bisect_left
+
+ELO_INITIAL = 1500.0
+ELO_K = 20.0
+ELO_HOME_ADVANTAGE = 60.0
+
+# remis: p_draw = ELO_DRAW_MAX * exp(-(dr / ELO_DRAW_SCALE)^2), reszta dzielona wg oczekiwanego wyniku
+ELO_DRAW_MAX = 0.28
+ELO_DRAW_SCALE = 400.0
+
+
+def ensure_elo_schema(cur):
+    """
+    Jeden wiersz na drużynę i mecz: rating przed i po meczu.
+    "Rating na dzień T" = rating_post ostatniego wiersza sprzed T (klucz główny).
+    """
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS elo_history (
+            league TEXT NOT NULL,
+            team TEXT NOT NULL,
+            match_date TEXT NOT NULL,
+            match_id INTEGER NOT NULL,
+            opponent TEXT NOT NULL,
+            is_home INTEGER NOT NULL,
+            goals_for INTEGER NOT NULL,
+            goals_against INTEGER NOT NULL,
+            rating_pre REAL NOT NULL,
+            rating_post REAL NOT NULL,
+            PRIMARY KEY (league, team, match_date, match_id)
+        ) WITHOUT ROWID;
+    """)
+
+
+def expected_home_score(home_rating: float, away_rating: float) -> float:
+    dr = home_rating + ELO_HOME_ADVANTAGE - away_rating
+    return 1.0 / (1.0 + 10.0 ** (-dr / 400.0))
+
+
+def goal_diff_multiplier(goal_diff: int) -> float:
+    # jak w World Football Elo
+    n = abs(goal_diff)
+    if n <= 1:
+        return 1.0
+    if n == 2:
+        return 1.5
+    return (11.0 + n) / 8.0
+
+
+def elo_probs(home_rating: float, away_rating: float) -> tuple[float, float, float]:
+    dr = home_rating + ELO_HOME_ADVANTAGE - away_rating
+    e = expected_home_score(home_rating, away_rating)
+    p_draw = ELO_DRAW_MAX * math.exp(-((dr / ELO_DRAW_SCALE) ** 2))
+    p_home = max(e - p_draw / 2.0, 0.0)
+    p_away = max(1.0 - e - p_draw / 2.0, 0.0)
+    total = p_home + p_draw + p_away
+    return p_home / total, p_draw / total, p_away / total
+
+
+def rating_as_of(cur, league: str, team: str, before: str | None) -> float | None:
+    sql = "SELECT rating_post FROM elo_history WHERE league = ? AND team = ?"
+    params: list[object] = [league, team]
+    if before is not None:
+        sql += " AND match_date < ?"
+        params.append(before)
+    sql += " ORDER BY match_date DESC, match_id DESC LIMIT 1;"
+    row = cur.execute(sql, tuple(params)).fetchone()
+    return row[0] if row is not None else None
+
+
+def ratings_as_of(cur, league: str, lookups: list[tuple[str, str]]) -> list[float | None]:
+    """
+    rating_as_of() dla wielu (team, before) jednym zapytaniem: historia drużyn sprzed
+    najpóźniejszej daty, potem ostatni wiersz sprzed daty każdej pary (bisect).
+    """
+    if not lookups:
+        return []
+    teams = sorted({t for t, _ in lookups})
+    rows = cur.execute(
+        f"""
+        SELECT team, match_date, rating_post FROM elo_history
+        WHERE league = ? AND team IN ({", ".join("?" for _ in teams)}) AND match_date < ?
+        ORDER BY team, match_date, match_id;
+        """,
+        (league, *teams, max(b for _, b in lookups)),
+    ).fetchall()
+    history: dict[str, tuple[list[str], list[float]]] = {}
+    for team, match_date, rating in rows:
+        dates, ratings = history.setdefault(team, ([], []))
+        dates.append(match_date)
+        ratings.append(rating)
+
+    out = []
+    for team, before in lookups:
+        dates, ratings = history.get(team, ((), ()))
+        i = bisect_left(dates, before)
+        out.append(ratings[i - 1] if i > 0 else None)
+    return out
+
+
+def update_elo(conn, league: str, since: str | None = None):
+    """
+    Jeden chronologiczny przebieg od daty since (włącznie); since=None = cała liga.
+    Nowe wyniki na końcu historii to O(1) na mecz.
+    """
+    cur = conn.cursor()
+    if since is None:
+        cur.execute("DELETE FROM elo_history WHERE league = ?;", (league,))
+        cur.execute(
+            """
+            SELECT id, match_date, home_team, away_team, home_goals, away_goals
+            FROM football_matches
+            WHERE league = ? AND home_goals IS NOT NULL AND away_goals IS NOT NULL
+            ORDER BY match_date ASC, id ASC;
+            """,
+            (league,),
+        )
+    else:
+        cur.execute("DELETE FROM elo_history WHERE league = ? AND match_date >= ?;", (league, since))
+        cur.execute(
+            """
+            SELECT id, match_date, home_team, away_team, home_goals, away_goals
+            FROM football_matches
+            WHERE league = ? AND match_date >= ?
+              AND home_goals IS NOT NULL AND away_goals IS NOT NULL
+            ORDER BY match_date ASC, id ASC;
+            """,
+            (league, since),
+        )
+    matches = [tuple(r) for r in cur.fetchall()]
+
+    ratings: dict[str, float] = {}
+
+    def get(team: str) -> float:
+        r = ratings.get(team)
+        if r is None:
+            r = rating_as_of(cur, league, team, since) if since is not None else None
+            r = ELO_INITIAL if r is None else r
+            ratings[team] = r
+        return r
+
+    out = []
+    for match_id, match_date, home, away, hg, ag in matches:
+        rh, ra = get(home), get(away)
+        score = 1.0 if hg > ag else 0.5 if hg == ag else 0.0
+        delta = ELO_K * goal_diff_multiplier(hg - ag) * (score - expected_home_score(rh, ra))
+        ratings[home] = rh + delta
+        ratings[away] = ra - delta
+        out.append((league, home, match_date, match_id, away, 1, hg, ag, rh, rh + delta))
+        out.append((league, away, match_date, match_id, home, 0, ag, hg, ra, ra - delta))
+
+    out.sort(key=lambda r: r[1:4])  # kolejność klucza głównego
+    cur.executemany(
+        """
+        INSERT OR REPLACE INTO elo_history (
+            league, team, match_date, match_id, opponent, is_home,
+            goals_for, goals_against, rating_pre, rating_post
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
+        """,
+        out,
+    )
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import json
+import time
+from datetime import date
+
+import numpy as np
+
+from elo import ELO_INITIAL, elo_probs, ratings_as_of
+from markets import derive_markets, score_grids
+from model import MAX_GOALS, default_history, lambdas_vectorized, league_arrays, model_config, window_aggregates_at
+
+UPCOMING_COLUMNS = (
+    "league, match_date, home_team, away_team, match_id, season, "
+    "lambda_home, lambda_away, p_home, p_draw, p_away, prediction, computed_at"
+)
+
+INSERT_UPCOMING_SQL = f"""
+    INSERT INTO upcoming_predictions ({UPCOMING_COLUMNS})
+    VALUES ({", ".join("?" for _ in UPCOMING_COLUMNS.split(","))});
+"""
+
+
+def ensure_upcoming_schema(cur):
+    """
+    Gotowe predykcje meczów bez wyniku (home_goals/away_goals NULL) z domyślnymi ustawieniami
+    ligi. Klucz główny (league, match_date, ...) -> kolejka ligi to jeden zakres indeksu;
+    prediction = payload jak z /predict (bez etykiet drużyn) jako JSON.
+    """
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS upcoming_predictions (
+            league TEXT NOT NULL,
+            match_date TEXT NOT NULL,
+            home_team TEXT NOT NULL,
+            away_team TEXT NOT NULL,
+            match_id INTEGER NOT NULL,
+            season TEXT,
+            lambda_home REAL NOT NULL,
+            lambda_away REAL NOT NULL,
+            p_home REAL NOT NULL,
+            p_draw REAL NOT NULL,
+            p_away REAL NOT NULL,
+            prediction TEXT NOT NULL,
+            computed_at REAL NOT NULL,
+            PRIMARY KEY (league, match_date, home_team, away_team)
+        ) WITHOUT ROWID;
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_upcoming_predictions_date
+        ON upcoming_predictions (match_date);
+    """)
+    # terminarz ligi bez skanu rozegranych meczów
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_football_matches_fixtures
+        ON football_matches (league, match_date)
+        WHERE home_goals IS NULL;
+    """)
+
+
+def update_upcoming_predictions(conn, league: str, since: str | None = None):
+    """
+    Przelicza predykcje meczów bez wyniku z datą >= since (since=None = cała liga).
+    Historia to mecze ligi sprzed daty meczu, więc nowy wynik z dnia D zmienia tylko mecze po D;
+    mecz, który dostał wynik, znika z tabeli. Wszystkie mecze naraz: okna z jednego przejścia
+    (model.window_aggregates_at), lambdy i siatki wektorowo, Elo jednym zapytaniem. Nie commituje.
+    """
+    cur = conn.cursor()
+    where, params = "league = ?", [league]
+    if since is not None:
+        where += " AND match_date >= ?"
+        params.append(since)
+    cur.execute(f"DELETE FROM upcoming_predictions WHERE {where};", tuple(params))
+
+    fixtures = cur.execute(
+        f"""
+        SELECT id, season, match_date, home_team, away_team
+        FROM football_matches
+        WHERE {where} AND home_goals IS NULL
+        ORDER BY match_date ASC, id ASC;
+        """,
+        tuple(params),
+    ).fetchall()
+    if not fixtures:
+        return
+
+    cfg = model_config(league)
+    mode, value = default_history(league)
+    data = league_arrays(conn, league, extra_teams={f[3] for f in fixtures} | {f[4] for f in fixtures})
+    idx = {t: i for i, t in enumerate(data["teams"])}
+
+    days = np.array([date.fromisoformat(f[2]).toordinal() for f in fixtures], dtype=np.int64)
+    lg, th, ta = window_aggregates_at(data, mode, value, days,
+                                      np.array([idx[f[3]] for f in fixtures], dtype=np.int64),
+                                      np.array([idx[f[4]] for f in fixtures], dtype=np.int64))
+    lh, la = lambdas_vectorized(lg, th, ta, cfg["k"], cfg["lambda_min"], cfg["lambda_max"])
+    markets = derive_markets(score_grids(lh, la, MAX_GOALS))
+    # jak /predict: training_matches_used = mecze w oknie (exp_decay - cała wcześniejsza historia)
+    earlier = np.searchsorted(data["days"], days, side="left")
+    elo = ratings_as_of(cur, league, [(t, f[2]) for f in fixtures for t in (f[3], f[4])])
+
+    model = {"k": cfg["k"], "lambda_min": cfg["lambda_min"], "lambda_max": cfg["lambda_max"], "source": cfg["source"]}
+    now = time.time()
+    out = []
+    for i, (match_id, season, match_date, home_team, away_team) in enumerate(fixtures):
+        history = {"mode": mode, "value": value}
+        if mode == "exp_decay":
+            history["effective_matches"] = float(lg[i, 2])
+            training_matches = int(earlier[i])
+        else:
+            training_matches = int(lg[i, 2])
+
+        elo_home, elo_away = elo[2 * i], elo[2 * i + 1]
+        elo_home = ELO_INITIAL if elo_home is None else elo_home
+        elo_away = ELO_INITIAL if elo_away is None else elo_away
+        e_home, e_draw, e_away = elo_probs(elo_home, elo_away)
+
+        mk = markets[i]
+        prediction = {
+            "league": league,
+            "season": season,
+            "home_team": home_team,
+            "away_team": away_team,
+            "cutoff_match_date": match_date,
+            "history": history,
+            "model": model,
+            "lambda_home": float(lh[i]),
+            "lambda_away": float(la[i]),
+            "max_goals": MAX_GOALS,
+            "training_matches_used": training_matches,
+            "elo": {
+                "home_rating": elo_home,
+                "away_rating": elo_away,
+                "p_home": e_home,
+                "p_draw": e_draw,
+                "p_away": e_away,
+            },
+            "p_home": mk["1x2"]["home"],
+            "p_draw": mk["1x2"]["draw"],
+            "p_away": mk["1x2"]["away"],
+            "most_likely_score": mk["correct_scores"][0],
+            "markets": mk,
+        }
+        out.append((
+            league, match_date, home_team, away_team, match_id, season,
+            prediction["lambda_home"], prediction["lambda_away"],
+            prediction["p_home"], prediction["p_draw"], prediction["p_away"],
+            json.dumps(prediction, separators=(",", ":")), now,
+        ))
+
+    cur.executemany(INSERT_UPCOMING_SQL, out)
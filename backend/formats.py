@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import json
+
+from flask import Response, jsonify, request
+
+try:
+    import msgpack  # w requirements.txt; bez pakietu Accept: application/msgpack dostaje zwykły JSON
+except ImportError:
+    msgpack = None
+
+JSON = "application/json"
+COLUMNAR_JSON = "application/vnd.columnar+json"
+MSGPACK = "application/msgpack"
+MSGPACK_ALIASES = (MSGPACK, "application/x-msgpack")
+
+
+def negotiate() -> str:
+    """Format odpowiedzi z nagłówka Accept; JSON wygrywa przy remisie (np. */*)."""
+    offered = [JSON, COLUMNAR_JSON]
+    if msgpack is not None:
+        offered += MSGPACK_ALIASES
+    best = request.accept_mimetypes.best_match(offered, default=JSON)
+    return MSGPACK if best in MSGPACK_ALIASES else best
+
+
+def _table_from_dicts(items: list[dict]) -> tuple[list[str], list[tuple]]:
+    """(kolumny, wiersze) z listy słowników o różnych kluczach (brak klucza -> None)."""
+    columns: dict[str, None] = {}
+    for item in items:
+        columns.update(dict.fromkeys(item))
+    cols = list(columns)
+    return cols, [tuple(item.get(c) for c in cols) for item in items]
+
+
+def _columnar(columns: list[str], rows: list[tuple]) -> dict:
+    values = list(zip(*rows)) if rows else [()] * len(columns)
+    return {"columns": columns, "data": {c: list(v) for c, v in zip(columns, values)}}
+
+
+def respond(payload: dict, tables: dict[str, tuple[list[str], list[tuple]] | list[dict]], status: int = 200):
+    """
+    payload + tabele (klucz -> (kolumny, krotki z kursora) albo lista słowników) w formacie z Accept:
+    - application/json (domyślnie): tabela jako lista obiektów, jak dotąd
+    - application/vnd.columnar+json i application/msgpack: {"columns": [...], "data": {kolumna: [...]}}
+    """
+    fmt = negotiate()
+    body = dict(payload)
+    for key, table in tables.items():
+        if isinstance(table, list):
+            body[key] = table if fmt == JSON else _columnar(*_table_from_dicts(table))
+        else:
+            columns, rows = table
+            body[key] = [dict(zip(columns, r)) for r in rows] if fmt == JSON else _columnar(columns, rows)
+
+    if fmt == JSON:
+        resp = jsonify(body)
+        resp.status_code = status
+    elif fmt == MSGPACK:
+        resp = Response(msgpack.packb(body, use_bin_type=True), status=status, mimetype=fmt)
+    else:
+        data = json.dumps(body, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        resp = Response(data, status=status, mimetype=fmt)
+    resp.headers["Vary"] = "Accept"
+    return resp
@@ -0,0 +1,526 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+
+import db
+from model import (
+    MAX_GOALS, compute_lambdas_poisson, fetch_matches_for_predict, model_config, outcome_probs,
+    score_matrix,
+)
+
+JOBS_DB_PATH = db.BASE_DIR / "data" / "jobs.db"
+JOBS_MAX_WORKERS = int(os.getenv("JOBS_MAX_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+JOBS_MAX_PENDING = int(os.getenv("JOBS_MAX_PENDING", "32"))
+
+# progress zapisujemy najwyżej co tyle sekund (to też moment sprawdzenia anulowania)
+PROGRESS_INTERVAL_S = 0.5
+
+ACTIVE_STATUSES = ("queued", "running", "cancelling")
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+def _jobs_connect(path: Path | str = JOBS_DB_PATH):
+    conn = sqlite3.connect(path, timeout=10)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def init_jobs_db(path: Path | str = JOBS_DB_PATH):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    conn = _jobs_connect(path)
+    with conn:
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                spec_hash TEXT NOT NULL UNIQUE,
+                kind TEXT NOT NULL,
+                spec TEXT NOT NULL,
+                status TEXT NOT NULL,
+                progress REAL NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                result TEXT,
+                error TEXT,
+                owner_pid INTEGER
+            );
+        """)
+    conn.close()
+
+
+# =========================
+# Job kinds (uruchamiane w procesach puli)
+# =========================
+
+class Progress:
+    """
+    Callback postępu dla joba: zapisuje progress do jobs.db (z throttlingiem)
+    i przy okazji sprawdza, czy ktoś nie poprosił o anulowanie.
+    """
+
+    def __init__(self, job_id: str, jobs_db_path: str):
+        self.job_id = job_id
+        self.jobs_db_path = jobs_db_path
+        self._last = 0.0
+
+    def __call__(self, fraction: float, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._last < PROGRESS_INTERVAL_S:
+            return
+        self._last = now
+
+        conn = _jobs_connect(self.jobs_db_path)
+        try:
+            with conn:
+                conn.execute("UPDATE jobs SET progress = ? WHERE id = ?;", (min(max(fraction, 0.0), 1.0), self.job_id))
+                row = conn.execute("SELECT status FROM jobs WHERE id = ?;", (self.job_id,)).fetchone()
+        finally:
+            conn.close()
+        if row is not None and row["status"] == "cancelling":
+            raise JobCancelled()
+
+
+def _require_league(spec: dict) -> dict:
+    league = (spec.get("league") or "").strip()
+    if not league:
+        raise ValueError("spec.league is required")
+    season = spec.get("season")
+    season = str(season).strip() if season not in (None, "") else None
+    return {"league": league, "season": season}
+
+
+def _load_scored_matches(league: str, season: str | None) -> list[tuple]:
+    conn = db.get_connection(league, read_only=True)
+    try:
+        where = ["league = ?", "home_goals IS NOT NULL", "away_goals IS NOT NULL"]
+        params: list[object] = [league]
+        if season:
+            where.append("season = ?")
+            params.append(season)
+        return list(db.iter_rows(
+            conn,
+            f"""
+            SELECT match_date, home_team, away_team, home_goals, away_goals
+            FROM football_matches
+            WHERE {" AND ".join(where)}
+            ORDER BY match_date ASC, id ASC;
+            """,
+            tuple(params),
+        ))
+    finally:
+        conn.close()
+
+
+def _model_params(cfg: dict) -> dict:
+    return {"k": cfg["k"], "lambda_min": cfg["lambda_min"], "lambda_max": cfg["lambda_max"], "source": cfg["source"]}
+
+
+def validate_backtest(spec: dict) -> dict:
+    """
+    Parametry modelu (K, clamp lambd) i domyślne okno historii jak w /predict: z model_config ligi.
+    Trafiają do spec, więc po ponownym strojeniu (inny klucz) job liczy się od nowa.
+    """
+    out = _require_league(spec)
+    cfg = model_config(out["league"])
+    # tylko okno dostrojone przez tune.py; bez wpisu zostają domyślne 2000 meczów / 365 dni
+    tuned_mode, tuned_value = cfg["history_mode"], cfg["history_value"]
+    if ("history_mode" not in spec and "history_value" not in spec and tuned_value
+            and tuned_mode in ("last_n", "last_days")):
+        spec = {**spec, "history_mode": tuned_mode, "history_value": tuned_value}
+    mode = spec.get("history_mode", "last_n")
+    if mode not in ("last_n", "last_days"):
+        raise ValueError("spec.history_mode must be 'last_n' or 'last_days'")
+    try:
+        value = int(spec.get("history_value", 2000 if mode == "last_n" else 365))
+    except (TypeError, ValueError):
+        raise ValueError("spec.history_value must be an integer")
+    if value < 1 or value > (5000 if mode == "last_n" else 3650):
+        raise ValueError("spec.history_value out of range")
+    try:
+        min_history = int(spec.get("min_history", 20))
+    except (TypeError, ValueError):
+        raise ValueError("spec.min_history must be an integer")
+    out.update({"history_mode": mode, "history_value": value, "min_history": max(min_history, 0)})
+    out["model"] = _model_params(cfg)
+    return out
+
+
+def run_backtest(spec: dict, progress: Progress) -> dict:
+    """
+    Walk-forward: każdy mecz przewidujemy tylko z meczów sprzed jego daty
+    (jak /predict z match_date) i liczymy log loss, Brier i trafność 1X2.
+    """
+    rows = _load_scored_matches(spec["league"], spec["season"])
+    dates = [r[0] for r in rows]
+    mode, value = spec["history_mode"], spec["history_value"]
+    model = spec["model"]
+
+    n = 0
+    log_loss = brier = 0.0
+    hits = 0
+    total = len(rows)
+
+    for i, (match_date, home_team, away_team, hg, ag) in enumerate(rows):
+        progress(i / max(total, 1))
+
+        end = bisect_left(dates, match_date)  # tylko mecze sprzed daty
+        if mode == "last_n":
+            start = max(0, end - value)
+        else:
+            since = (date.fromisoformat(match_date) - timedelta(days=value)).isoformat()
+            start = bisect_left(dates, since, 0, end)
+        history = rows[start:end]
+        if len(history) < spec["min_history"]:
+            continue
+
+        lh, la = compute_lambdas_poisson(history, home_team, away_team, k=model["k"],
+                                         lambda_min=model["lambda_min"], lambda_max=model["lambda_max"])
+        p_home, p_draw, p_away, _best = outcome_probs(score_matrix(lh, la, max_goals=MAX_GOALS))
+
+        actual = (1.0, 0.0, 0.0) if hg > ag else (0.0, 1.0, 0.0) if hg == ag else (0.0, 0.0, 1.0)
+        probs = (p_home, p_draw, p_away)
+
+        n += 1
+        log_loss -= math.log(max(sum(p * a for p, a in zip(probs, actual)), 1e-15))
+        brier += sum((p - a) ** 2 for p, a in zip(probs, actual))
+        if max(range(3), key=lambda k: probs[k]) == actual.index(1.0):
+            hits += 1
+
+    return {
+        "spec": spec,
+        "matches_total": total,
+        "matches_scored": n,
+        "log_loss": log_loss / n if n else None,
+        "brier": brier / n if n else None,
+        "accuracy": hits / n if n else None,
+    }
+
+
+def validate_season_simulation(spec: dict) -> dict:
+    out = _require_league(spec)
+    if not out["season"]:
+        raise ValueError("spec.season is required")
+    try:
+        n_sims = int(spec.get("n_sims", 10000))
+    except (TypeError, ValueError):
+        raise ValueError("spec.n_sims must be an integer")
+    if n_sims < 100 or n_sims > 50000:
+        raise ValueError("spec.n_sims must be 100..50000")
+    mode = spec.get("mode", "remaining")
+    if mode not in ("remaining", "full"):
+        raise ValueError("spec.mode must be 'remaining' or 'full'")
+    seed = spec.get("seed")
+    out.update({"n_sims": n_sims, "mode": mode, "seed": int(seed) if seed is not None else None})
+    out["model"] = _model_params(model_config(out["league"]))
+    return out
+
+
+def run_season_simulation(spec: dict, progress: Progress) -> dict:
+    """
+    Monte Carlo sezonu: "remaining" losuje tylko mecze bez wyniku (reszta jak
+    w tabeli), "full" losuje cały sezon z siłami sprzed jego startu.
+    """
+    league, season = spec["league"], spec["season"]
+    conn = db.get_connection(league, read_only=True)
+    try:
+        # krotki (match_date, home_team, away_team, home_goals, away_goals)
+        fixtures = list(db.iter_rows(
+            conn,
+            """
+            SELECT match_date, home_team, away_team, home_goals, away_goals
+            FROM football_matches
+            WHERE league = ? AND season = ?
+            ORDER BY match_date ASC, id ASC;
+            """,
+            (league, season),
+        ))
+        if not fixtures:
+            raise ValueError("No matches for given league/season")
+
+        cutoff = fixtures[0][0] if spec["mode"] == "full" else None
+        history = fetch_matches_for_predict(conn, league=league, season=None, cutoff_date=cutoff,
+                                            history_mode="last_n", history_value=2000)
+    finally:
+        conn.close()
+
+    teams = sorted({f[1] for f in fixtures} | {f[2] for f in fixtures})
+    idx = {t: i for i, t in enumerate(teams)}
+    n_teams, n_sims = len(teams), spec["n_sims"]
+
+    base_points = np.zeros(n_teams)
+    base_gd = np.zeros(n_teams)
+    to_sim = []
+    for f in fixtures:
+        _match_date, home_team, away_team, hg, ag = f
+        if hg is not None and ag is not None and spec["mode"] == "remaining":
+            h, a = idx[home_team], idx[away_team]
+            base_points[h] += 3 if hg > ag else 1 if hg == ag else 0
+            base_points[a] += 3 if ag > hg else 1 if hg == ag else 0
+            base_gd[h] += hg - ag
+            base_gd[a] += ag - hg
+        else:
+            to_sim.append(f)
+
+    progress(0.1, force=True)
+
+    points = np.tile(base_points, (n_sims, 1))
+    gd = np.tile(base_gd, (n_sims, 1))
+    if to_sim:
+        model = spec["model"]
+        lam = np.array([
+            compute_lambdas_poisson(history, f[1], f[2], k=model["k"],
+                                    lambda_min=model["lambda_min"], lambda_max=model["lambda_max"])
+            for f in to_sim
+        ])
+        home_idx = np.array([idx[f[1]] for f in to_sim])
+        away_idx = np.array([idx[f[2]] for f in to_sim])
+
+        rng = np.random.default_rng(spec["seed"])
+        hg = rng.poisson(lam[:, 0], size=(n_sims, len(to_sim)))
+        ag = rng.poisson(lam[:, 1], size=(n_sims, len(to_sim)))
+        progress(0.5)
+
+        home_pts = np.where(hg > ag, 3, np.where(hg == ag, 1, 0))
+        away_pts = np.where(ag > hg, 3, np.where(hg == ag, 1, 0))
+        for k in range(len(to_sim)):
+            points[:, home_idx[k]] += home_pts[:, k]
+            points[:, away_idx[k]] += away_pts[:, k]
+            gd[:, home_idx[k]] += hg[:, k] - ag[:, k]
+            gd[:, away_idx[k]] += ag[:, k] - hg[:, k]
+
+    # ranking: punkty, potem bilans (ułamek tylko rozstrzyga remisy)
+    score = points + gd / 1000.0
+    order = np.argsort(-score, axis=1)
+    ranks = np.empty_like(order)
+    ranks[np.arange(n_sims)[:, None], order] = np.arange(1, n_teams + 1)
+
+    progress(0.9, force=True)
+
+    items = []
+    for t, i in idx.items():
+        r = ranks[:, i]
+        items.append({
+            "team": t,
+            "expected_points": float(points[:, i].mean()),
+            "expected_rank": float(r.mean()),
+            "p_title": float((r == 1).mean()),
+            "p_top4": float((r <= 4).mean()),
+            "p_bottom3": float((r > n_teams - 3).mean()),
+        })
+    items.sort(key=lambda x: (x["expected_rank"], x["team"]))
+
+    return {
+        "spec": spec,
+        "simulated_fixtures": len(to_sim),
+        "fixed_fixtures": len(fixtures) - len(to_sim),
+        "teams": items,
+    }
+
+
+# nazwa -> (walidacja speca, funkcja joba)
+JOB_KINDS = {
+    "backtest": (validate_backtest, run_backtest),
+    "season_simulation": (validate_season_simulation, run_season_simulation),
+}
+
+
+def run_job(job_id: str, kind: str, spec: dict, jobs_db_path: str) -> None:
+    conn = _jobs_connect(jobs_db_path)
+    try:
+        with conn:
+            cur = conn.execute(
+                "UPDATE jobs SET status = 'running', started_at = ? WHERE id = ? AND status = 'queued';",
+                (time.time(), job_id),
+            )
+        if cur.rowcount == 0:
+            # anulowany zanim wystartował
+            with conn:
+                conn.execute(
+                    "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'cancelling';",
+                    (time.time(), job_id),
+                )
+            return
+    finally:
+        conn.close()
+
+    status, result, error = "done", None, None
+    try:
+        progress = Progress(job_id, jobs_db_path)
+        result = json.dumps(JOB_KINDS[kind][1](spec, progress))
+    except JobCancelled:
+        status = "cancelled"
+    except Exception as e:
+        status, error = "failed", f"{type(e).__name__}: {e}"
+
+    # anulowanie mogło przyjść po ostatnim sprawdzeniu w Progress (np. między progami symulacji):
+    # 'cancelling' wygrywa z wynikiem; CASE widzi status sprzed tego UPDATE, więc bez wyścigu z cancel()
+    conn = _jobs_connect(jobs_db_path)
+    try:
+        with conn:
+            conn.execute(
+                """
+                UPDATE jobs
+                SET status = CASE WHEN status = 'cancelling' THEN 'cancelled' ELSE ? END,
+                    progress = CASE WHEN status != 'cancelling' AND ? = 'done' THEN 1.0 ELSE progress END,
+                    finished_at = ?,
+                    result = CASE WHEN status = 'cancelling' THEN NULL ELSE ? END,
+                    error = CASE WHEN status = 'cancelling' THEN NULL ELSE ? END
+                WHERE id = ?;
+                """,
+                (status, status, time.time(), result, error, job_id),
+            )
+    finally:
+        conn.close()
+
+
+# =========================
+# Manager (proces API)
+# =========================
+
+def _pid_alive(pid: int | None) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def job_public(row) -> dict:
+    return {
+        "id": row["id"],
+        "kind": row["kind"],
+        "spec": json.loads(row["spec"]),
+        "status": row["status"],
+        "progress": row["progress"],
+        "created_at": row["created_at"],
+        "started_at": row["started_at"],
+        "finished_at": row["finished_at"],
+        "error": row["error"],
+    }
+
+
+class JobManager:
+    """
+    Ograniczona pula procesów (spawn) + stan jobów w data/jobs.db.
+    Ten sam spec (i ta sama wersja danych) -> ten sam job, bez ponownego liczenia.
+    """
+
+    def __init__(self, jobs_db_path: Path | str = JOBS_DB_PATH, max_workers: int = JOBS_MAX_WORKERS):
+        self.jobs_db_path = str(jobs_db_path)
+        self.max_workers = max_workers
+        self._pool: ProcessPoolExecutor | None = None
+        self._futures: dict[str, object] = {}
+        self._lock = threading.Lock()
+
+        init_jobs_db(self.jobs_db_path)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    def submit(self, kind: str, spec: dict) -> tuple[dict, bool]:
+        """Zwraca (job, created). Rzuca ValueError przy złym specu."""
+        if kind not in JOB_KINDS:
+            raise ValueError(f"kind must be one of {sorted(JOB_KINDS)}")
+        if not isinstance(spec, dict):
+            raise ValueError("spec must be an object")
+        spec = JOB_KINDS[kind][0](spec)
+
+        key = json.dumps({"kind": kind, "spec": spec, "data_version": db.data_version()}, sort_keys=True)
+        spec_hash = hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+        with self._lock:
+            self._futures = {k: f for k, f in self._futures.items() if not f.done()}
+
+            conn = _jobs_connect(self.jobs_db_path)
+            try:
+                row = conn.execute("SELECT * FROM jobs WHERE spec_hash = ?;", (spec_hash,)).fetchone()
+                if row is not None and row["status"] == "done":
+                    return job_public(row), False
+                # aktywny job martwego procesu (restart) nigdy się nie skończy -> liczymy od nowa
+                if row is not None and row["status"] in ACTIVE_STATUSES and _pid_alive(row["owner_pid"]):
+                    return job_public(row), False
+
+                if len(self._futures) >= JOBS_MAX_PENDING:
+                    raise JobQueueFull()
+
+                job_id = uuid.uuid4().hex
+                with conn:
+                    # nieudany/anulowany job z tym samym specem zastępujemy nowym
+                    conn.execute("DELETE FROM jobs WHERE spec_hash = ?;", (spec_hash,))
+                    conn.execute(
+                        """
+                        INSERT INTO jobs (id, spec_hash, kind, spec, status, created_at, owner_pid)
+                        VALUES (?, ?, ?, ?, 'queued', ?, ?);
+                        """,
+                        (job_id, spec_hash, kind, json.dumps(spec), time.time(), os.getpid()),
+                    )
+                row = conn.execute("SELECT * FROM jobs WHERE id = ?;", (job_id,)).fetchone()
+            finally:
+                conn.close()
+
+            self._futures[job_id] = self._get_pool().submit(run_job, job_id, kind, spec, self.jobs_db_path)
+            return job_public(row), True
+
+    def get(self, job_id: str):
+        conn = _jobs_connect(self.jobs_db_path)
+        try:
+            return conn.execute("SELECT * FROM jobs WHERE id = ?;", (job_id,)).fetchone()
+        finally:
+            conn.close()
+
+    def cancel(self, job_id: str):
+        conn = _jobs_connect(self.jobs_db_path)
+        try:
+            with conn:
+                conn.execute(
+                    "UPDATE jobs SET status = 'cancelling' WHERE id = ? AND status IN ('queued', 'running');",
+                    (job_id,),
+                )
+        finally:
+            conn.close()
+
+        # jeszcze w kolejce puli -> po prostu go nie uruchamiamy
+        future = self._futures.get(job_id)
+        if future is not None and future.cancel():
+            conn = _jobs_connect(self.jobs_db_path)
+            try:
+                with conn:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ?;",
+                        (time.time(), job_id),
+                    )
+            finally:
+                conn.close()
+
+        return self.get(job_id)
@@ -0,0 +1,360 @@
+"""
+Test obciążeniowy API: ważony miks zapytań (jak z frontendu) z parametrami
+losowanymi z prawdziwego katalogu lig / sezonów / drużyn (/catalog).
+
+Domyślnie startuje lokalny serwer (python app.py) na wskazanej bazie, --url celuje
+w już działający. Bez --rate każdy wątek wysyła kolejne zapytanie od razu po odpowiedzi
+(closed loop); z --rate zapytania mają stały harmonogram, a opóźnienie liczymy od
+planowanego startu, więc kolejka przed serwerem też wchodzi do wyniku.
+
+Raport: przepustowość, p50/p95/p99 i odsetek błędów (5xx, 503 z admission control,
+błędy połączenia) per trasa. Przekroczony próg -> kod wyjścia 1.
+
+Użycie:
+    python loadtest.py --duration 30 --concurrency 16
+    python loadtest.py --db /tmp/sports.db --rate 200 --max-p95-ms 150 --max-error-rate 0.01
+    python loadtest.py --url http://127.0.0.1:5000 --scenario predict=1
+"""
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
+
+import numpy as np
+
+# waga = udział w ruchu
+SCENARIO = {
+    "/leagues": 5,
+    "/seasons": 5,
+    "/teams": 10,
+    "/predict": 30,
+    "/stats/team": 15,
+    "/stats/h2h": 10,
+    "/stats/table": 10,
+    "/matches": 15,
+}
+
+HISTORY_VALUES = (5, 10, 20, 38)
+
+
+def load_catalog(base_url: str) -> list[dict]:
+    status, body = _http(base_url, "GET", "/catalog")
+    if status != 200:
+        raise RuntimeError(f"GET /catalog -> HTTP {status}")
+    leagues = []
+    for lg in json.loads(body)["leagues"]:
+        seasons = [
+            (s["season"], [t["value"] for t in s["teams"]])
+            for s in lg["seasons"]
+            if s["season"] and len(s["teams"]) >= 2
+        ]
+        if seasons:
+            leagues.append({"league": lg["league"], "seasons": seasons, "teams": [t["value"] for t in lg["teams"]]})
+    if not leagues:
+        raise RuntimeError("Catalog is empty - import data first")
+    return leagues
+
+
+def build_request(route: str, rng: random.Random, catalog: list[dict]) -> tuple[str, str, dict | None]:
+    """(metoda, ścieżka z query, body JSON) dla trasy z losowymi, poprawnymi parametrami."""
+    lg = rng.choice(catalog)
+    league = lg["league"]
+    season, teams = rng.choice(lg["seasons"])
+    home, away = rng.sample(teams, 2)
+
+    if route == "/leagues":
+        return "GET", route, None
+    if route == "/seasons":
+        return "GET", f"{route}?{urlencode({'league': league})}", None
+    if route == "/teams":
+        return "GET", f"{route}?{urlencode({'league': league, 'pretty': 1})}", None
+    if route == "/predict":
+        body = {"league": league, "season": season, "home_team": home, "away_team": away,
+                "history_mode": "last_n", "history_value": rng.choice(HISTORY_VALUES)}
+        return "POST", route, body
+    if route == "/stats/team":
+        return "GET", f"{route}?{urlencode({'league': league, 'season': season, 'team': home})}", None
+    if route == "/stats/h2h":
+        return "GET", f"{route}?{urlencode({'league': league, 'home_team': home, 'away_team': away})}", None
+    if route == "/stats/table":
+        return "GET", f"{route}?{urlencode({'league': league, 'season': season})}", None
+    if route == "/matches":
+        params = {"league": league, "limit": rng.choice((20, 50)), "offset": 20 * rng.randrange(5)}
+        if rng.random() < 0.5:
+            params["team"] = home
+        return "GET", f"{route}?{urlencode(params)}", None
+    raise ValueError(f"Unknown route in scenario: {route}")
+
+
+def _http(base_url: str, method: str, path: str, body: dict | None = None, conn=None) -> tuple[int, bytes]:
+    own = conn is None
+    if own:
+        u = urlsplit(base_url)
+        conn = http.client.HTTPConnection(u.hostname, u.port, timeout=30)
+    try:
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        resp = conn.getresponse()
+        return resp.status, resp.read()
+    finally:
+        if own:
+            conn.close()
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: dict[str, list[float]] = {}
+        self.statuses: dict[str, dict[int, int]] = {}
+
+    def record(self, route: str, status: int, seconds: float):
+        # status 0 = błąd połączenia / timeout
+        with self._lock:
+            self.latencies.setdefault(route, []).append(seconds)
+            st = self.statuses.setdefault(route, {})
+            st[status] = st.get(status, 0) + 1
+
+
+def _worker(base_url, routes, weights, catalog, seed, recorder, stop_at, warmup_until, schedule):
+    rng = random.Random(seed)
+    u = urlsplit(base_url)
+    conn = http.client.HTTPConnection(u.hostname, u.port, timeout=30)
+
+    while True:
+        if schedule is not None:
+            planned = schedule()
+            if planned >= stop_at:
+                break
+            delay = planned - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            start = planned
+        else:
+            start = time.perf_counter()
+            if start >= stop_at:
+                break
+
+        route = rng.choices(routes, weights)[0]
+        method, path, body = build_request(route, rng, catalog)
+        try:
+            status, _ = _http(base_url, method, path, body, conn=conn)
+        except (OSError, http.client.HTTPException):
+            status = 0
+            conn.close()
+            conn = http.client.HTTPConnection(u.hostname, u.port, timeout=30)
+        elapsed = time.perf_counter() - start
+
+        if start >= warmup_until:
+            recorder.record(route, status, elapsed)
+    conn.close()
+
+
+def run_load(base_url: str, scenario: dict[str, float], catalog: list[dict], duration: float, warmup: float,
+             concurrency: int, rate: float | None, seed: int) -> tuple[Recorder, float]:
+    recorder = Recorder()
+    routes, weights = list(scenario), list(scenario.values())
+    t0 = time.perf_counter()
+    warmup_until = t0 + warmup
+    stop_at = warmup_until + duration
+
+    schedule = None
+    if rate:
+        # wspólny harmonogram: i-te zapytanie startuje w t0 + i / rate
+        lock = threading.Lock()
+        counter = [0]
+
+        def schedule() -> float:
+            with lock:
+                i = counter[0]
+                counter[0] += 1
+            return t0 + i / rate
+
+    threads = [
+        threading.Thread(
+            target=_worker,
+            args=(base_url, routes, weights, catalog, seed + i, recorder, stop_at, warmup_until, schedule),
+            daemon=True,
+        )
+        for i in range(concurrency)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return recorder, duration
+
+
+def summarize(recorder: Recorder, duration: float) -> dict:
+    routes = {}
+    all_lat: list[float] = []
+    total = errors = 0
+    for route in sorted(recorder.latencies):
+        lat = np.array(recorder.latencies[route]) * 1000.0
+        statuses = recorder.statuses[route]
+        n = len(lat)
+        n_err = sum(c for s, c in statuses.items() if s == 0 or s >= 500)
+        p50, p95, p99 = np.percentile(lat, [50, 95, 99])
+        routes[route] = {
+            "requests": n,
+            "rps": n / duration,
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "p99_ms": float(p99),
+            "max_ms": float(lat.max()),
+            "error_rate": n_err / n,
+            "statuses": {str(s): c for s, c in sorted(statuses.items())},
+        }
+        all_lat.extend(lat.tolist())
+        total += n
+        errors += n_err
+
+    overall = {"requests": total, "rps": total / duration, "error_rate": errors / total if total else 0.0}
+    if all_lat:
+        p50, p95, p99 = np.percentile(all_lat, [50, 95, 99])
+        overall.update(p50_ms=float(p50), p95_ms=float(p95), p99_ms=float(p99))
+    return {"duration_s": duration, "overall": overall, "routes": routes}
+
+
+def check_thresholds(report: dict, max_p95: float | None, max_p99: float | None,
+                     max_error_rate: float | None, min_rps: float | None) -> list[str]:
+    failures = []
+    for route, r in report["routes"].items():
+        if max_p95 is not None and r["p95_ms"] > max_p95:
+            failures.append(f"{route}: p95 {r['p95_ms']:.1f} ms > {max_p95} ms")
+        if max_p99 is not None and r["p99_ms"] > max_p99:
+            failures.append(f"{route}: p99 {r['p99_ms']:.1f} ms > {max_p99} ms")
+        if max_error_rate is not None and r["error_rate"] > max_error_rate:
+            failures.append(f"{route}: error rate {r['error_rate']:.2%} > {max_error_rate:.2%}")
+    if min_rps is not None and report["overall"]["rps"] < min_rps:
+        failures.append(f"throughput {report['overall']['rps']:.1f} req/s < {min_rps} req/s")
+    return failures
+
+
+def print_report(report: dict):
+    print(f"{'route':<14} {'req':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'err':>7}")
+    for route, r in report["routes"].items():
+        print(
+            f"{route:<14} {r['requests']:>7} {r['rps']:>8.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} "
+            f"{r['p99_ms']:>8.1f} {r['max_ms']:>8.1f} {r['error_rate']:>7.2%}"
+        )
+    o = report["overall"]
+    if o["requests"]:
+        print(
+            f"{'TOTAL':<14} {o['requests']:>7} {o['rps']:>8.1f} {o['p50_ms']:>8.1f} {o['p95_ms']:>8.1f} "
+            f"{o['p99_ms']:>8.1f} {'':>8} {o['error_rate']:>7.2%}"
+        )
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(db_path: str | None, log) -> tuple[subprocess.Popen, str]:
+    port = _free_port()
+    env = dict(os.environ, FLASK_HOST="127.0.0.1", FLASK_PORT=str(port), FLASK_DEBUG="0")
+    if db_path:
+        env["SPORTS_DB_PATH"] = str(Path(db_path).resolve())
+    proc = subprocess.Popen(
+        [sys.executable, "app.py"],
+        cwd=Path(__file__).resolve().parent,
+        env=env,
+        stdout=log,
+        stderr=subprocess.STDOUT,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            break
+        try:
+            if _http(base_url, "GET", "/health")[0] == 200:
+                return proc, base_url
+        except OSError:
+            pass
+        time.sleep(0.2)
+
+    proc.kill()
+    log.seek(0)
+    raise RuntimeError("Server did not start:\n" + log.read()[-2000:])
+
+
+def parse_scenario(items: list[str] | None) -> dict[str, float]:
+    if not items:
+        return dict(SCENARIO)
+    scenario = {}
+    for item in items:
+        name, _, weight = item.partition("=")
+        route = name if name.startswith("/") else "/" + name
+        if route not in SCENARIO:
+            raise SystemExit(f"Unknown route {route!r}, choose from {sorted(SCENARIO)}")
+        scenario[route] = float(weight or 1)
+    return scenario
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Weighted traffic replay against the prediction API")
+    parser.add_argument("--url", help="działający serwer (domyślnie startujemy lokalny)")
+    parser.add_argument("--db", help="plik SQLite dla lokalnego serwera (domyślnie data/sports.db)")
+    parser.add_argument("--duration", type=float, default=20.0, help="czas pomiaru w sekundach")
+    parser.add_argument("--warmup", type=float, default=2.0, help="sekundy na początku pomijane w raporcie")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate", type=float, help="stała liczba zapytań/s (open loop)")
+    parser.add_argument("--scenario", action="append", help="trasa=waga, np. predict=3 (zastępuje domyślny miks)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--max-p95-ms", type=float)
+    parser.add_argument("--max-p99-ms", type=float)
+    parser.add_argument("--max-error-rate", type=float)
+    parser.add_argument("--min-rps", type=float)
+    parser.add_argument("--json", help="zapisz raport JSON do pliku")
+    args = parser.parse_args()
+
+    scenario = parse_scenario(args.scenario)
+    proc = None
+    log = tempfile.TemporaryFile(mode="w+")
+    try:
+        if args.url:
+            base_url = args.url.rstrip("/")
+        else:
+            proc, base_url = start_server(args.db, log)
+
+        catalog = load_catalog(base_url)
+        mode = f"open loop {args.rate:g} req/s" if args.rate else "closed loop"
+        print(f"Target: {base_url}, {args.concurrency} workers, {mode}, {args.duration:g}s (+{args.warmup:g}s warmup)")
+
+        recorder, duration = run_load(base_url, scenario, catalog, args.duration, args.warmup,
+                                      args.concurrency, args.rate, args.seed)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        log.close()
+
+    report = summarize(recorder, duration)
+    print_report(report)
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    failures = check_thresholds(report, args.max_p95_ms, args.max_p99_ms, args.max_error_rate, args.min_rps)
+    if failures:
+        print("\nFAILED:")
+        for f in failures:
+            print(" -", f)
+        sys.exit(1)
+    print("\nOK")
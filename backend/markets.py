@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+from math import factorial
+
+import numpy as np
+
+OVER_UNDER_LINES = (0.5, 1.5, 2.5, 3.5, 4.5)
+# handicap gospodarzy; linie całkowite mają zwrot stawki (push)
+ASIAN_HANDICAP_LINES = (-2.5, -2.0, -1.5, -1.0, -0.5, 0.0, 0.5, 1.0, 1.5, 2.0, 2.5)
+TOP_SCORES = 10
+
+_masks_cache: dict[int, dict] = {}
+
+
+def _masks(max_goals: int) -> dict:
+    """Maski (linie, G, G) dla siatki 0..max_goals - liczone raz na rozmiar siatki."""
+    m = _masks_cache.get(max_goals)
+    if m is None:
+        g = np.arange(max_goals + 1)
+        hg, ag = np.meshgrid(g, g, indexing="ij")
+        diff, total = hg - ag, hg + ag
+        ah = diff[None, :, :] + np.array(ASIAN_HANDICAP_LINES)[:, None, None]
+        m = {
+            "result": np.stack([diff > 0, diff == 0, diff < 0]).astype(float),
+            "over": (total[None, :, :] > np.array(OVER_UNDER_LINES)[:, None, None]).astype(float),
+            "btts": ((hg > 0) & (ag > 0)).astype(float),
+            "ah": np.stack([ah > 0, ah == 0, ah < 0], axis=1).astype(float),  # (linie, 3, G, G)
+        }
+        _masks_cache[max_goals] = m
+    return m
+
+
+def score_grids(lh, la, max_goals: int) -> np.ndarray:
+    """Siatki wyników (m, G, G) dla m par lambd; te same wartości co model.score_matrix()."""
+    lh = np.asarray(lh, dtype=float)[:, None]
+    la = np.asarray(la, dtype=float)[:, None]
+    g = np.arange(max_goals + 1)
+    fact = np.array([factorial(k) for k in g], dtype=float)
+    ph = np.exp(-lh) * lh ** g / fact
+    pa = np.exp(-la) * la ** g / fact
+    return ph[:, :, None] * pa[:, None, :]
+
+
+def _top_cells(flat: np.ndarray, top_n: int) -> np.ndarray:
+    """
+    Indeksy top_n najbardziej prawdopodobnych pól każdej spłaszczonej siatki, malejąco.
+    Pełne sortowanie stabilne: remisy w kolejności wierszowej, więc pierwsze pole = best z outcome_probs().
+    """
+    return np.argsort(-flat, axis=1, kind="stable")[:, :top_n]
+
+
+def outcome_probs_batch(grids: np.ndarray) -> np.ndarray:
+    """(m, 3) = H/D/A dla każdej siatki."""
+    return np.einsum("mij,kij->mk", grids, _masks(grids.shape[1] - 1)["result"])
+
+
+def derive_markets(grids: np.ndarray, top_n: int = TOP_SCORES) -> list[dict]:
+    """
+    Wszystkie rynki z gotowych siatek jednym przebiegiem (einsum po maskach).
+    Prawdopodobieństwa bez renormalizacji - jak outcome_probs() (masa poza siatką pomijana).
+    """
+    m, size, _ = grids.shape
+    masks = _masks(size - 1)
+
+    result = outcome_probs_batch(grids)
+    over = np.einsum("mij,lij->ml", grids, masks["over"])
+    btts = np.einsum("mij,ij->m", grids, masks["btts"])
+    ah = np.einsum("mij,lkij->mlk", grids, masks["ah"])
+    covered = grids.sum(axis=(1, 2))
+
+    flat = grids.reshape(m, -1)
+    top = _top_cells(flat, top_n)
+
+    out = []
+    for i in range(m):
+        p_home, p_draw, p_away = (float(x) for x in result[i])
+        out.append({
+            "1x2": {"home": p_home, "draw": p_draw, "away": p_away},
+            "double_chance": {"1X": p_home + p_draw, "X2": p_draw + p_away, "12": p_home + p_away},
+            "over_under": [
+                {"line": line, "over": float(over[i, k]), "under": float(covered[i] - over[i, k])}
+                for k, line in enumerate(OVER_UNDER_LINES)
+            ],
+            "btts": {"yes": float(btts[i]), "no": float(covered[i] - btts[i])},
+            "asian_handicap": [
+                {"line": line, "home": float(ah[i, k, 0]), "push": float(ah[i, k, 1]), "away": float(ah[i, k, 2])}
+                for k, line in enumerate(ASIAN_HANDICAP_LINES)
+            ],
+            "correct_scores": [
+                {"home_goals": int(c // size), "away_goals": int(c % size), "p": float(flat[i, c])}
+                for c in top[i]
+            ],
+        })
+    return out
+
+
+def live_outcomes(lh, la, remaining, home_score, away_score, max_goals: int, top_n: int = 5) -> list[dict]:
+    """
+    Mecz w trakcie: pozostałe gole ~ Poisson(lambda * remaining), wynik końcowy = obecny + pozostałe.
+    Wszystkie mecze jedną siatką (m, G, G); H/D/A z maski różnicy goli przesuniętej o obecny wynik.
+    """
+    remaining = np.asarray(remaining, dtype=float)
+    rl_h = np.asarray(lh, dtype=float) * remaining
+    rl_a = np.asarray(la, dtype=float) * remaining
+    grids = score_grids(rl_h, rl_a, max_goals)
+    m, size, _ = grids.shape
+
+    hs = np.asarray(home_score, dtype=int)
+    as_ = np.asarray(away_score, dtype=int)
+    g = np.arange(size)
+    final_diff = (g[:, None] - g[None, :])[None, :, :] + (hs - as_)[:, None, None]
+    p_home = (grids * (final_diff > 0)).sum(axis=(1, 2))
+    p_draw = (grids * (final_diff == 0)).sum(axis=(1, 2))
+    p_away = (grids * (final_diff < 0)).sum(axis=(1, 2))
+
+    flat = grids.reshape(m, -1)
+    top = _top_cells(flat, top_n)
+
+    return [
+        {
+            "remaining_lambda_home": float(rl_h[i]),
+            "remaining_lambda_away": float(rl_a[i]),
+            "p_home": float(p_home[i]),
+            "p_draw": float(p_draw[i]),
+            "p_away": float(p_away[i]),
+            "correct_scores": [
+                {"home_goals": int(hs[i] + c // size), "away_goals": int(as_[i] + c % size), "p": float(flat[i, c])}
+                for c in top[i]
+            ],
+        }
+        for i in range(m)
+    ]
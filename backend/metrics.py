@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import threading
+import time
+from bisect import bisect_left
+
+import db
+
+# granice kubełków histogramów (Prometheus: le = "mniejsze lub równe")
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+TRAINING_MATCHES_BUCKETS = (0, 10, 50, 100, 250, 500, 1000, 2000, 5000)
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # ostatni = +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, v: float) -> None:
+        self.counts[bisect_left(self.bounds, v)] += 1
+        self.sum += v
+        self.count += 1
+
+
+class RouteStats:
+    __slots__ = ("requests", "latency", "sql_statements", "sql_rows")
+
+    def __init__(self):
+        self.requests: dict[tuple[str, int], int] = {}  # (method, status) -> count
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.sql_statements = 0
+        self.sql_rows = 0
+
+
+def _label(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt(v) -> str:
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Metrics:
+    """
+    Liczniki i histogramy w pamięci procesu, renderowane w formacie tekstowym
+    Prometheusa. Na request: jeden wpis do ContextVar i kilka inkrementacji.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.routes: dict[str, RouteStats] = {}
+        self.training_matches = Histogram(TRAINING_MATCHES_BUCKETS)
+
+    def start_request(self):
+        stats = [0, 0]  # [statements, rows] - uzupełniane przez db._connect
+        token = db.sql_stats.set(stats)
+        return time.perf_counter(), stats, token
+
+    def end_request(self, started, route: str, method: str, status: int) -> None:
+        t0, stats, token = started
+        elapsed = time.perf_counter() - t0
+        db.sql_stats.reset(token)
+
+        with self._lock:
+            rs = self.routes.get(route)
+            if rs is None:
+                rs = self.routes[route] = RouteStats()
+            key = (method, status)
+            rs.requests[key] = rs.requests.get(key, 0) + 1
+            rs.latency.observe(elapsed)
+            rs.sql_statements += stats[0]
+            rs.sql_rows += stats[1]
+
+    def observe_training_matches(self, n: int) -> None:
+        with self._lock:
+            self.training_matches.observe(n)
+
+    def render(self, flights=(), gates=(), imports=(), predlog: dict | None = None, cache: dict | None = None) -> str:
+        out: list[str] = []
+
+        def header(name: str, kind: str, help_text: str):
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+
+        def histogram(name: str, h: Histogram, labels: str = ""):
+            sep = "," if labels else ""
+            cumulative = 0
+            for bound, c in zip(h.bounds, h.counts):
+                cumulative += c
+                out.append(f'{name}_bucket{{{labels}{sep}le="{_fmt(bound)}"}} {cumulative}')
+            out.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {h.count}')
+            lbl = f"{{{labels}}}" if labels else ""
+            out.append(f"{name}_sum{lbl} {_fmt(h.sum)}")
+            out.append(f"{name}_count{lbl} {h.count}")
+
+        with self._lock:
+            routes = sorted(self.routes.items())
+
+            header("http_requests_total", "counter", "HTTP requests by route, method and status.")
+            for route, rs in routes:
+                for (method, status), n in sorted(rs.requests.items()):
+                    out.append(
+                        f'http_requests_total{{route="{_label(route)}",method="{method}",status="{status}"}} {n}'
+                    )
+
+            header("http_request_duration_seconds", "histogram", "Request latency by route.")
+            for route, rs in routes:
+                histogram("http_request_duration_seconds", rs.latency, f'route="{_label(route)}"')
+
+            header("sql_statements_total", "counter", "SQL statements executed by route.")
+            for route, rs in routes:
+                out.append(f'sql_statements_total{{route="{_label(route)}"}} {rs.sql_statements}')
+
+            header("sql_rows_fetched_total", "counter", "Rows fetched from SQLite by route.")
+            for route, rs in routes:
+                out.append(f'sql_rows_fetched_total{{route="{_label(route)}"}} {rs.sql_rows}')
+
+            header("predict_training_matches_used", "histogram", "training_matches_used of /predict responses.")
+            histogram("predict_training_matches_used", self.training_matches)
+
+        header("db_connections_opened_total", "counter", "SQLite connections opened by this process.")
+        out.append(f"db_connections_opened_total {db.connections_opened}")
+
+        if flights:
+            header("singleflight_executed_total", "counter", "Computations actually run.")
+            for f in flights:
+                out.append(f'singleflight_executed_total{{flight="{f.name}"}} {f.executed}')
+            header("singleflight_coalesced_total", "counter", "Requests served by another request's computation.")
+            for f in flights:
+                out.append(f'singleflight_coalesced_total{{flight="{f.name}"}} {f.coalesced}')
+
+        if gates:
+            header("admission_requests_total", "counter", "Admission decisions by gate and outcome.")
+            for g in gates:
+                st = g.stats()
+                for outcome in ("admitted", "rejected", "queue_timeouts", "query_timeouts"):
+                    out.append(f'admission_requests_total{{gate="{g.name}",outcome="{outcome}"}} {st[outcome]}')
+
+        if imports:
+            header("import_last_timestamp_seconds", "gauge", "Unix time of the last finished import.")
+            for source, finished_at, _rows, _secs in imports:
+                out.append(f'import_last_timestamp_seconds{{source="{_label(source)}"}} {_fmt(float(finished_at))}')
+            header("import_last_rows", "gauge", "Rows written by the last import.")
+            for source, _finished_at, rows, _secs in imports:
+                out.append(f'import_last_rows{{source="{_label(source)}"}} {rows}')
+            header("import_last_rows_per_second", "gauge", "Throughput of the last import.")
+            for source, _finished_at, rows, secs in imports:
+                out.append(f'import_last_rows_per_second{{source="{_label(source)}"}} {_fmt(rows / max(secs, 1e-9))}')
+
+        if predlog is not None:
+            header("prediction_log_records_total", "counter", "Prediction log records by outcome.")
+            for outcome in ("enqueued", "dropped", "written", "write_errors"):
+                out.append(f'prediction_log_records_total{{outcome="{outcome}"}} {predlog[outcome]}')
+            header("prediction_log_batches_total", "counter", "Prediction log batches written.")
+            out.append(f"prediction_log_batches_total {predlog['batches']}")
+            header("prediction_log_queue_depth", "gauge", "Records waiting to be written.")
+            out.append(f"prediction_log_queue_depth {predlog['queue_depth']}")
+
+        if cache is not None:
+            backend = cache["backend"]
+            header("result_cache_requests_total", "counter", "Result cache lookups by namespace and outcome.")
+            for (namespace, outcome), n in sorted(cache["requests"].items()):
+                out.append(
+                    f'result_cache_requests_total{{backend="{backend}",namespace="{_label(namespace)}",outcome="{outcome}"}} {n}'
+                )
+            header("result_cache_evictions_total", "counter", "Entries evicted by this process.")
+            out.append(f'result_cache_evictions_total{{backend="{backend}"}} {cache["evictions"]}')
+            header("result_cache_errors_total", "counter", "Cache backend errors (served as misses).")
+            out.append(f'result_cache_errors_total{{backend="{backend}"}} {cache["errors"]}')
+            header("result_cache_entries", "gauge", "Entries in the cache.")
+            out.append(f'result_cache_entries{{backend="{backend}"}} {cache["entries"]}')
+            header("result_cache_bytes", "gauge", "Bytes stored in the cache.")
+            out.append(f'result_cache_bytes{{backend="{backend}"}} {cache["bytes"]}')
+
+        out.append("")
+        return "\n".join(out)
@@ -0,0 +1,436 @@
+from __future__ import annotations
+
+import json
+import math
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+
+# model Poissona, jego parametry i wektorowe agregaty okien historii; bez importu db, więc mogą go
+# używać app.py, jobs.py (procesy workerów bez Flaska) i moduły importowane przez db.py (fixtures.py)
+
+# najlepsze parametry modelu per liga (zapisuje tune.py, czyta app.py, jobs.py i fixtures.py)
+MODEL_CONFIG_PATH = Path(__file__).resolve().parent.parent / "data" / "model_config.json"
+
+MAX_GOALS = 10
+
+# domyślne parametry modelu (nadpisywane per liga przez data/model_config.json)
+DEFAULT_SHRINKAGE_K = 6.0
+DEFAULT_LAMBDA_MIN = 0.2
+DEFAULT_LAMBDA_MAX = 4.5
+DEFAULT_HISTORY = ("last_n", 10)
+
+
+def safe_float(x, default=0.0):
+    try:
+        if x is None:
+            return default
+        return float(x)
+    except Exception:
+        return default
+
+
+def poisson_pmf(k: int, lam: float) -> float:
+    if lam <= 0:
+        return 1.0 if k == 0 else 0.0
+    return math.exp(-lam) * (lam ** k) / math.factorial(k)
+
+
+def score_matrix(lh: float, la: float, max_goals: int = MAX_GOALS):
+    ph = [poisson_pmf(i, lh) for i in range(max_goals + 1)]
+    pa = [poisson_pmf(j, la) for j in range(max_goals + 1)]
+    return [[ph[i] * pa[j] for j in range(max_goals + 1)] for i in range(max_goals + 1)]
+
+
+def outcome_probs(mat):
+    p_home = 0.0
+    p_draw = 0.0
+    p_away = 0.0
+    best = (0, 0, -1.0)  # (hg, ag, p)
+
+    n = len(mat) - 1
+    for hg in range(n + 1):
+        for ag in range(n + 1):
+            p = mat[hg][ag]
+            if p > best[2]:
+                best = (hg, ag, p)
+            if hg > ag:
+                p_home += p
+            elif hg == ag:
+                p_draw += p
+            else:
+                p_away += p
+
+    return p_home, p_draw, p_away, {"home_goals": best[0], "away_goals": best[1], "p": best[2]}
+
+
+def matches_for_predict_query(
+    league: str,
+    season: str | None,
+    cutoff_date: str | None,
+    history_mode: str = "last_n",
+    history_value: int = 2000,
+) -> tuple[str, tuple]:
+    """
+    (sql, params) historii do modelu; wiersze w kolejności
+    (match_date, home_team, away_team, home_goals, away_goals).
+    history_mode="all": cała historia sprzed cutoff bez limitu (exp_decay z surowych meczów).
+    """
+    where = [
+        "league = ?",
+        "home_goals IS NOT NULL",
+        "away_goals IS NOT NULL",
+    ]
+    params: list[object] = [league]
+
+    if season:
+        where.append("season = ?")
+        params.append(season)
+
+    # cutoff: używamy TYLKO meczów sprzed daty meczu
+    if cutoff_date:
+        where.append("match_date < ?")
+        params.append(cutoff_date)
+
+        if history_mode == "last_days":
+            # SQLite: date(?, '-180 day') daje datę -180 dni
+            where.append("match_date >= date(?, ?)")
+            params.append(cutoff_date)
+            params.append(f"-{int(history_value)} day")
+
+    where_sql = " AND ".join(where)
+
+    # last_days: LIMIT można dać duży, bo i tak tnie po dacie; SQLite: LIMIT -1 = bez limitu
+    limit = int(history_value) if history_mode == "last_n" else -1 if history_mode == "all" else 5000
+
+    sql = f"""
+        SELECT match_date, home_team, away_team, home_goals, away_goals
+        FROM football_matches
+        WHERE {where_sql}
+        ORDER BY match_date DESC, id DESC
+        LIMIT ?;
+    """
+    return sql, tuple(params + [limit])
+
+
+def fetch_matches_for_predict(
+    conn,
+    league: str,
+    season: str | None,
+    cutoff_date: str | None,
+    history_mode: str = "last_n",
+    history_value: int = 2000,
+) -> list[tuple]:
+    cur = conn.cursor()
+    cur.row_factory = None  # zwykłe krotki, jak db.iter_rows()
+    try:
+        return cur.execute(*matches_for_predict_query(league, season, cutoff_date, history_mode, history_value)).fetchall()
+    finally:
+        cur.close()
+
+
+def aggregate_matches(rows) -> tuple[float, float, int, dict[str, dict]]:
+    """
+    Sumy ligi i hs/hc/hn/as/ac/an per drużyna w jednym przejściu po krotkach
+    (match_date, home_team, away_team, home_goals, away_goals) - także prosto z kursora.
+    """
+    total_hg = 0.0
+    total_ag = 0.0
+    n = 0
+
+    team_stats: dict[str, dict] = {}
+
+    for _match_date, h, a, hg, ag in rows:
+        hg = safe_float(hg)
+        ag = safe_float(ag)
+
+        total_hg += hg
+        total_ag += ag
+        n += 1
+
+        sh = team_stats.get(h)
+        if sh is None:
+            sh = team_stats[h] = {
+                "hs": 0.0, "hc": 0.0, "hn": 0,  # home scored/conceded/count
+                "as": 0.0, "ac": 0.0, "an": 0,  # away scored/conceded/count
+            }
+        sa = team_stats.get(a)
+        if sa is None:
+            sa = team_stats[a] = {"hs": 0.0, "hc": 0.0, "hn": 0, "as": 0.0, "ac": 0.0, "an": 0}
+
+        sh["hs"] += hg
+        sh["hc"] += ag
+        sh["hn"] += 1
+
+        sa["as"] += ag
+        sa["ac"] += hg
+        sa["an"] += 1
+
+    return total_hg, total_ag, n, team_stats
+
+
+def compute_lambdas_poisson(
+    rows,
+    home_team: str,
+    away_team: str,
+    k: float = DEFAULT_SHRINKAGE_K,
+    lambda_min: float = DEFAULT_LAMBDA_MIN,
+    lambda_max: float = DEFAULT_LAMBDA_MAX,
+):
+    total_hg, total_ag, n, team_stats = aggregate_matches(rows)
+    return lambdas_from_aggregates(total_hg, total_ag, n, team_stats, home_team, away_team, k, lambda_min, lambda_max)
+
+
+def lambdas_from_aggregates(
+    total_hg: float,
+    total_ag: float,
+    n: float,
+    team_stats: dict[str, dict],
+    home_team: str,
+    away_team: str,
+    k: float = DEFAULT_SHRINKAGE_K,
+    lambda_min: float = DEFAULT_LAMBDA_MIN,
+    lambda_max: float = DEFAULT_LAMBDA_MAX,
+):
+    """
+    Lambdy z gotowych agregatów (sumy ligi + hs/hc/hn/as/ac/an per drużyna).
+    n i liczniki mogą być ważone (exp_decay), wzór jest ten sam.
+    """
+    if n <= 0:
+        return 1.2, 1.0
+
+    avg_lg_home = total_hg / n
+    avg_lg_away = total_ag / n
+
+    # shrinkage (żeby nie wariowało przy małej próbce)
+    K = k
+
+    def home_attack(t: str) -> float:
+        s = team_stats.get(t)
+        if not s or s["hn"] == 0:
+            return 1.0
+        rate = (s["hs"] + K * avg_lg_home) / (s["hn"] + K)
+        return rate / max(avg_lg_home, 0.01)
+
+    def home_defense_ratio(t: str) -> float:
+        s = team_stats.get(t)
+        if not s or s["hn"] == 0:
+            return 1.0
+        rate = (s["hc"] + K * avg_lg_away) / (s["hn"] + K)  # conceded at home
+        return rate / max(avg_lg_away, 0.01)
+
+    def away_attack(t: str) -> float:
+        s = team_stats.get(t)
+        if not s or s["an"] == 0:
+            return 1.0
+        rate = (s["as"] + K * avg_lg_away) / (s["an"] + K)
+        return rate / max(avg_lg_away, 0.01)
+
+    def away_defense_ratio(t: str) -> float:
+        s = team_stats.get(t)
+        if not s or s["an"] == 0:
+            return 1.0
+        rate = (s["ac"] + K * avg_lg_home) / (s["an"] + K)  # conceded away
+        return rate / max(avg_lg_home, 0.01)
+
+    lh = avg_lg_home * home_attack(home_team) * away_defense_ratio(away_team)
+    la = avg_lg_away * away_attack(away_team) * home_defense_ratio(home_team)
+
+    lh = max(lambda_min, min(lh, lambda_max))
+    la = max(lambda_min, min(la, lambda_max))
+    return lh, la
+
+
+# (mtime, leagues) podmieniane jednym przypisaniem - wątki żądań nie zobaczą pary z dwóch wersji pliku
+_model_config_cache: dict = {"entry": (None, {})}
+
+
+def model_config(league: str) -> dict:
+    """
+    Parametry modelu dla ligi: z data/model_config.json (zapisuje write_config), a bez wpisu - domyślne.
+    Plik jest przeładowywany, gdy zmieni się jego mtime.
+    """
+    try:
+        mtime = MODEL_CONFIG_PATH.stat().st_mtime
+    except OSError:
+        mtime = None
+
+    cached_mtime, leagues = _model_config_cache["entry"]
+    if mtime != cached_mtime:
+        leagues = {}
+        if mtime is not None:
+            try:
+                with open(MODEL_CONFIG_PATH, encoding="utf-8") as f:
+                    leagues = json.load(f).get("leagues", {})
+            except (OSError, ValueError):
+                leagues = {}
+        _model_config_cache["entry"] = (mtime, leagues)
+
+    cfg = leagues.get(league)
+    if not cfg:
+        return {
+            "k": DEFAULT_SHRINKAGE_K,
+            "lambda_min": DEFAULT_LAMBDA_MIN,
+            "lambda_max": DEFAULT_LAMBDA_MAX,
+            "history_mode": None,
+            "history_value": None,
+            "source": "default",
+        }
+    return {
+        "k": float(cfg["k"]),
+        "lambda_min": float(cfg["lambda_min"]),
+        "lambda_max": float(cfg["lambda_max"]),
+        "history_mode": cfg.get("history_mode"),
+        "history_value": cfg.get("history_value"),
+        "source": "tuned",
+    }
+
+
+def default_history(league: str) -> tuple[str, int]:
+    """Okno historii bez jawnego history_mode/history_value: dostrojone dla ligi, a bez wpisu - DEFAULT_HISTORY."""
+    cfg = model_config(league)
+    return cfg["history_mode"] or DEFAULT_HISTORY[0], cfg["history_value"] or DEFAULT_HISTORY[1]
+
+
+def league_arrays(conn, league: str, extra_teams=()) -> dict:
+    """
+    Rozegrane mecze ligi chronologicznie jako tablice numpy (połączenie wołającego).
+    extra_teams: drużyny bez meczów w historii, które też dostają indeks (np. z terminarza).
+    """
+    cur = conn.cursor()
+    cur.row_factory = None
+    rows = cur.execute(
+        """
+        SELECT match_date, home_team, away_team, home_goals, away_goals, season
+        FROM football_matches
+        WHERE league = ? AND home_goals IS NOT NULL AND away_goals IS NOT NULL
+        ORDER BY match_date ASC, id ASC;
+        """,
+        (league,),
+    ).fetchall()
+
+    teams = sorted({r[1] for r in rows} | {r[2] for r in rows} | set(extra_teams))
+    idx = {t: i for i, t in enumerate(teams)}
+    return {
+        "league": league,
+        "teams": teams,
+        "n_teams": len(teams),
+        "days": np.array([date.fromisoformat(r[0]).toordinal() for r in rows], dtype=np.int64),
+        "home": np.array([idx[r[1]] for r in rows], dtype=np.int64),
+        "away": np.array([idx[r[2]] for r in rows], dtype=np.int64),
+        "hg": np.array([r[3] for r in rows], dtype=float),
+        "ag": np.array([r[4] for r in rows], dtype=float),
+        "season": np.array([r[5] or "" for r in rows], dtype=object),
+    }
+
+
+def _contributions(data: dict) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Wkład każdego meczu: liga (n, 3) = [hg, ag, 1] oraz drużyny (n, n_teams, 6)
+    w układzie [hs, hc, hn, as, ac, an] jak w compute_lambdas_poisson.
+    """
+    n, n_teams = len(data["days"]), data["n_teams"]
+    rng = np.arange(n)
+    league = np.stack([data["hg"], data["ag"], np.ones(n)], axis=1)
+    team = np.zeros((n, n_teams, 6))
+    team[rng, data["home"], 0] = data["hg"]
+    team[rng, data["home"], 1] = data["ag"]
+    team[rng, data["home"], 2] = 1.0
+    team[rng, data["away"], 3] = data["ag"]
+    team[rng, data["away"], 4] = data["hg"]
+    team[rng, data["away"], 5] = 1.0
+    return league, team
+
+
+def window_aggregates(data: dict, mode: str, value: int, eval_idx: np.ndarray):
+    """
+    Agregaty historii (tylko mecze sprzed daty meczu) dla każdego ocenianego meczu:
+    liga (m, 3) oraz drużyna gospodarzy / gości (m, 6).
+    """
+    return window_aggregates_at(data, mode, value, data["days"][eval_idx], data["home"][eval_idx],
+                                data["away"][eval_idx])
+
+
+def window_aggregates_at(data: dict, mode: str, value: int, eval_days: np.ndarray,
+                         home: np.ndarray, away: np.ndarray):
+    """Jak window_aggregates(), ale dla dowolnych meczów (dzień porządkowy, indeksy drużyn z data["teams"])."""
+    days = data["days"]
+    m = len(eval_days)
+    if len(days) == 0:
+        return np.zeros((m, 3)), np.zeros((m, 6)), np.zeros((m, 6))
+    league_c, team_c = _contributions(data)
+    end = np.searchsorted(days, eval_days, side="left")  # pierwszy mecz z datą >= daty meczu
+
+    if mode in ("last_n", "last_days"):
+        # sumy prefiksowe: okno [start, end) = P[end] - P[start]
+        p_league = np.concatenate([np.zeros((1, 3)), np.cumsum(league_c, axis=0)])
+        p_team = np.concatenate([np.zeros((1,) + team_c.shape[1:]), np.cumsum(team_c, axis=0)])
+        if mode == "last_n":
+            start = np.maximum(end - value, 0)
+        else:
+            start = np.searchsorted(days, eval_days - value, side="left")
+        lg = p_league[end] - p_league[start]
+        th = p_team[end, home] - p_team[start, home]
+        ta = p_team[end, away] - p_team[start, away]
+        return lg, th, ta
+
+    # exp_decay: stan po każdym meczu wygaszony na jego datę, potem do daty ocenianego meczu
+    n = len(days)
+    s_league = np.zeros((n + 1, 3))
+    s_team = np.zeros((n + 1,) + team_c.shape[1:])
+    for i in range(n):
+        f = 2.0 ** (-(days[i] - days[i - 1]) / value) if i > 0 else 1.0
+        s_league[i + 1] = s_league[i] * f + league_c[i]
+        s_team[i + 1] = s_team[i] * f + team_c[i]
+
+    last_day = np.where(end > 0, days[np.maximum(end - 1, 0)], eval_days)
+    f = (2.0 ** (-(eval_days - last_day) / value))[:, None]
+    lg = s_league[end] * f
+    th = s_team[end, home] * f
+    ta = s_team[end, away] * f
+    return lg, th, ta
+
+
+def pair_contributions(rows: list[tuple], home_team: str, away_team: str) -> np.ndarray:
+    """
+    Wkład meczów (n, 15) dla jednej pary: liga [hg, ag, 1], potem gospodarz i gość
+    w układzie [hs, hc, hn, as, ac, an]; sumy wierszy idą prosto do lambdas_vectorized().
+    rows: (match_date, home_team, away_team, home_goals, away_goals).
+    """
+    _dates, homes, aways, home_goals, away_goals = zip(*rows)
+    hg = np.array(home_goals, dtype=float)
+    ag = np.array(away_goals, dtype=float)
+    homes = np.array(homes, dtype=object)
+    aways = np.array(aways, dtype=object)
+    is_home_h = (homes == home_team).astype(float)
+    is_away_h = (aways == home_team).astype(float)
+    is_home_a = (homes == away_team).astype(float)
+    is_away_a = (aways == away_team).astype(float)
+    return np.stack([
+        hg, ag, np.ones(len(rows)),
+        hg * is_home_h, ag * is_home_h, is_home_h, ag * is_away_h, hg * is_away_h, is_away_h,
+        hg * is_home_a, ag * is_home_a, is_home_a, ag * is_away_a, hg * is_away_a, is_away_a,
+    ], axis=1)
+
+
+def lambdas_vectorized(lg, th, ta, k: float, lambda_min: float, lambda_max: float):
+    """Wektorowa wersja lambdas_from_aggregates() (ten sam wzór)."""
+    n = lg[:, 2]
+    safe_n = np.where(n > 0, n, 1.0)
+    avg_h = lg[:, 0] / safe_n
+    avg_a = lg[:, 1] / safe_n
+    den_h = np.maximum(avg_h, 0.01)
+    den_a = np.maximum(avg_a, 0.01)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        home_attack = np.where(th[:, 2] == 0, 1.0, (th[:, 0] + k * avg_h) / (th[:, 2] + k) / den_h)
+        home_def = np.where(th[:, 2] == 0, 1.0, (th[:, 1] + k * avg_a) / (th[:, 2] + k) / den_a)
+        away_attack = np.where(ta[:, 5] == 0, 1.0, (ta[:, 3] + k * avg_a) / (ta[:, 5] + k) / den_a)
+        away_def = np.where(ta[:, 5] == 0, 1.0, (ta[:, 4] + k * avg_h) / (ta[:, 5] + k) / den_h)
+
+    lh = np.clip(avg_h * home_attack * away_def, lambda_min, lambda_max)
+    la = np.clip(avg_a * away_attack * home_def, lambda_min, lambda_max)
+    lh = np.where(n > 0, lh, 1.2)
+    la = np.where(n > 0, la, 1.0)
+    return lh, la
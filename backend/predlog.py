@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import db
+
+# osobny plik: zapisy logu nie biorą blokady zapisu sports.db (importy, /matches/bulk)
+PREDICTIONS_DB_PATH = Path(os.getenv("PREDICTIONS_DB_PATH", db.BASE_DIR / "data" / "predictions.db"))
+
+# limit pamięci: po zapełnieniu kolejki nowe wpisy są odrzucane (liczone w dropped), request nie czeka
+PREDLOG_MAX_QUEUE = int(os.getenv("PREDLOG_MAX_QUEUE", "10000"))
+PREDLOG_BATCH_SIZE = 500
+PREDLOG_FLUSH_INTERVAL_S = 1.0
+
+PREDLOG_COLUMNS = (
+    "logged_at", "route", "league", "season", "home_team", "away_team", "match_date",
+    "history_mode", "history_value", "model", "training_matches_used",
+    "lambda_home", "lambda_away", "p_home", "p_draw", "p_away",
+)
+
+INSERT_PREDICTION_SQL = f"""
+    INSERT INTO predictions ({", ".join(PREDLOG_COLUMNS)})
+    VALUES ({", ".join("?" for _ in PREDLOG_COLUMNS)});
+"""
+
+
+def _predlog_connect(path: Path | str = PREDICTIONS_DB_PATH):
+    conn = sqlite3.connect(path, timeout=10)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def init_predlog_db(path: Path | str = PREDICTIONS_DB_PATH):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    conn = _predlog_connect(path)
+    with conn:
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS predictions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                logged_at REAL NOT NULL,
+                route TEXT NOT NULL,
+                league TEXT NOT NULL,
+                season TEXT,
+                home_team TEXT NOT NULL,
+                away_team TEXT NOT NULL,
+                match_date TEXT,
+                history_mode TEXT NOT NULL,
+                history_value INTEGER NOT NULL,
+                model TEXT NOT NULL,
+                training_matches_used INTEGER NOT NULL,
+                lambda_home REAL NOT NULL,
+                lambda_away REAL NOT NULL,
+                p_home REAL NOT NULL,
+                p_draw REAL NOT NULL,
+                p_away REAL NOT NULL
+            );
+        """)
+        conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_predictions_league_date
+            ON predictions (league, match_date);
+        """)
+    conn.close()
+
+
+def prediction_record(payload: dict, route: str) -> tuple:
+    """Wiersz logu z odpowiedzi /predict (po attach_markets)."""
+    return (
+        time.time(),
+        route,
+        payload["league"],
+        payload["season"],
+        payload["home_team"],
+        payload["away_team"],
+        payload["cutoff_match_date"],
+        payload["history"]["mode"],
+        payload["history"]["value"],
+        json.dumps(payload["model"], sort_keys=True),
+        payload["training_matches_used"],
+        payload["lambda_home"],
+        payload["lambda_away"],
+        payload["p_home"],
+        payload["p_draw"],
+        payload["p_away"],
+    )
+
+
+class PredictionLog:
+    """
+    Write-behind log wydanych predykcji: request tylko wrzuca krotkę do ograniczonej kolejki,
+    wątek w tle zapisuje paczki (do PREDLOG_BATCH_SIZE albo co PREDLOG_FLUSH_INTERVAL_S)
+    jedną transakcją do data/predictions.db. Pełna kolejka -> wpis odrzucony, nie blokujemy.
+    """
+
+    def __init__(self, path: Path | str = PREDICTIONS_DB_PATH, max_queue: int = PREDLOG_MAX_QUEUE):
+        self.path = str(path)
+        self._queue: queue.Queue[tuple | None] = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self.write_errors = 0
+
+        init_predlog_db(self.path)
+        self._thread = threading.Thread(target=self._run, name="prediction-log", daemon=True)
+        self._thread.start()
+
+    def log(self, record: tuple) -> bool:
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.enqueued += 1
+        return True
+
+    def _run(self):
+        conn = _predlog_connect(self.path)
+        conn.execute("PRAGMA synchronous=NORMAL;")
+        try:
+            while True:
+                first = self._queue.get()
+                if first is None:
+                    return
+                batch = [first]
+                deadline = time.monotonic() + PREDLOG_FLUSH_INTERVAL_S
+                stop = False
+                while len(batch) < PREDLOG_BATCH_SIZE:
+                    try:
+                        item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stop = True
+                        break
+                    batch.append(item)
+                self._write(conn, batch)
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    def _write(self, conn, batch: list[tuple]):
+        try:
+            with conn:
+                conn.executemany(INSERT_PREDICTION_SQL, batch)
+        except sqlite3.Error:
+            # log jest pomocniczy: błąd zapisu nie może zatrzymać wątku
+            with self._lock:
+                self.write_errors += len(batch)
+            return
+        with self._lock:
+            self.written += len(batch)
+            self.batches += 1
+
+    def close(self, timeout: float = 5.0):
+        """Dopisuje to, co zostało w kolejce, i zatrzymuje wątek (atexit)."""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enqueued": self.enqueued,
+                "dropped": self.dropped,
+                "written": self.written,
+                "batches": self.batches,
+                "write_errors": self.write_errors,
+                "queue_depth": self._queue.qsize(),
+            }
+
+    def fetch(self, league: str | None, date_from: str | None, date_to: str | None, limit: int) -> list[tuple]:
+        """Zalogowane predykcje z datą meczu (tylko takie da się rozliczyć), najnowsze mecze najpierw."""
+        where = ["match_date IS NOT NULL"]
+        params: list[object] = []
+        if league:
+            where.append("league = ?")
+            params.append(league)
+        if date_from:
+            where.append("match_date >= ?")
+            params.append(date_from)
+        if date_to:
+            where.append("match_date <= ?")
+            params.append(date_to)
+
+        conn = _predlog_connect(self.path)
+        try:
+            cur = conn.execute(
+                f"""
+                SELECT id, logged_at, route, league, season, home_team, away_team, match_date,
+                       history_mode, history_value, lambda_home, lambda_away, p_home, p_draw, p_away
+                FROM predictions
+                WHERE {" AND ".join(where)}
+                ORDER BY match_date DESC, id DESC
+                LIMIT ?;
+                """,
+                tuple(params + [limit]),
+            )
+            return [tuple(r) for r in cur.fetchall()]
+        finally:
+            conn.close()
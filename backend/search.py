@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import re
+import unicodedata
+
+# najdłuższy indeksowany prefiks tokenu; dłuższe zapytania dopasowujemy po tym prefiksie
+MAX_PREFIX = 16
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def normalize(text: str) -> str:
+    """Małe litery bez akcentów i interpunkcji: "Borussia Mönchengladbach" -> "borussia monchengladbach"."""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _NON_ALNUM.sub(" ", stripped.replace("ß", "ss")).strip()
+
+
+def tokens(text: str) -> list[str]:
+    return normalize(text).split()
+
+
+class TeamSearchIndex:
+    """
+    Indeks prefiksów tokenów nazw drużyn: nazwy z bazy, etykiety TEAM_DISPLAY i ich aliasy.
+    Każdy prefiks tokenu -> krotka id drużyn (id nadane w kolejności etykiet), więc zapytanie
+    to kilka odczytów słownika i przecięcie małych zbiorów, bez skanu listy drużyn.
+    """
+
+    def __init__(self, memberships: list[tuple[str, str, str]], display: dict[str, str]):
+        """memberships: (league, season, team) z catalog_teams; display: TEAM_DISPLAY (alias -> etykieta)."""
+        leagues: dict[str, dict[str, list[str]]] = {}
+        for league, season, team in memberships:
+            leagues.setdefault(team, {}).setdefault(league, []).append(season)
+
+        aliases_by_label: dict[str, set[str]] = {}
+        for alias, label in display.items():
+            aliases_by_label.setdefault(label, set()).add(alias.strip())
+
+        teams = sorted(leagues, key=lambda t: (normalize(display.get(t, t)), t))
+        self.items: list[dict] = []
+        self.names: list[list[str]] = []  # znormalizowane nazwy do rankingu
+        prefixes: dict[str, list[int]] = {}
+
+        for i, team in enumerate(teams):
+            label = display.get(team, team)
+            names = [team, label, *sorted(aliases_by_label.get(label, set()) - {team, label})]
+            self.items.append({
+                "team": team,
+                "label": label,
+                "aliases": names[2:],
+                "leagues": {lg: sorted(seasons) for lg, seasons in sorted(leagues[team].items())},
+            })
+            self.names.append([normalize(n) for n in names])
+
+            seen: set[str] = set()
+            for name in names:
+                for tok in tokens(name):
+                    for k in range(1, min(len(tok), MAX_PREFIX) + 1):
+                        p = tok[:k]
+                        if p not in seen:
+                            seen.add(p)
+                            prefixes.setdefault(p, []).append(i)
+
+        self._prefixes: dict[str, tuple[int, ...]] = {p: tuple(ids) for p, ids in prefixes.items()}
+        self._sets: dict[str, frozenset[int]] = {}  # prefiks z _prefixes -> zbiór id (leniwie)
+
+    def _ids(self, tok: str) -> tuple[int, ...]:
+        return self._prefixes.get(tok[:MAX_PREFIX], ())
+
+    def _set(self, tok: str) -> frozenset[int]:
+        # klucz = indeksowany prefiks, i tylko istniejący: rozmiar ograniczony przez _prefixes,
+        # niezależnie od tego, ile różnych zapytań przyśle klient
+        key = tok[:MAX_PREFIX]
+        ids = self._prefixes.get(key)
+        if ids is None:
+            return frozenset()
+        s = self._sets.get(key)
+        if s is None:
+            s = self._sets[key] = frozenset(ids)
+        return s
+
+    def search(self, query: str, league: str | None = None, limit: int = 10) -> list[dict]:
+        """
+        Każdy token zapytania musi być prefiksem któregoś tokenu nazwy (AND).
+        Najpierw nazwy zaczynające się od całego zapytania, potem reszta w kolejności etykiet.
+        """
+        q_tokens = tokens(query)
+        if not q_tokens:
+            return []
+
+        q_tokens.sort(key=lambda t: len(self._ids(t)))
+        ids = self._ids(q_tokens[0])
+        if len(q_tokens) > 1:
+            others = [self._set(t) for t in q_tokens[1:]]
+            ids = tuple(i for i in ids if all(i in s for s in others))
+        if league:
+            ids = tuple(i for i in ids if league in self.items[i]["leagues"])
+
+        q = normalize(query)
+        starts = [i for i in ids if any(n.startswith(q) for n in self.names[i])]
+        if len(starts) < limit:
+            first = set(starts)
+            starts += [i for i in ids if i not in first][:limit - len(starts)]
+        return [self.items[i] for i in starts[:limit]]
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import threading
+from typing import Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    """
+    Łączenie identycznych, współbieżnych zapytań (single-flight).
+    Pierwsze wywołanie dla klucza liczy wynik, kolejne z tym samym kluczem
+    czekają na nie i dostają TEN SAM obiekt - wyniku nie wolno modyfikować.
+    Nic nie jest cache'owane: po zakończeniu obliczenia klucz znika.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _Call] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+                self.executed += 1
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result
+
+    def stats(self) -> dict:
+        with self._lock:
+            in_flight = len(self._calls)
+        return {
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "in_flight": in_flight,
+        }
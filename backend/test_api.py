@@ -0,0 +1,77 @@
+import sqlite3
+
+import pytest
+
+MATCH = {"league": "Serie A", "home_team": "Inter", "away_team": "Milan", "match_date": "2024-03-01"}
+
+
+@pytest.mark.parametrize("history_mode, values", [
+    ("last_n", [1, 5, 38, 200, 5000]),
+    ("last_days", [7, 90, 365, 3650]),
+])
+def test_sweep_matches_predict(client, history_mode, values):
+    r = client.post("/predict/sweep", json={**MATCH, "history_mode": history_mode, "values": values})
+    assert r.status_code == 200
+    windows = r.get_json()["windows"]
+    assert [w["history_value"] for w in windows] == values
+
+    for w in windows:
+        p = client.post("/predict", json={**MATCH, "history_mode": history_mode,
+                                          "history_value": w["history_value"]}).get_json()
+        assert w["training_matches_used"] == p["training_matches_used"]
+        for key in ("lambda_home", "lambda_away", "p_home", "p_draw", "p_away"):
+            assert w[key] == pytest.approx(p[key], rel=1e-12, abs=1e-15)
+
+
+def _bulk(client, matches, token="test-token"):
+    return client.post("/matches/bulk", json={"league": "Serie A", "season": "2099", "matches": matches},
+                       headers={"Authorization": f"Bearer {token}"})
+
+
+def test_bulk_rejects_bad_token(client, sports_db):
+    match = {"home_team": "Inter", "away_team": "Milan", "match_date": "2099-01-01"}
+    assert _bulk(client, [match], token="wrong").status_code == 401
+    r = client.post("/matches/bulk", json={"league": "Serie A", "matches": [match]})
+    assert r.status_code == 401
+    assert r.get_json()["error"] == "Unauthorized"
+
+    conn = sqlite3.connect(sports_db)
+    assert conn.execute("SELECT COUNT(*) FROM football_matches WHERE match_date = '2099-01-01';").fetchone() == (0,)
+    conn.close()
+
+
+def test_bulk_is_idempotent_on_natural_key(client, sports_db):
+    matches = [
+        {"home_team": "Inter", "away_team": "Milan", "match_date": "2099-01-01", "home_goals": 2, "away_goals": 1},
+        {"home_team": "Milan", "away_team": "Inter", "match_date": "01/02/2099"},
+    ]
+
+    def snapshot():
+        conn = sqlite3.connect(sports_db)
+        try:
+            return (
+                conn.execute(
+                    """
+                    SELECT id, league, season, home_team, away_team, match_date, home_goals, away_goals
+                    FROM football_matches ORDER BY id;
+                    """
+                ).fetchall(),
+                conn.execute("SELECT * FROM h2h_summary ORDER BY pair_key, league, season;").fetchall(),
+            )
+        finally:
+            conn.close()
+
+    r = _bulk(client, matches)
+    assert r.status_code == 200
+    assert r.get_json() == {"upserted": 2, "leagues": ["Serie A"]}
+    first = snapshot()
+
+    assert _bulk(client, matches).status_code == 200
+    assert snapshot() == first
+    assert len([m for m in first[0] if m[5].startswith("2099-")]) == 2
+
+    # ten sam klucz naturalny z nowym wynikiem aktualizuje wiersz zamiast dodawać drugi
+    assert _bulk(client, [{**matches[0], "home_goals": 0}]).status_code == 200
+    rows, _ = snapshot()
+    assert len(rows) == len(first[0])
+    assert [r[6:] for r in rows if r[5] == "2099-01-01"] == [(0, 1)]
@@ -0,0 +1,27 @@
+from cache import MemoryCache, SqliteCache
+
+
+def test_sqlite_cache_overwrite_keeps_size(tmp_path):
+    cache = SqliteCache(tmp_path / "cache.db", max_bytes=1024)
+    for i in range(5):
+        cache.set("predict:k", {"v": i}, 200)
+    entries, size = cache.size()
+    assert entries == 1
+    assert size == len(b'[{"v":4},200]')
+    assert cache.get("predict:k") == ({"v": 4}, 200)
+
+
+def test_sqlite_cache_overwrite_does_not_evict(tmp_path):
+    cache = SqliteCache(tmp_path / "cache.db", max_bytes=200)
+    cache.set("predict:a", {"v": "a"}, 200)
+    for i in range(50):
+        cache.set("predict:b", {"v": i}, 200)
+    assert cache.get("predict:a") == ({"v": "a"}, 200)
+    assert cache.evictions == 0
+
+
+def test_memory_cache_overwrite_keeps_size():
+    cache = MemoryCache(max_bytes=1024)
+    for i in range(5):
+        cache.set("predict:k", {"v": i}, 200)
+    assert cache.size() == (1, len(b'[{"v":4},200]'))
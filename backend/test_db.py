@@ -0,0 +1,89 @@
+import sqlite3
+
+import db
+
+
+def _h2h_recount(path) -> dict:
+    """h2h_summary policzone od zera w Pythonie z football_matches (tylko mecze z wynikiem)."""
+    conn = sqlite3.connect(path)
+    rows = conn.execute(
+        """
+        SELECT league, COALESCE(season, ''), home_team, away_team, home_goals, away_goals
+        FROM football_matches WHERE home_goals IS NOT NULL AND away_goals IS NOT NULL;
+        """
+    ).fetchall()
+    conn.close()
+
+    out: dict[tuple, list[int]] = {}
+    for league, season, h, a, hg, ag in rows:
+        team_a, team_b = sorted((h, a))
+        a_goals, b_goals = (hg, ag) if h == team_a else (ag, hg)
+        s = out.setdefault((db.pair_key(h, a), league, season), [0, 0, 0, 0, 0, 0])
+        s[0] += 1
+        s[1] += a_goals > b_goals
+        s[2] += a_goals == b_goals
+        s[3] += a_goals < b_goals
+        s[4] += a_goals
+        s[5] += b_goals
+    return {k: tuple(v) for k, v in out.items()}
+
+
+def _h2h_summary(path) -> dict:
+    conn = sqlite3.connect(path)
+    rows = conn.execute(
+        """
+        SELECT pair_key, league, season, played, team_a_wins, draws, team_b_wins, team_a_goals, team_b_goals
+        FROM h2h_summary WHERE played > 0;
+        """
+    ).fetchall()
+    conn.close()
+    return {r[:3]: tuple(r[3:]) for r in rows}
+
+
+def test_h2h_summary_matches_recount_after_writes(sports_db):
+    assert _h2h_summary(sports_db) == _h2h_recount(sports_db)
+
+    conn = sqlite3.connect(sports_db)
+    existing = conn.execute(
+        """
+        SELECT league, season, home_team, away_team, match_date, home_goals, away_goals
+        FROM football_matches WHERE home_goals IS NOT NULL ORDER BY id LIMIT 1;
+        """
+    ).fetchone()
+    conn.close()
+
+    # nowy mecz, zmiana wyniku istniejącego i mecz z terminarza, który dostaje wynik
+    db.upsert_matches([
+        ("Serie A", "2099", "Inter", "Milan", "2099-01-01", 2, 2),
+        existing[:5] + (existing[5] + 3, existing[6]),
+        ("Serie A", "2099", "Milan", "Inter", "2099-02-01", None, None),
+    ])
+    assert _h2h_summary(sports_db) == _h2h_recount(sports_db)
+
+    db.upsert_matches([("Serie A", "2099", "Milan", "Inter", "2099-02-01", 0, 1)])
+    assert _h2h_summary(sports_db) == _h2h_recount(sports_db)
+
+    conn = sqlite3.connect(sports_db)
+    with conn:
+        conn.execute("DELETE FROM football_matches WHERE match_date LIKE '2099-%';")
+        conn.execute(
+            "UPDATE football_matches SET home_goals = NULL, away_goals = NULL "
+            "WHERE league = ? AND home_team = ? AND away_team = ? AND match_date = ?;",
+            (existing[0], existing[2], existing[3], existing[4]),
+        )
+    conn.close()
+    assert _h2h_summary(sports_db) == _h2h_recount(sports_db)
+
+
+def test_upsert_matches_is_idempotent(sports_db):
+    row = ("Serie A", "2099", "Inter", "Milan", "2099-01-01", 1, 0)
+    db.upsert_matches([row])
+    db.upsert_matches([row, row])
+
+    conn = sqlite3.connect(sports_db)
+    matches = conn.execute(
+        "SELECT home_goals, away_goals, source FROM football_matches WHERE match_date = '2099-01-01';"
+    ).fetchall()
+    conn.close()
+    assert matches == [(1, 0, "bulk")]
+    assert _h2h_summary(sports_db) == _h2h_recount(sports_db)
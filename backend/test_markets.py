@@ -0,0 +1,24 @@
+import numpy as np
+
+from markets import derive_markets, score_grids
+from model import MAX_GOALS, outcome_probs, score_matrix
+
+
+def test_most_likely_score_matches_outcome_probs():
+    # siatka lambd z remisami pól (lh == la, wartości zaokrąglone)
+    values = np.round(np.arange(0.2, 4.51, 0.05), 2)
+    lh, la = (a.ravel() for a in np.meshgrid(values, values))
+    markets = derive_markets(score_grids(lh, la, MAX_GOALS))
+    for i in range(len(lh)):
+        p_home, p_draw, p_away, best = outcome_probs(score_matrix(float(lh[i]), float(la[i]), MAX_GOALS))
+        top = markets[i]["correct_scores"][0]
+        assert (top["home_goals"], top["away_goals"]) == (best["home_goals"], best["away_goals"])
+        assert np.isclose(top["p"], best["p"])
+        assert np.allclose([markets[i]["1x2"][k] for k in ("home", "draw", "away")], [p_home, p_draw, p_away])
+
+
+def test_correct_scores_sorted_descending():
+    markets = derive_markets(score_grids([1.4, 0.3], [1.1, 2.9], MAX_GOALS))
+    for mk in markets:
+        ps = [c["p"] for c in mk["correct_scores"]]
+        assert ps == sorted(ps, reverse=True)
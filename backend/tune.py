@@ -0,0 +1,146 @@
+"""
+Strojenie parametrów modelu Poissona (K, clamp lambd, okno historii) per liga.
+
+Walk-forward: każdy mecz przewidujemy tylko z meczów sprzed jego daty, jak /predict
+z match_date, i liczymy średni log loss 1X2. Agregaty okien liczymy raz na ustawienie
+historii (sumy prefiksowe / wygaszane stany), a siatkę K x clamp oceniamy wektorowo.
+Ustawienia historii liczą się równolegle na wszystkich rdzeniach.
+
+Użycie:
+    python tune.py                      # wszystkie ligi
+    python tune.py --league "Serie A"   # wybrane ligi
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+from db import get_connection, refresh_upcoming
+from markets import outcome_probs_batch, score_grids
+from model import MAX_GOALS, MODEL_CONFIG_PATH, lambdas_vectorized, league_arrays, window_aggregates
+
+GRID_K = (0.0, 2.0, 4.0, 6.0, 8.0, 12.0, 16.0, 24.0)
+GRID_LAMBDA_MIN = (0.1, 0.2, 0.3)
+GRID_LAMBDA_MAX = (3.5, 4.5, 6.0)
+GRID_HISTORY = (
+    [("last_n", v) for v in (50, 100, 200, 380, 760, 1140, 2000)]
+    + [("last_days", v) for v in (90, 180, 365, 730)]
+    + [("exp_decay", v) for v in (30, 60, 90, 180, 365)]
+)
+
+# mecze bez co najmniej tylu wcześniejszych meczów ligi nie są oceniane (dla każdego punktu siatki te same)
+MIN_HISTORY = 100
+
+
+def load_league(league: str) -> dict:
+    """Rozegrane mecze ligi jako tablice numpy (model.league_arrays) z własnego połączenia tylko do odczytu."""
+    conn = get_connection(league, read_only=True)
+    try:
+        return league_arrays(conn, league)
+    finally:
+        conn.close()
+
+
+def evaluate_history(data: dict, mode: str, value: int) -> list[dict]:
+    """Jedno ustawienie historii, cała siatka K x clamp na wspólnych agregatach."""
+    n = len(data["days"])
+    end_all = np.searchsorted(data["days"], data["days"], side="left")
+    eval_idx = np.nonzero(end_all >= MIN_HISTORY)[0]
+    if len(eval_idx) == 0:
+        return []
+
+    lg, th, ta = window_aggregates(data, mode, value, eval_idx)
+    hg, ag = data["hg"][eval_idx], data["ag"][eval_idx]
+    outcome = np.where(hg > ag, 0, np.where(hg == ag, 1, 2))
+
+    results = []
+    for k, lo, hi in itertools.product(GRID_K, GRID_LAMBDA_MIN, GRID_LAMBDA_MAX):
+        lh, la = lambdas_vectorized(lg, th, ta, k, lo, hi)
+        # te same siatki i maski 1X2 co /predict (markets.py)
+        probs = outcome_probs_batch(score_grids(lh, la, MAX_GOALS))
+        p_actual = probs[np.arange(len(eval_idx)), outcome]
+        results.append({
+            "k": k,
+            "lambda_min": lo,
+            "lambda_max": hi,
+            "history_mode": mode,
+            "history_value": value,
+            "log_loss": float(-np.log(np.maximum(p_actual, 1e-15)).mean()),
+            "accuracy": float((probs.argmax(axis=1) == outcome).mean()),
+            "matches_scored": int(len(eval_idx)),
+            "matches_total": int(n),
+        })
+    return results
+
+
+def tune(leagues: list[str], workers: int) -> dict:
+    datasets = {lg: load_league(lg) for lg in leagues}
+
+    best: dict[str, dict] = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(evaluate_history, datasets[lg], mode, value): lg
+            for lg in leagues
+            for mode, value in GRID_HISTORY
+        }
+        for fut, lg in futures.items():
+            for r in fut.result():
+                if lg not in best or r["log_loss"] < best[lg]["log_loss"]:
+                    best[lg] = r
+    return best
+
+
+def write_config(best: dict[str, dict]) -> None:
+    config = {"leagues": {}}
+    if MODEL_CONFIG_PATH.exists():
+        try:
+            config = json.loads(MODEL_CONFIG_PATH.read_text(encoding="utf-8"))
+        except ValueError:
+            pass
+    config.setdefault("leagues", {}).update(best)
+    config["generated_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+    # zapis przez plik tymczasowy -> API nie przeczyta połowy pliku
+    tmp = MODEL_CONFIG_PATH.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(config, indent=2, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, MODEL_CONFIG_PATH)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Walk-forward tuning of the Poisson model")
+    parser.add_argument("--league", action="append", help="liga do strojenia (domyślnie wszystkie)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--dry-run", action="store_true", help="nie zapisuj model_config.json")
+    args = parser.parse_args()
+
+    leagues = args.league
+    if not leagues:
+        conn = get_connection(read_only=True)
+        leagues = [r[0] for r in conn.execute("SELECT DISTINCT league FROM football_matches ORDER BY league;")]
+        conn.close()
+
+    t0 = time.perf_counter()
+    best = tune(leagues, args.workers)
+    elapsed = time.perf_counter() - t0
+
+    grid_size = len(GRID_HISTORY) * len(GRID_K) * len(GRID_LAMBDA_MIN) * len(GRID_LAMBDA_MAX)
+    print(f"Grid points per league: {grid_size}, leagues: {len(leagues)}, time: {elapsed:.2f}s")
+    for lg, r in sorted(best.items()):
+        print(
+            f"{lg}: K={r['k']} lambda=[{r['lambda_min']}, {r['lambda_max']}] "
+            f"{r['history_mode']}={r['history_value']} log_loss={r['log_loss']:.4f} "
+            f"acc={r['accuracy']:.3f} ({r['matches_scored']} matches)"
+        )
+
+    if not args.dry_run:
+        write_config(best)
+        print("Saved:", MODEL_CONFIG_PATH)
+        # nowe domyślne ustawienia -> predykcje terminarza tych lig od nowa
+        refresh_upcoming(sorted(best))
@@ -13,6 +13,7 @@ export default function App() {
 
   const [leagues, setLeagues] = useState([]);
   const [teamsByLeague, setTeamsByLeague] = useState({});
+  const [seasonsByLeague, setSeasonsByLeague] = useState({});
 
   // Ładujemy dane globalnie dla home i teams
   useEffect(() => {
@@ -23,43 +24,26 @@ export default function App() {
         setLoading(true);
         setError("");
 
-        // 1) ligi
-        const resLeagues = await fetch(`${API}/leagues`, {
+        // jedno zapytanie: ligi -> sezony -> drużyny (ETag, więc powtórne ładowanie to 304)
+        const res = await fetch(`${API}/catalog`, {
           signal: controller.signal,
-          cache: "no-store",
+          cache: "no-cache",
         });
 
-        if (!resLeagues.ok) {
-          const text = await resLeagues.text();
-          console.error("HTTP", resLeagues.status, "Body:", text.slice(0, 300));
-          throw new Error(`HTTP ${resLeagues.status} (leagues)`);
+        if (!res.ok) {
+          const text = await res.text();
+          console.error("HTTP", res.status, "Body:", text.slice(0, 300));
+          throw new Error(`HTTP ${res.status} (catalog)`);
         }
 
-        const leaguesData = await resLeagues.json();
-        const leaguesArr = Array.isArray(leaguesData) ? leaguesData : [];
-        setLeagues(leaguesArr);
-
-        // 2) teams per liga
-        const pairs = await Promise.all(
-          leaguesArr.map(async (lg) => {
-            const url = `${API}/teams?league=${encodeURIComponent(lg)}&pretty=1`;
-            const resTeams = await fetch(url, {
-              signal: controller.signal,
-              cache: "no-store",
-            });
-
-            if (!resTeams.ok) {
-              const text = await resTeams.text();
-              console.error("HTTP", resTeams.status, "Body:", text.slice(0, 300));
-              throw new Error(`HTTP ${resTeams.status} (teams for ${lg})`);
-            }
-
-            const teams = await resTeams.json();
-            return [lg, Array.isArray(teams) ? teams : []];
-          })
-        );
+        const catalog = await res.json();
+        const items = Array.isArray(catalog?.leagues) ? catalog.leagues : [];
 
-        setTeamsByLeague(Object.fromEntries(pairs));
+        setLeagues(items.map((lg) => lg.league));
+        setTeamsByLeague(Object.fromEntries(items.map((lg) => [lg.league, lg.teams || []])));
+        setSeasonsByLeague(
+          Object.fromEntries(items.map((lg) => [lg.league, (lg.seasons || []).map((s) => s.season)]))
+        );
       } catch (e) {
         if (e.name !== "AbortError") {
           setError(e.message || "Błąd pobierania danych");
@@ -107,7 +91,12 @@ export default function App() {
 
         {tab === "home" && !loading && !error && (
           <>
-            <HomePredict leagues={leaguesSorted} teamsByLeague={teamsByLeague} API={API} />
+            <HomePredict
+              leagues={leaguesSorted}
+              teamsByLeague={teamsByLeague}
+              seasonsByLeague={seasonsByLeague}
+              API={API}
+            />
           </>
         )}
 
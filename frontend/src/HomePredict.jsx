@@ -1,9 +1,8 @@
 import { useEffect, useMemo, useState } from "react";
 
-export default function HomePredict({ leagues, teamsByLeague, API }) {
+export default function HomePredict({ leagues, teamsByLeague, seasonsByLeague, API }) {
   const [league, setLeague] = useState(leagues?.[0] ?? "");
   const [season, setSeason] = useState("");
-  const [seasons, setSeasons] = useState([]);
 
   const [homeTeam, setHomeTeam] = useState("");
   const [awayTeam, setAwayTeam] = useState("");
@@ -34,40 +33,17 @@ export default function HomePredict({ leagues, teamsByLeague, API }) {
     if (!league && leagues?.length) setLeague(leagues[0]);
   }, [leagues, league]);
 
-  // Pobieranie sezonów dla wybranej ligi
-  useEffect(() => {
-    if (!league) return;
-
-    const controller = new AbortController();
-
-    (async () => {
-      try {
-        setSeasons([]);
-        setSeason("");
-        setHomeTeam("");
-        setAwayTeam("");
-        setPred(null);
-        setErr("");
-
-        const res = await fetch(`${API}/seasons?league=${encodeURIComponent(league)}`, {
-          signal: controller.signal,
-          cache: "no-store",
-        });
-        if (!res.ok) return;
-
-        const data = await res.json();
-        const arr = Array.isArray(data) ? data : [];
-        setSeasons(arr);
-        if (arr.length) setSeason(arr[arr.length - 1]);
-      } catch (e) {
-        if (e.name !== "AbortError") {
-          // ignorujemy — sezony są dodatkiem
-        }
-      }
-    })();
+  // Sezony wybranej ligi (z /catalog)
+  const seasons = useMemo(() => seasonsByLeague?.[league] || [], [seasonsByLeague, league]);
 
-    return () => controller.abort();
-  }, [league, API]);
+  // Zmiana ligi -> reset wyboru, domyślnie ostatni sezon
+  useEffect(() => {
+    setSeason(seasons.length ? seasons[seasons.length - 1] : "");
+    setHomeTeam("");
+    setAwayTeam("");
+    setPred(null);
+    setErr("");
+  }, [seasons]);
 
   const teams = useMemo(() => {
     const list = teamsByLeague?.[league] || [];